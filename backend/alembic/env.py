@@ -2,8 +2,11 @@ from logging.config import fileConfig
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 from alembic import context
+from dotenv import load_dotenv
 from app.models.models import Base
-from app.db.database import DATABASE_URL  
+from app.db.database import get_database_url
+
+load_dotenv()
 
 config = context.config
 
@@ -13,7 +16,7 @@ if config.config_file_name is not None:
 target_metadata = Base.metadata
 
 def run_migrations_offline() -> None:
-    url = DATABASE_URL  
+    url = get_database_url()
     context.configure(
         url=url,
         target_metadata=target_metadata,
@@ -28,7 +31,7 @@ def run_migrations_online() -> None:
     configuration = config.get_section(config.config_ini_section)
     if not configuration:
         configuration = {}
-    configuration["sqlalchemy.url"] = DATABASE_URL 
+    configuration["sqlalchemy.url"] = get_database_url()
 
     connectable = engine_from_config(
         configuration,
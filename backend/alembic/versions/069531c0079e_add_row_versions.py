@@ -0,0 +1,36 @@
+"""Add row versions to pizzas and toppings
+
+Revision ID: 069531c0079e
+Revises: bc2aab4d9fbb
+Create Date: 2026-10-17 16:02:11.573904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '069531c0079e'
+down_revision: Union[str, None] = 'bc2aab4d9fbb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows start at version 1, like new ones
+    op.add_column('pizzas', sa.Column('version_id', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('toppings', sa.Column('version_id', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    # Batch mode so SQLite, which cannot drop columns on older versions, rebuilds the tables
+    with op.batch_alter_table('toppings') as batch_op:
+        batch_op.drop_column('version_id')
+    with op.batch_alter_table('pizzas') as batch_op:
+        batch_op.drop_column('version_id')
+    if op.get_bind().dialect.name == 'sqlite':
+        # The rebuilt tables lose their expression indexes, which reflection skips
+        op.create_index('ix_pizzas_name_lower', 'pizzas', [sa.text('lower(name)')], unique=True)
+        op.create_index('ix_toppings_name_lower', 'toppings', [sa.text('lower(name)')], unique=True)
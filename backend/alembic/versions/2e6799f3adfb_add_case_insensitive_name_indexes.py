@@ -0,0 +1,39 @@
+"""Add case-insensitive name indexes
+
+Revision ID: 2e6799f3adfb
+Revises: 2fd4ecff60bd
+Create Date: 2026-10-17 11:02:17.540318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2e6799f3adfb'
+down_revision: Union[str, None] = '2fd4ecff60bd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    for table in ('pizzas', 'toppings'):
+        # The old ilike checks were not atomic, so report any names that slipped through
+        clashes = bind.execute(sa.text(
+            f"SELECT lower(name) FROM {table} GROUP BY lower(name) HAVING count(*) > 1"
+        )).scalars().all()
+        if clashes:
+            raise RuntimeError(
+                f"Rename the {table} that differ only in case before upgrading: {', '.join(clashes)}"
+            )
+
+    op.create_index('ix_pizzas_name_lower', 'pizzas', [sa.text('lower(name)')], unique=True)
+    op.create_index('ix_toppings_name_lower', 'toppings', [sa.text('lower(name)')], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_toppings_name_lower', table_name='toppings')
+    op.drop_index('ix_pizzas_name_lower', table_name='pizzas')
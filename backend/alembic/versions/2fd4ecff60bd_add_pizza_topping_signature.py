@@ -0,0 +1,52 @@
+"""Add pizza topping signature
+
+Revision ID: 2fd4ecff60bd
+Revises: 2ce3d36697a6
+Create Date: 2026-10-17 09:12:41.208153
+
+"""
+import hashlib
+from collections import defaultdict
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2fd4ecff60bd'
+down_revision: Union[str, None] = '2ce3d36697a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def topping_signature(topping_ids):
+    # Frozen copy of app.models.models.topping_signature at this revision
+    canonical = ",".join(str(topping_id) for topping_id in sorted(set(topping_ids)))
+    return hashlib.sha1(canonical.encode("ascii")).hexdigest()
+
+
+def upgrade() -> None:
+    op.add_column('pizzas', sa.Column('topping_signature', sa.String(length=40), nullable=True))
+
+    # Backfill from the association table before the unique index goes on
+    bind = op.get_bind()
+    pizza_ids = [row.id for row in bind.execute(sa.text("SELECT id FROM pizzas"))]
+    toppings_by_pizza = defaultdict(list)
+    for row in bind.execute(sa.text("SELECT pizza_id, topping_id FROM pizza_toppings")):
+        toppings_by_pizza[row.pizza_id].append(row.topping_id)
+    if pizza_ids:
+        bind.execute(
+            sa.text("UPDATE pizzas SET topping_signature = :signature WHERE id = :id"),
+            [
+                {"id": pizza_id, "signature": topping_signature(toppings_by_pizza[pizza_id])}
+                for pizza_id in pizza_ids
+            ],
+        )
+
+    op.create_index(op.f('ix_pizzas_topping_signature'), 'pizzas', ['topping_signature'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_pizzas_topping_signature'), table_name='pizzas')
+    op.drop_column('pizzas', 'topping_signature')
@@ -0,0 +1,40 @@
+"""Add trigram indexes on pizza and topping names
+
+Revision ID: 8cf7a831710f
+Revises: 069531c0079e
+Create Date: 2026-10-17 17:40:52.226190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8cf7a831710f'
+down_revision: Union[str, None] = '069531c0079e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # PostgreSQL only: the search endpoint answers prefix, substring and
+    # word_similarity (<%) queries on lower(name) from these. Other databases
+    # search an in-memory index instead.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_pizzas_name_trgm', 'pizzas', [sa.text('lower(name) gin_trgm_ops')], postgresql_using='gin'
+    )
+    op.create_index(
+        'ix_toppings_name_trgm', 'toppings', [sa.text('lower(name) gin_trgm_ops')], postgresql_using='gin'
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_toppings_name_trgm', table_name='toppings')
+    op.drop_index('ix_pizzas_name_trgm', table_name='pizzas')
@@ -0,0 +1,35 @@
+"""Add pattern indexes for name prefix filters
+
+Revision ID: a4f1c2e9b7d3
+Revises: 8cf7a831710f
+Create Date: 2026-10-17 19:12:05.381746
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f1c2e9b7d3'
+down_revision: Union[str, None] = '8cf7a831710f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # PostgreSQL only: ?name_prefix= filters with a case-sensitive LIKE 'prefix%',
+    # which the plain name indexes cannot serve unless the database uses the C
+    # collation. Pattern operator classes compare byte by byte, so they can.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.create_index('ix_pizzas_name_pattern', 'pizzas', [sa.text('name varchar_pattern_ops')])
+    op.create_index('ix_toppings_name_pattern', 'toppings', [sa.text('name varchar_pattern_ops')])
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_toppings_name_pattern', table_name='toppings')
+    op.drop_index('ix_pizzas_name_pattern', table_name='pizzas')
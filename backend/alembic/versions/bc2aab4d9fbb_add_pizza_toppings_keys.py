@@ -0,0 +1,50 @@
+"""Add pizza_toppings primary key and reverse index
+
+Revision ID: bc2aab4d9fbb
+Revises: 2e6799f3adfb
+Create Date: 2026-10-17 14:21:40.118302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bc2aab4d9fbb'
+down_revision: Union[str, None] = '2e6799f3adfb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # Without a key the table may hold repeated or half-empty links; keep one of each
+    bind.execute(sa.text("DELETE FROM pizza_toppings WHERE pizza_id IS NULL OR topping_id IS NULL"))
+    duplicates = bind.execute(sa.text(
+        "SELECT count(*) FROM (SELECT 1 FROM pizza_toppings "
+        "GROUP BY pizza_id, topping_id HAVING count(*) > 1) AS repeated"
+    )).scalar()
+    if duplicates:
+        op.execute("CREATE TABLE pizza_toppings_dedup AS SELECT DISTINCT pizza_id, topping_id FROM pizza_toppings")
+        op.execute("DELETE FROM pizza_toppings")
+        op.execute("INSERT INTO pizza_toppings (pizza_id, topping_id) SELECT pizza_id, topping_id FROM pizza_toppings_dedup")
+        op.execute("DROP TABLE pizza_toppings_dedup")
+
+    # Batch mode so SQLite, which cannot add a primary key in place, rebuilds the table
+    with op.batch_alter_table('pizza_toppings') as batch_op:
+        batch_op.alter_column('pizza_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('topping_id', existing_type=sa.Integer(), nullable=False)
+        # Serves lookups by pizza: (pizza_id, topping_id)
+        batch_op.create_primary_key('pk_pizza_toppings', ['pizza_id', 'topping_id'])
+    # Serves lookups by topping: (topping_id, pizza_id)
+    op.create_index('ix_pizza_toppings_topping_id_pizza_id', 'pizza_toppings', ['topping_id', 'pizza_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_pizza_toppings_topping_id_pizza_id', table_name='pizza_toppings')
+    with op.batch_alter_table('pizza_toppings') as batch_op:
+        batch_op.drop_constraint('pk_pizza_toppings', type_='primary')
+        batch_op.alter_column('topping_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('pizza_id', existing_type=sa.Integer(), nullable=True)
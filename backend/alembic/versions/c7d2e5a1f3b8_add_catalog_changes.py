@@ -0,0 +1,38 @@
+"""Add catalog change log
+
+Revision ID: c7d2e5a1f3b8
+Revises: a4f1c2e9b7d3
+Create Date: 2026-10-17 20:31:44.902157
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2e5a1f3b8'
+down_revision: Union[str, None] = 'a4f1c2e9b7d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('catalog_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('origin', sa.String(length=32), nullable=False),
+    sa.Column('entity', sa.String(length=16), nullable=False),
+    sa.Column('action', sa.String(length=16), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('related_ids', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_catalog_changes_created_at'), 'catalog_changes', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_catalog_changes_created_at'), table_name='catalog_changes')
+    op.drop_table('catalog_changes')
@@ -0,0 +1,30 @@
+from typing import Dict, Optional
+from fastapi import Request
+
+# Upper bound for ?limit=, so a single page stays cheap to build and send
+MAX_PAGE_SIZE = 500
+
+def keyset(query, model, after_id: Optional[int], limit: Optional[int]):
+    """Restrict a Query or select() to one keyset page on the model's primary key.
+
+    One extra row is requested so split_page can tell whether another page exists.
+    """
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+    query = query.order_by(model.id)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return query
+
+def split_page(rows, limit: Optional[int]):
+    """Return the page and the cursor for the next one (None on the last page)."""
+    if limit is not None and len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
+
+def next_page_headers(request: Request, next_cursor: Optional[int]) -> Dict[str, str]:
+    """Response headers pointing at the next page, if there is one."""
+    if next_cursor is None:
+        return {}
+    next_url = request.url.include_query_params(after_id=next_cursor)
+    return {"X-Next-Cursor": str(next_cursor), "Link": f'<{next_url}>; rel="next"'}
@@ -0,0 +1,29 @@
+from typing import Iterable, Optional, Tuple
+from fastapi import HTTPException
+from ..core.revisions import if_match_satisfied, version_etag
+
+# Optimistic concurrency for item writes. Clients send the ETag of the item they
+# edited as If-Match; the version it carries is checked against the row, and the
+# ORM's version_id_col catches writes that land between that check and the commit.
+
+def check_if_match(if_match: Optional[str], version: int):
+    """412 if the client edited an older version of the row. Without If-Match, anything goes."""
+    if if_match is not None and not if_match_satisfied(if_match, version):
+        raise HTTPException(
+            status_code=412,
+            detail="The item has changed since it was read; fetch it again and retry",
+        )
+
+def edit_conflict() -> HTTPException:
+    # The row moved to a new version between reading and writing it
+    return HTTPException(
+        status_code=409,
+        detail="The item was changed by a concurrent request; fetch it again and retry",
+    )
+
+def pizza_etag(pizza) -> str:
+    return version_etag(pizza.version_id, ((t.id, t.version_id) for t in pizza.toppings))
+
+def topping_etag(topping, pizzas: Iterable[Tuple[int, int]]) -> str:
+    """Tag of a topping given the (id, version_id) rows of its pizzas."""
+    return version_etag(topping.version_id, pizzas)
@@ -0,0 +1,30 @@
+import orjson
+from fastapi import Response
+from pydantic import TypeAdapter
+from typing import Optional
+
+def render_json(adapter: TypeAdapter, value) -> bytes:
+    """Validate ORM objects against a response schema and dump them as JSON."""
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+
+def json_response(body: bytes, etag: Optional[str] = None) -> Response:
+    """Send a rendered JSON body, e.g. one a write handler rendered before committing."""
+    return Response(content=body, media_type="application/json", headers={"ETag": etag} if etag else None)
+
+def render_rows(rows) -> bytes:
+    """Dump flat result rows as a JSON list of objects keyed by column label."""
+    return orjson.dumps([row._asdict() for row in rows])
+
+def render_nested_rows(parents, children, relation: str) -> bytes:
+    """Dump (id, name) rows with their (parent_id, id, name) related rows as JSON.
+
+    Builds the same documents as the Pizza/Topping schemas straight from row
+    tuples, so large lists skip ORM object loading and model validation.
+    Children whose parent is not in parents are ignored.
+    """
+    documents = {row.id: {"name": row.name, "id": row.id, relation: []} for row in parents}
+    for parent_id, child_id, child_name in children:
+        document = documents.get(parent_id)
+        if document is not None:
+            document[relation].append({"name": child_name, "id": child_id})
+    return orjson.dumps(list(documents.values()))
@@ -0,0 +1,34 @@
+import hmac
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import List, Literal, Optional
+from ...core import profiling
+from ...core.profiling import profile_store
+
+def require_profile_token(x_profile_token: Optional[str] = Header(None)):
+    # The token that triggers profiling also reads the results
+    if not profiling.PROFILE_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling is not enabled")
+    if not x_profile_token or not hmac.compare_digest(x_profile_token, profiling.PROFILE_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+
+# Profiles and slow statements recorded by app.core.profiling, newest first
+router = APIRouter(dependencies=[Depends(require_profile_token)])
+
+@router.get("/profiles")
+async def list_profiles() -> List[dict]:
+    return [profile.summary() for profile in reversed(profile_store.profiles)]
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: int, format: Literal["json", "folded"] = Query("json")):
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found (the buffer may have dropped it)")
+    if format == "folded":
+        # For flamegraph.pl or speedscope
+        return PlainTextResponse(profile.folded())
+    return profile.as_dict()
+
+@router.get("/slow-queries")
+async def list_slow_queries() -> List[dict]:
+    return list(reversed(profile_store.slow_queries))
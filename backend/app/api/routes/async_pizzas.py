@@ -0,0 +1,135 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from typing import List, Optional
+from ...core.cache import PIZZAS, catalog_cache, item_key, list_key
+from ...core.events import CREATED, DELETED, PIZZA, UPDATED, CatalogChange, publish
+from ...core.revisions import catalog_revisions, content_etag, item_revision_key
+from ...db.async_database import get_async_db, get_async_read_db
+from ...models.models import Pizza, Topping, topping_signature
+from ...schemas.schemas import PizzaCreate, Pizza as PizzaSchema, PizzaItem
+from ..pagination import MAX_PAGE_SIZE, next_page_headers, split_page
+from ..preconditions import check_if_match, edit_conflict, pizza_etag
+from ..responses import json_response, render_json, render_nested_rows
+from .pizzas import integrity_error_to_http, pizza_delete_statements, pizza_filters, pizza_list_statements
+
+# Async counterparts of the routes in pizzas.py, mounted instead of them when DB_ASYNC is set.
+# Relationships are always eager-loaded: lazy loads cannot run under asyncio.
+router = APIRouter()
+
+async def _commit(db: AsyncSession):
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        http_error = integrity_error_to_http(e)
+        if http_error:
+            raise http_error
+        raise
+    except StaleDataError:
+        await db.rollback()
+        raise edit_conflict()
+
+async def _get_pizza_or_404(db: AsyncSession, pizza_id: int) -> Pizza:
+    pizza = await db.scalar(
+        select(Pizza).options(selectinload(Pizza.toppings)).where(Pizza.id == pizza_id)
+    )
+    if not pizza:
+        raise HTTPException(status_code=404, detail="Pizza not found")
+    return pizza
+
+async def _get_toppings(db: AsyncSession, topping_ids: List[int]) -> List[Topping]:
+    toppings = (await db.scalars(select(Topping).where(Topping.id.in_(topping_ids)))).all()
+    if len(toppings) != len(topping_ids):
+        raise HTTPException(status_code=400, detail="Some toppings not found")
+    return list(toppings)
+
+@router.get("/", response_model=List[PizzaSchema])
+async def get_pizzas(
+    request: Request,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    topping_id: Optional[int] = None,
+    name_prefix: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    # Taken before reading, so a write that lands meanwhile keeps this read from being cached
+    revision = catalog_revisions.revision(PIZZAS)
+    cache_key = list_key(PIZZAS, request)
+    cached = catalog_cache.lookup(cache_key)
+    if cached:
+        return cached
+    
+    page, toppings = pizza_list_statements(pizza_filters(topping_id, name_prefix), after_id, limit)
+    pizzas, next_cursor = split_page((await db.execute(page)).all(), limit)
+    body = render_nested_rows(pizzas, (await db.execute(toppings)) if pizzas else (), "toppings")
+    headers = next_page_headers(request, next_cursor)
+    return catalog_cache.store(cache_key, body, headers, content_etag(body), revision).to_response()
+
+@router.post("/", response_model=PizzaSchema)
+async def create_pizza(pizza: PizzaCreate, db: AsyncSession = Depends(get_async_db)):
+    toppings = await _get_toppings(db, pizza.topping_ids)
+    
+    # Duplicate names and topping combinations are caught by the unique indexes
+    new_pizza = Pizza(name=pizza.name, topping_signature=topping_signature(pizza.topping_ids), toppings=toppings)
+    db.add(new_pizza)
+    await _commit(db)
+    publish(CatalogChange(PIZZA, CREATED, new_pizza.id, new_pizza.name, frozenset(pizza.topping_ids)))
+    return json_response(render_json(PizzaItem, new_pizza), pizza_etag(new_pizza))
+
+@router.get("/{pizza_id}", response_model=PizzaSchema)
+async def get_pizza(pizza_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    # Taken before reading, so a write that lands meanwhile keeps this read from being cached
+    revision = catalog_revisions.revision(item_revision_key(PIZZAS, pizza_id))
+    cache_key = item_key(PIZZAS, pizza_id)
+    cached = catalog_cache.lookup(cache_key)
+    if cached:
+        return cached
+    
+    pizza = await _get_pizza_or_404(db, pizza_id)
+    etag = pizza_etag(pizza)
+    return catalog_cache.store(cache_key, render_json(PizzaItem, pizza), etag=etag, revision=revision).to_response()
+
+@router.put("/{pizza_id}", response_model=PizzaSchema)
+async def update_pizza(
+    pizza_id: int,
+    pizza: PizzaCreate,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    db_pizza = await _get_pizza_or_404(db, pizza_id)
+    check_if_match(if_match, db_pizza.version_id)
+    old_topping_ids = {t.id for t in db_pizza.toppings}
+    
+    toppings = await _get_toppings(db, pizza.topping_ids)
+    
+    db_pizza.name = pizza.name
+    db_pizza.topping_signature = topping_signature(pizza.topping_ids)
+    db_pizza.toppings = toppings
+    await _commit(db)
+    publish(CatalogChange(
+        PIZZA, UPDATED, pizza_id, db_pizza.name, frozenset(old_topping_ids | set(pizza.topping_ids))
+    ))
+    return json_response(render_json(PizzaItem, db_pizza), pizza_etag(db_pizza))
+
+@router.delete("/{pizza_id}")
+async def delete_pizza(
+    pizza_id: int, if_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)
+):
+    # Only the row itself: deleting the links returns the topping IDs
+    pizza = await db.get(Pizza, pizza_id)
+    if not pizza:
+        raise HTTPException(status_code=404, detail="Pizza not found")
+    check_if_match(if_match, pizza.version_id)
+    
+    links, pizza_row = pizza_delete_statements(pizza)
+    topping_ids = frozenset(await db.scalars(links))
+    if (await db.execute(pizza_row)).rowcount != 1:
+        await db.rollback()
+        raise edit_conflict()
+    await db.commit()
+    publish(CatalogChange(PIZZA, DELETED, pizza_id, pizza.name, topping_ids))
+    return {"message": "Pizza deleted"}
@@ -0,0 +1,140 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from typing import List, Literal, Optional, Union
+from ...core.cache import TOPPINGS, catalog_cache, item_key, list_key
+from ...core.events import CREATED, DELETED, TOPPING, UPDATED, CatalogChange, publish
+from ...core.revisions import catalog_revisions, content_etag, item_revision_key
+from ...db.async_database import get_async_db, get_async_read_db
+from ...models.models import Topping
+from ...schemas.schemas import ToppingCreate, Topping as ToppingSchema, ToppingItem, ToppingUsage
+from ..pagination import MAX_PAGE_SIZE, next_page_headers, split_page
+from ..preconditions import check_if_match, edit_conflict, topping_etag
+from ..responses import json_response, render_json, render_nested_rows, render_rows
+from .toppings import (
+    integrity_error_to_http,
+    topping_counts_statement,
+    topping_delete_statement,
+    topping_filters,
+    topping_in_use_error,
+    topping_in_use_error_statements,
+    topping_in_use_statement,
+    topping_list_statements,
+)
+
+# Async counterparts of the routes in toppings.py, mounted instead of them when DB_ASYNC is set.
+# Relationships are always eager-loaded: lazy loads cannot run under asyncio.
+router = APIRouter()
+
+async def _commit(db: AsyncSession, name_taken_detail: str):
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        http_error = integrity_error_to_http(e, name_taken_detail)
+        if http_error:
+            raise http_error
+        raise
+    except StaleDataError:
+        await db.rollback()
+        raise edit_conflict()
+
+async def _get_topping_or_404(db: AsyncSession, topping_id: int) -> Topping:
+    topping = await db.scalar(
+        select(Topping).options(selectinload(Topping.pizzas)).where(Topping.id == topping_id)
+    )
+    if not topping:
+        raise HTTPException(status_code=404, detail="Topping not found")
+    return topping
+
+@router.get("/", response_model=Union[List[ToppingSchema], List[ToppingUsage]])
+async def get_toppings(
+    request: Request,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    name_prefix: Optional[str] = None,
+    include: Optional[Literal["counts"]] = Query(None, description="counts: pizza_count instead of the pizza list"),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    # Taken before reading, so a write that lands meanwhile keeps this read from being cached
+    revision = catalog_revisions.revision(TOPPINGS)
+    cache_key = list_key(TOPPINGS, request)
+    cached = catalog_cache.lookup(cache_key)
+    if cached:
+        return cached
+    
+    conditions = topping_filters(name_prefix)
+    if include == "counts":
+        rows = (await db.execute(topping_counts_statement(conditions, after_id, limit))).all()
+        toppings, next_cursor = split_page(rows, limit)
+        body = render_rows(toppings)
+    else:
+        page, pizzas = topping_list_statements(conditions, after_id, limit)
+        toppings, next_cursor = split_page((await db.execute(page)).all(), limit)
+        body = render_nested_rows(toppings, (await db.execute(pizzas)) if toppings else (), "pizzas")
+    headers = next_page_headers(request, next_cursor)
+    return catalog_cache.store(cache_key, body, headers, content_etag(body), revision).to_response()
+
+@router.post("/", response_model=ToppingSchema)
+async def create_topping(topping: ToppingCreate, db: AsyncSession = Depends(get_async_db)):
+    new_topping = Topping(name=topping.name, pizzas=[])
+    db.add(new_topping)
+    await _commit(db, "Topping already exists")
+    publish(CatalogChange(TOPPING, CREATED, new_topping.id, new_topping.name))
+    return json_response(render_json(ToppingItem, new_topping), topping_etag(new_topping, ()))
+
+@router.get("/{topping_id}", response_model=ToppingSchema)
+async def get_topping(topping_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    # Taken before reading, so a write that lands meanwhile keeps this read from being cached
+    revision = catalog_revisions.revision(item_revision_key(TOPPINGS, topping_id))
+    cache_key = item_key(TOPPINGS, topping_id)
+    cached = catalog_cache.lookup(cache_key)
+    if cached:
+        return cached
+    
+    topping = await _get_topping_or_404(db, topping_id)
+    etag = topping_etag(topping, ((p.id, p.version_id) for p in topping.pizzas))
+    return catalog_cache.store(cache_key, render_json(ToppingItem, topping), etag=etag, revision=revision).to_response()
+
+@router.put("/{topping_id}", response_model=ToppingSchema)
+async def update_topping(
+    topping_id: int,
+    topping: ToppingCreate,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    db_topping = await _get_topping_or_404(db, topping_id)
+    check_if_match(if_match, db_topping.version_id)
+    
+    db_topping.name = topping.name
+    await _commit(db, "Topping name already exists")
+    # Pizzas embed the topping's name, so they change with it
+    publish(CatalogChange(
+        TOPPING, UPDATED, topping_id, db_topping.name, frozenset(p.id for p in db_topping.pizzas)
+    ))
+    etag = topping_etag(db_topping, ((p.id, p.version_id) for p in db_topping.pizzas))
+    return json_response(render_json(ToppingItem, db_topping), etag)
+
+@router.delete("/{topping_id}")
+async def delete_topping(
+    topping_id: int, if_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)
+):
+    # Only the row itself: the in-use check below does not need topping.pizzas
+    topping = await db.get(Topping, topping_id)
+    if not topping:
+        raise HTTPException(status_code=404, detail="Topping not found")
+    check_if_match(if_match, topping.version_id)
+    
+    if await db.scalar(topping_in_use_statement(topping_id)):
+        count, names = topping_in_use_error_statements(topping_id)
+        raise topping_in_use_error(await db.scalar(count), list(await db.scalars(names)))
+    
+    if (await db.execute(topping_delete_statement(topping))).rowcount != 1:
+        await db.rollback()
+        raise edit_conflict()
+    await db.commit()
+    publish(CatalogChange(TOPPING, DELETED, topping_id, topping.name))
+    return {"message": "Topping deleted"}
@@ -0,0 +1,352 @@
+from collections import defaultdict
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+from typing import Dict, List, Optional
+from ...core.events import CREATED, DELETED, PIZZA, TOPPING, UPDATED, CatalogChange, publish
+from ...db.database import get_db
+from ...models.models import Pizza, Topping, pizza_toppings, topping_signature
+from ...schemas.schemas import (
+    BulkDelete,
+    BulkItemResult,
+    BulkPizzaCreate,
+    BulkPizzaUpdate,
+    BulkResult,
+    BulkToppingCreate,
+    BulkToppingUpdate,
+)
+from .pizzas import DUPLICATE_TOPPINGS_DETAIL
+
+# Batch versions of the create/update/delete routes. Each batch is validated with
+# a fixed number of set-based queries, written with executemany statements and
+# committed in a single transaction. Mounted ahead of the CRUD routers so that
+# /bulk is not taken for an item ID.
+router = APIRouter()
+
+
+class _Batch:
+    """Per-item outcomes of a bulk request."""
+
+    def __init__(self, size: int, mode: str):
+        self.mode = mode
+        self.results = [BulkItemResult(index=index, status="skipped") for index in range(size)]
+
+    def fail(self, index: int, detail: str):
+        # Keep the first problem found for an item
+        if self.results[index].status != "error":
+            self.results[index].status = "error"
+            self.results[index].detail = detail
+
+    def succeed(self, index: int, status: str, item_id: int):
+        self.results[index].status = status
+        self.results[index].id = item_id
+
+    def valid(self) -> List[int]:
+        return [result.index for result in self.results if result.status != "error"]
+
+    def check(self):
+        """Reject an atomic batch that has any invalid item before anything is written."""
+        if self.mode == "atomic" and len(self.valid()) < len(self.results):
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "message": "Batch rejected, no items were written",
+                    "results": [result.model_dump() for result in self.results],
+                },
+            )
+
+
+def _conflict() -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail="Batch conflicts with a concurrent write, no items were written",
+    )
+
+
+def _commit(db: Session):
+    # The unique indexes catch writers that raced past the batch validation
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise _conflict()
+
+
+def _check_unique_ids(batch: _Batch, ids: List[int]):
+    first_index = {}
+    for index, item_id in enumerate(ids):
+        if item_id in first_index:
+            batch.fail(index, f"Duplicate of item {first_index[item_id]} in batch")
+        else:
+            first_index[item_id] = index
+
+
+def _check_exist(db: Session, batch: _Batch, model, ids: List[int], detail: str) -> Dict[int, int]:
+    """Flag unknown IDs and map the others to their row versions."""
+    found = dict(db.execute(select(model.id, model.version_id).where(model.id.in_(set(ids)))).all())
+    for index, item_id in enumerate(ids):
+        if item_id not in found:
+            batch.fail(index, detail)
+    return found
+
+
+def _update_versioned(db: Session, model, rows: List[dict], versions: Dict[int, int]):
+    """Update rows by primary key, checking and bumping each row's version.
+
+    The versions are those read during validation, so a row changed since then
+    fails the batch with a 409 like any other concurrent write.
+    """
+    try:
+        db.execute(update(model), [{**row, "version_id": versions[row["id"]]} for row in rows])
+    except StaleDataError:
+        db.rollback()
+        raise _conflict()
+
+
+def _check_names(
+    db: Session, batch: _Batch, model, names: List[str], detail: str, ids: Optional[List[int]] = None
+):
+    """Flag names repeated in the batch or taken by another row (case-insensitive)."""
+    index_by_name = {}
+    for index, name in enumerate(names):
+        key = name.lower()
+        if key in index_by_name:
+            batch.fail(index, f"Duplicate of item {index_by_name[key]} in batch")
+        else:
+            index_by_name[key] = index
+
+    existing = db.execute(
+        select(model.id, func.lower(model.name)).where(func.lower(model.name).in_(index_by_name))
+    )
+    for row_id, key in existing:
+        index = index_by_name.get(key)
+        if index is not None and (ids is None or ids[index] != row_id):
+            batch.fail(index, detail)
+
+
+def _check_toppings(db: Session, batch: _Batch, topping_id_lists: List[List[int]], ids: Optional[List[int]] = None):
+    """Flag unknown toppings and topping combinations repeated in the batch or already taken."""
+    requested = set().union(*topping_id_lists)
+    found = set(db.scalars(select(Topping.id).where(Topping.id.in_(requested))))
+    index_by_signature = {}
+    for index, topping_ids in enumerate(topping_id_lists):
+        # Same rule as create_pizza: every listed ID must match exactly one topping
+        if len(set(topping_ids)) != len(topping_ids) or not found.issuperset(topping_ids):
+            batch.fail(index, "Some toppings not found")
+        signature = topping_signature(topping_ids)
+        if signature in index_by_signature:
+            batch.fail(index, f"Duplicate of item {index_by_signature[signature]} in batch")
+        else:
+            index_by_signature[signature] = index
+
+    existing = db.execute(
+        select(Pizza.id, Pizza.topping_signature).where(Pizza.topping_signature.in_(index_by_signature))
+    )
+    for row_id, signature in existing:
+        index = index_by_signature[signature]
+        if ids is None or ids[index] != row_id:
+            batch.fail(index, DUPLICATE_TOPPINGS_DETAIL)
+
+
+def _insert_named(db: Session, model, rows: List[dict]) -> Dict[str, int]:
+    """Insert validated rows in one batched statement and map each name to its new ID.
+
+    RETURNING rows come back unordered: ordered RETURNING would make SQLite fall
+    back to one INSERT per row. Names are unique within a validated batch.
+    """
+    returned = db.execute(insert(model).returning(model.id, model.name), rows)
+    return {name: new_id for new_id, name in returned}
+
+
+def _links(db: Session, column, ids) -> Dict[int, set]:
+    """Map each ID to the IDs on the other side of the pizza/topping association."""
+    other = pizza_toppings.c.topping_id if column is pizza_toppings.c.pizza_id else pizza_toppings.c.pizza_id
+    links = defaultdict(set)
+    for item_id, other_id in db.execute(select(column, other).where(column.in_(ids))):
+        links[item_id].add(other_id)
+    return links
+
+
+@router.post("/toppings/bulk", response_model=BulkResult, tags=["toppings"])
+def bulk_create_toppings(payload: BulkToppingCreate, db: Session = Depends(get_db)):
+    items = payload.items
+    batch = _Batch(len(items), payload.mode)
+    _check_names(db, batch, Topping, [item.name for item in items], "Topping already exists")
+    batch.check()
+
+    valid = batch.valid()
+    if valid:
+        new_ids = _insert_named(db, Topping, [{"name": items[index].name} for index in valid])
+        _commit(db)
+        for index in valid:
+            batch.succeed(index, "created", new_ids[items[index].name])
+        publish(*(
+            CatalogChange(TOPPING, CREATED, new_ids[items[index].name], items[index].name) for index in valid
+        ))
+    return BulkResult(results=batch.results)
+
+
+@router.put("/toppings/bulk", response_model=BulkResult, tags=["toppings"])
+def bulk_update_toppings(payload: BulkToppingUpdate, db: Session = Depends(get_db)):
+    items = payload.items
+    ids = [item.id for item in items]
+    batch = _Batch(len(items), payload.mode)
+    _check_unique_ids(batch, ids)
+    versions = _check_exist(db, batch, Topping, ids, "Topping not found")
+    _check_names(db, batch, Topping, [item.name for item in items], "Topping name already exists", ids)
+    batch.check()
+
+    valid = batch.valid()
+    if valid:
+        _update_versioned(
+            db, Topping, [{"id": items[index].id, "name": items[index].name} for index in valid], versions
+        )
+        pizza_ids = _links(db, pizza_toppings.c.topping_id, [ids[index] for index in valid])
+        _commit(db)
+        for index in valid:
+            batch.succeed(index, "updated", ids[index])
+        # Pizzas embed the topping's name, so they change with it
+        publish(*(
+            CatalogChange(TOPPING, UPDATED, ids[index], items[index].name, frozenset(pizza_ids[ids[index]]))
+            for index in valid
+        ))
+    return BulkResult(results=batch.results)
+
+
+@router.post("/toppings/bulk/delete", response_model=BulkResult, tags=["toppings"])
+def bulk_delete_toppings(payload: BulkDelete, db: Session = Depends(get_db)):
+    ids = payload.ids
+    batch = _Batch(len(ids), payload.mode)
+    _check_unique_ids(batch, ids)
+    _check_exist(db, batch, Topping, ids, "Topping not found")
+    in_use = set(db.scalars(
+        select(pizza_toppings.c.topping_id).where(pizza_toppings.c.topping_id.in_(set(ids))).distinct()
+    ))
+    for index, topping_id in enumerate(ids):
+        if topping_id in in_use:
+            batch.fail(index, "Cannot delete topping as it is used in existing pizzas")
+    batch.check()
+
+    valid = batch.valid()
+    if valid:
+        db.execute(delete(Topping).where(Topping.id.in_([ids[index] for index in valid])))
+        _commit(db)
+        for index in valid:
+            batch.succeed(index, "deleted", ids[index])
+        publish(*(CatalogChange(TOPPING, DELETED, ids[index]) for index in valid))
+    return BulkResult(results=batch.results)
+
+
+@router.post("/pizzas/bulk", response_model=BulkResult, tags=["pizzas"])
+def bulk_create_pizzas(payload: BulkPizzaCreate, db: Session = Depends(get_db)):
+    items = payload.items
+    batch = _Batch(len(items), payload.mode)
+    _check_names(db, batch, Pizza, [item.name for item in items], "Pizza name already exists")
+    _check_toppings(db, batch, [item.topping_ids for item in items])
+    batch.check()
+
+    valid = batch.valid()
+    if valid:
+        new_ids = _insert_named(
+            db,
+            Pizza,
+            [
+                {"name": items[index].name, "topping_signature": topping_signature(items[index].topping_ids)}
+                for index in valid
+            ],
+        )
+        links = [
+            {"pizza_id": new_ids[items[index].name], "topping_id": topping_id}
+            for index in valid
+            for topping_id in items[index].topping_ids
+        ]
+        if links:
+            db.execute(insert(pizza_toppings), links)
+        _commit(db)
+        for index in valid:
+            batch.succeed(index, "created", new_ids[items[index].name])
+        publish(*(
+            CatalogChange(
+                PIZZA, CREATED, new_ids[items[index].name], items[index].name, frozenset(items[index].topping_ids)
+            )
+            for index in valid
+        ))
+    return BulkResult(results=batch.results)
+
+
+@router.put("/pizzas/bulk", response_model=BulkResult, tags=["pizzas"])
+def bulk_update_pizzas(payload: BulkPizzaUpdate, db: Session = Depends(get_db)):
+    items = payload.items
+    ids = [item.id for item in items]
+    batch = _Batch(len(items), payload.mode)
+    _check_unique_ids(batch, ids)
+    versions = _check_exist(db, batch, Pizza, ids, "Pizza not found")
+    _check_names(db, batch, Pizza, [item.name for item in items], "Pizza name already exists", ids)
+    _check_toppings(db, batch, [item.topping_ids for item in items], ids)
+    batch.check()
+
+    valid = batch.valid()
+    if valid:
+        valid_ids = [ids[index] for index in valid]
+        old_topping_ids = _links(db, pizza_toppings.c.pizza_id, valid_ids)
+        _update_versioned(
+            db,
+            Pizza,
+            [
+                {
+                    "id": items[index].id,
+                    "name": items[index].name,
+                    "topping_signature": topping_signature(items[index].topping_ids),
+                }
+                for index in valid
+            ],
+            versions,
+        )
+        db.execute(delete(pizza_toppings).where(pizza_toppings.c.pizza_id.in_(valid_ids)))
+        links = [
+            {"pizza_id": items[index].id, "topping_id": topping_id}
+            for index in valid
+            for topping_id in items[index].topping_ids
+        ]
+        if links:
+            db.execute(insert(pizza_toppings), links)
+        _commit(db)
+        for index in valid:
+            batch.succeed(index, "updated", ids[index])
+        publish(*(
+            CatalogChange(
+                PIZZA,
+                UPDATED,
+                ids[index],
+                items[index].name,
+                frozenset(old_topping_ids[ids[index]] | set(items[index].topping_ids)),
+            )
+            for index in valid
+        ))
+    return BulkResult(results=batch.results)
+
+
+@router.post("/pizzas/bulk/delete", response_model=BulkResult, tags=["pizzas"])
+def bulk_delete_pizzas(payload: BulkDelete, db: Session = Depends(get_db)):
+    ids = payload.ids
+    batch = _Batch(len(ids), payload.mode)
+    _check_unique_ids(batch, ids)
+    _check_exist(db, batch, Pizza, ids, "Pizza not found")
+    batch.check()
+
+    valid = batch.valid()
+    if valid:
+        valid_ids = [ids[index] for index in valid]
+        old_topping_ids = _links(db, pizza_toppings.c.pizza_id, valid_ids)
+        db.execute(delete(pizza_toppings).where(pizza_toppings.c.pizza_id.in_(valid_ids)))
+        db.execute(delete(Pizza).where(Pizza.id.in_(valid_ids)))
+        _commit(db)
+        for index in valid:
+            batch.succeed(index, "deleted", ids[index])
+        publish(*(
+            CatalogChange(PIZZA, DELETED, pizza_id, related_ids=frozenset(old_topping_ids[pizza_id]))
+            for pizza_id in valid_ids
+        ))
+    return BulkResult(results=batch.results)
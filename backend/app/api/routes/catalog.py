@@ -0,0 +1,259 @@
+import logging
+import time
+from itertools import groupby
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import AsyncIterator, Iterator, List
+from ...core.events import CATALOG_RELOADED, publish
+from ...db.database import get_db, get_read_db
+from ...models.models import Pizza, Topping, pizza_toppings, topping_signature
+from ...schemas.schemas import CatalogRecord, ImportSummary, PizzaRecord, ToppingRecord
+
+# Whole-catalog transfer as NDJSON: one {"type": "topping", ...} line per topping,
+# then one {"type": "pizza", ..., "topping_ids": [...]} line per pizza. Toppings
+# come first so that a file can be imported front to back.
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_YIELD_PER = 1000
+
+# Output is flushed to the client in chunks of about this size
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# Records inserted and committed together by the import
+IMPORT_BATCH_SIZE = 1000
+
+
+def _export_records(db: Session) -> Iterator[bytes]:
+    if db.get_bind().dialect.name == "postgresql":
+        # One snapshot for both queries, so no pizza references a topping missing from the file
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+    toppings = db.execute(
+        select(Topping.id, Topping.name).order_by(Topping.id).execution_options(yield_per=EXPORT_YIELD_PER)
+    )
+    for topping_id, name in toppings:
+        yield orjson.dumps({"type": "topping", "id": topping_id, "name": name})
+
+    # One row per pizza/topping pair, grouped back into pizzas as the cursor advances
+    rows = db.execute(
+        select(Pizza.id, Pizza.name, pizza_toppings.c.topping_id)
+        .outerjoin(pizza_toppings, pizza_toppings.c.pizza_id == Pizza.id)
+        .order_by(Pizza.id, pizza_toppings.c.topping_id)
+        .execution_options(yield_per=EXPORT_YIELD_PER)
+    )
+    for (pizza_id, name), pizza_rows in groupby(rows, key=lambda row: (row.id, row.name)):
+        topping_ids = [row.topping_id for row in pizza_rows if row.topping_id is not None]
+        yield orjson.dumps({"type": "pizza", "id": pizza_id, "name": name, "topping_ids": topping_ids})
+
+
+def _export_chunks(db: Session) -> Iterator[bytes]:
+    # The request's dependencies have already exited when the body is streamed,
+    # so the session is closed here once the last row has been sent
+    try:
+        chunk, size = [], 0
+        for record in _export_records(db):
+            chunk.append(record)
+            size += len(record) + 1
+            if size >= EXPORT_CHUNK_BYTES:
+                yield b"\n".join(chunk) + b"\n"
+                chunk, size = [], 0
+        if chunk:
+            yield b"\n".join(chunk) + b"\n"
+    finally:
+        db.close()
+
+
+@router.get("/export")
+def export_catalog(db: Session = Depends(get_read_db)):
+    return StreamingResponse(
+        _export_chunks(db),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": 'attachment; filename="catalog.ndjson"'},
+    )
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a streamed body into lines without holding more than one chunk."""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+class _Import:
+    """Buffers parsed records and writes them a batch at a time."""
+
+    def __init__(self, db: Session, offset: int):
+        self.db = db
+        self.offset = offset
+        self.toppings = 0
+        self.pizzas = 0
+        self.records: List = []
+        self.started_at = time.perf_counter()
+
+    def summary(self) -> ImportSummary:
+        return ImportSummary(toppings=self.toppings, pizzas=self.pizzas, offset=self.offset)
+
+    def fail(self, status_code: int, message: str, line: int):
+        raise HTTPException(
+            status_code=status_code,
+            detail={
+                "message": message,
+                "line": line,
+                # Everything before this line is committed; resume from here once fixed
+                "offset": self.offset,
+                "toppings": self.toppings,
+                "pizzas": self.pizzas,
+            },
+        )
+
+    def flush(self, lines: int):
+        """Write the buffered records in one transaction; lines is the count consumed so far."""
+        if not self.records:
+            self.offset = lines
+            return
+        toppings = [record for record in self.records if isinstance(record, ToppingRecord)]
+        pizzas = [record for record in self.records if isinstance(record, PizzaRecord)]
+        try:
+            # Toppings go first so that pizzas in the same batch can use them
+            if toppings:
+                self.db.execute(insert(Topping), [{"id": t.id, "name": t.name} for t in toppings])
+            if pizzas:
+                self._check_toppings_exist(pizzas, lines)
+                self.db.execute(insert(Pizza), [
+                    {"id": p.id, "name": p.name, "topping_signature": topping_signature(p.topping_ids)}
+                    for p in pizzas
+                ])
+                links = [
+                    {"pizza_id": p.id, "topping_id": topping_id}
+                    for p in pizzas
+                    for topping_id in dict.fromkeys(p.topping_ids)
+                ]
+                if links:
+                    self.db.execute(insert(pizza_toppings), links)
+            # With every batch rather than at the end, so an import that fails or is
+            # abandoned halfway leaves no committed ID ahead of its sequence
+            self._sync_sequences()
+            self.db.commit()
+        except IntegrityError as e:
+            self.db.rollback()
+            logger.warning("Catalog import batch at line %d rejected: %s", self.offset + 1, e.orig)
+            self.fail(409, "Batch conflicts with existing data: an ID or name is already taken", self.offset + 1)
+
+        self.toppings += len(toppings)
+        self.pizzas += len(pizzas)
+        self.offset = lines
+        self.records = []
+        # One catalog-wide change per batch rather than one per record, which would
+        # put a row per record in the change log and overrun the feed's buffer
+        publish(CATALOG_RELOADED)
+        elapsed = time.perf_counter() - self.started_at
+        logger.info(
+            "Catalog import: %d toppings and %d pizzas committed, resume offset %d (%.0f records/s)",
+            self.toppings, self.pizzas, self.offset, (self.toppings + self.pizzas) / elapsed if elapsed else 0,
+        )
+
+    def _check_toppings_exist(self, pizzas: List[PizzaRecord], lines: int):
+        # Not every database enforces the foreign key (SQLite does not by default)
+        requested = set().union(*(p.topping_ids for p in pizzas))
+        found = set(self.db.scalars(select(Topping.id).where(Topping.id.in_(requested))))
+        if not found.issuperset(requested):
+            self.db.rollback()
+            missing = sorted(requested - found)[:10]
+            self.fail(400, f"Pizzas reference unknown toppings: {missing}", self.offset + 1)
+
+    def _sync_sequences(self):
+        """Move PostgreSQL ID sequences past the imported IDs so later inserts do not collide."""
+        if self.db.get_bind().dialect.name != "postgresql":
+            return
+        for table in ("toppings", "pizzas"):
+            self.db.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {table}), false)"
+            ))
+
+
+async def _run_import(request: Request, job: _Import) -> AsyncIterator[ImportSummary]:
+    """Import the request body, yielding the progress after every committed batch."""
+    offset = job.offset
+    lines = 0
+    async for line in _lines(request.stream()):
+        lines += 1
+        if lines <= offset or not line.strip():
+            continue
+        try:
+            job.records.append(CatalogRecord.validate_json(line))
+        except ValidationError as e:
+            await run_in_threadpool(job.flush, lines - 1)
+            job.fail(400, f"Invalid record: {e.errors(include_url=False)[0]['msg']}", lines)
+        if len(job.records) >= IMPORT_BATCH_SIZE:
+            await run_in_threadpool(job.flush, lines)
+            yield job.summary()
+
+    await run_in_threadpool(job.flush, max(lines, offset))
+    yield job.summary()
+
+
+async def _progress_lines(request: Request, job: _Import) -> AsyncIterator[bytes]:
+    # As with the export, the session is closed here rather than by the dependency
+    try:
+        async for progress in _run_import(request, job):
+            yield orjson.dumps({"type": "progress", **progress.model_dump()}) + b"\n"
+    except HTTPException as e:
+        # The 200 has already been sent, so the failure is the last line instead
+        yield orjson.dumps({"type": "error", "status": e.status_code, **e.detail}) + b"\n"
+        return
+    finally:
+        job.db.close()
+    yield orjson.dumps({"type": "done", **job.summary().model_dump()}) + b"\n"
+
+
+class _ProgressResponse(StreamingResponse):
+    """Streams progress while the request body is still being read.
+
+    StreamingResponse would also wait on receive for the client to disconnect,
+    taking the body messages the import is reading.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@router.post("/import", response_model=ImportSummary)
+async def import_catalog(
+    request: Request,
+    offset: int = Query(0, ge=0, description="Lines to skip, from a previous import's offset"),
+    db: Session = Depends(get_db),
+):
+    """Load an export file into the catalog, keeping its IDs.
+
+    The body is parsed as it arrives and written in batches of
+    IMPORT_BATCH_SIZE records, each in its own transaction. On failure the
+    error carries the offset up to which the file was committed, so a large
+    import can be resumed with ?offset= instead of starting over.
+
+    Clients that accept application/x-ndjson are sent a progress line, with
+    the counts and offset so far, after every batch; then a "done" line with
+    the summary, or an "error" line with what the error response would carry.
+    """
+    job = _Import(db, offset)
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return _ProgressResponse(_progress_lines(request, job), media_type=NDJSON_MEDIA_TYPE)
+    async for _ in _run_import(request, job):
+        pass
+    return job.summary()
@@ -0,0 +1,54 @@
+import orjson
+from fastapi import APIRouter, Header, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Optional
+from ...core.feed import CHANGE, HEARTBEAT, change_feed
+
+# Push feed of catalog changes (see app.core.feed), for store terminals that
+# would otherwise poll the list endpoints. The same messages are served as
+# Server-Sent Events and over a WebSocket.
+router = APIRouter()
+
+# Sent once per stream: how long EventSource waits before reconnecting, in milliseconds
+SSE_RETRY_MS = 3000
+
+AFTER_DESCRIPTION = "Cursor of the last message received; the feed resumes after it"
+
+async def sse_messages(cursor: Optional[str]) -> AsyncIterator[bytes]:
+    yield f"retry: {SSE_RETRY_MS}\n\n".encode()
+    async for kind, event, cursor in change_feed.follow(cursor):
+        if kind == HEARTBEAT:
+            # A comment, which leaves the client's last event ID alone
+            yield b": heartbeat\n\n"
+        elif kind == CHANGE:
+            yield b"id: " + cursor.encode() + b"\nevent: change\ndata: " + event.data + b"\n\n"
+        else:
+            yield f"id: {cursor}\nevent: {kind}\ndata: {orjson.dumps({'cursor': cursor}).decode()}\n\n".encode()
+
+@router.get("/changes")
+async def stream_changes(
+    after: Optional[str] = Query(None, description=AFTER_DESCRIPTION),
+    last_event_id: Optional[str] = Header(None),
+):
+    # EventSource sends Last-Event-ID by itself when it reconnects
+    return StreamingResponse(
+        sse_messages(last_event_id or after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/changes/ws")
+async def follow_changes(websocket: WebSocket, after: Optional[str] = Query(None, description=AFTER_DESCRIPTION)):
+    await websocket.accept()
+    messages = change_feed.follow(after)
+    try:
+        async for kind, event, cursor in messages:
+            # Heartbeats also notice clients that went away while the feed was idle
+            message = b'{"type":"' + kind.encode() + b'","cursor":"' + cursor.encode() + b'"'
+            if kind == CHANGE:
+                message += b',"change":' + event.data
+            await websocket.send_text((message + b"}").decode())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await messages.aclose()
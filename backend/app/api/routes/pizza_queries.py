@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy import exists, func, select
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from ...core.cache import PIZZAS, catalog_cache, list_key
+from ...core.revisions import catalog_revisions, content_etag
+from ...db.database import get_read_db
+from ...models.models import Pizza, pizza_toppings
+from ...schemas.schemas import Pizza as PizzaSchema
+from ..pagination import MAX_PAGE_SIZE, next_page_headers, split_page
+from ..responses import render_nested_rows
+from .pizzas import pizza_list_statements
+
+# Set queries over pizza_toppings: which pizzas have all of, none of, or only
+# these toppings. Each is answered from the association table's indexes, the
+# primary key (pizza_id, topping_id) and ix_pizza_toppings_topping_id_pizza_id.
+router = APIRouter()
+
+
+def contains_all(topping_ids: List[int]):
+    """Pizzas that have every one of the toppings (superset)."""
+    wanted = set(topping_ids)
+    # A pizza links to each topping at most once, so matching rows can be counted
+    matching = (
+        select(pizza_toppings.c.pizza_id)
+        .where(pizza_toppings.c.topping_id.in_(wanted))
+        .group_by(pizza_toppings.c.pizza_id)
+        .having(func.count() == len(wanted))
+    )
+    return Pizza.id.in_(matching)
+
+
+def contains_none(topping_ids: List[int]):
+    """Pizzas that have none of the toppings (exclusion, e.g. allergens)."""
+    return ~exists().where(
+        pizza_toppings.c.pizza_id == Pizza.id, pizza_toppings.c.topping_id.in_(set(topping_ids))
+    )
+
+
+def subset_of(topping_ids: List[int]):
+    """Pizzas whose toppings are all among these (subset), including pizzas without toppings."""
+    return ~exists().where(
+        pizza_toppings.c.pizza_id == Pizza.id, pizza_toppings.c.topping_id.not_in(set(topping_ids))
+    )
+
+
+@router.get("/pizzas/query", response_model=List[PizzaSchema], tags=["pizzas"])
+def query_pizzas(
+    request: Request,
+    all_of: List[int] = Query([], description="Pizzas must have all of these topping IDs"),
+    none_of: List[int] = Query([], description="Pizzas must have none of these topping IDs"),
+    only: Optional[List[int]] = Query(None, description="Pizzas may only have toppings from these IDs"),
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_db),
+):
+    # Taken before reading, so a write that lands meanwhile keeps this read from being cached
+    revision = catalog_revisions.revision(PIZZAS)
+    cache_key = list_key(PIZZAS, request)
+    cached = catalog_cache.lookup(cache_key)
+    if cached:
+        return cached
+
+    conditions = []
+    if all_of:
+        conditions.append(contains_all(all_of))
+    if none_of:
+        conditions.append(contains_none(none_of))
+    if only is not None:
+        conditions.append(subset_of(only))
+
+    page, toppings = pizza_list_statements(conditions, after_id, limit)
+    pizzas, next_cursor = split_page(db.execute(page).all(), limit)
+    body = render_nested_rows(pizzas, db.execute(toppings) if pizzas else (), "toppings")
+    headers = next_page_headers(request, next_cursor)
+    return catalog_cache.store(cache_key, body, headers, content_etag(body), revision).to_response()
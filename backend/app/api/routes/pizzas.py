@@ -1,88 +1,184 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from ...db.database import get_db
-from ...models.models import Pizza, Topping
-from ...schemas.schemas import PizzaCreate, Pizza as PizzaSchema
+from contextlib import contextmanager
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from typing import List, Optional
+from ...core.cache import PIZZAS, catalog_cache, item_key, list_key
+from ...core.events import CREATED, DELETED, PIZZA, UPDATED, CatalogChange, publish
+from ...core.revisions import catalog_revisions, content_etag, item_revision_key
+from ...db.database import get_db, get_read_db
+from ...models.models import Pizza, Topping, pizza_toppings, topping_signature
+from ...schemas.schemas import PizzaCreate, Pizza as PizzaSchema, PizzaItem
+from ..pagination import MAX_PAGE_SIZE, keyset, next_page_headers, split_page
+from ..preconditions import check_if_match, edit_conflict, pizza_etag
+from ..responses import json_response, render_json, render_nested_rows
 
 router = APIRouter()
 
+DUPLICATE_TOPPINGS_DETAIL = "A pizza with this combination of toppings already exists"
+
+def integrity_error_to_http(e: IntegrityError) -> Optional[HTTPException]:
+    # Names and topping combinations are only checked here, by ix_pizzas_name_lower
+    # and the signature index, rather than looked up before writing
+    if "pizzas_pkey" in str(e.orig) or "pizzas.id" in str(e.orig):
+        # The ID sequence is behind rows inserted with explicit IDs; a retry gets a later ID
+        return HTTPException(status_code=409, detail="Pizza ID already in use, please retry")
+    if "topping_signature" in str(e.orig):
+        return HTTPException(status_code=400, detail=DUPLICATE_TOPPINGS_DETAIL)
+    if "name" in str(e.orig):
+        return HTTPException(status_code=400, detail="Pizza name already exists")
+    return None
+
+def pizza_filters(topping_id: Optional[int], name_prefix: Optional[str]) -> list:
+    conditions = []
+    if topping_id is not None:
+        conditions.append(Pizza.toppings.any(Topping.id == topping_id))
+    if name_prefix:
+        # A case-sensitive LIKE 'prefix%', served by ix_pizzas_name_pattern on PostgreSQL
+        conditions.append(Pizza.name.startswith(name_prefix, autoescape=True))
+    return conditions
+
+def pizza_list_statements(conditions: list, after_id: Optional[int], limit: Optional[int]):
+    """One page of pizzas as (id, name) rows, and the (pizza_id, id, name) rows of their toppings."""
+    page = keyset(select(Pizza.id, Pizza.name).where(*conditions), Pizza, after_id, limit)
+    
+    # The page is repeated as a subquery rather than sent back as a list of IDs,
+    # which would need one bind parameter per pizza on unpaginated requests
+    toppings = (
+        select(pizza_toppings.c.pizza_id, Topping.id, Topping.name)
+        .join(Topping, Topping.id == pizza_toppings.c.topping_id)
+        .where(pizza_toppings.c.pizza_id.in_(page.with_only_columns(Pizza.id)))
+        .order_by(Topping.id)
+    )
+    return page, toppings
+
+def pizza_delete_statements(pizza: Pizza):
+    """Delete a pizza's links, returning their topping IDs, then the pizza itself.
+
+    The second statement matches no row if a concurrent write moved the pizza
+    to a new version.
+    """
+    links = delete(pizza_toppings).where(pizza_toppings.c.pizza_id == pizza.id).returning(pizza_toppings.c.topping_id)
+    return links, delete(Pizza).where(Pizza.id == pizza.id, Pizza.version_id == pizza.version_id)
+
+@contextmanager
+def _write_errors(db: Session):
+    # Constraint and version failures roll back and become HTTP errors
+    try:
+        yield
+    except IntegrityError as e:
+        db.rollback()
+        http_error = integrity_error_to_http(e)
+        if http_error:
+            raise http_error
+        raise
+    except StaleDataError:
+        db.rollback()
+        raise edit_conflict()
+
 @router.get("/", response_model=List[PizzaSchema])
-def get_pizzas(db: Session = Depends(get_db)):
-    return db.query(Pizza).all()
+def get_pizzas(
+    request: Request,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    topping_id: Optional[int] = None,
+    name_prefix: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    # Taken before reading, so a write that lands meanwhile keeps this read from being cached
+    revision = catalog_revisions.revision(PIZZAS)
+    cache_key = list_key(PIZZAS, request)
+    cached = catalog_cache.lookup(cache_key)
+    if cached:
+        return cached
+    
+    page, toppings = pizza_list_statements(pizza_filters(topping_id, name_prefix), after_id, limit)
+    pizzas, next_cursor = split_page(db.execute(page).all(), limit)
+    # Like selectinload, skip the second query when the page is empty
+    body = render_nested_rows(pizzas, db.execute(toppings) if pizzas else (), "toppings")
+    headers = next_page_headers(request, next_cursor)
+    return catalog_cache.store(cache_key, body, headers, content_etag(body), revision).to_response()
 
 @router.post("/", response_model=PizzaSchema)
 def create_pizza(pizza: PizzaCreate, db: Session = Depends(get_db)):
-    # Check if pizza name already exists
-    db_pizza = db.query(Pizza).filter(Pizza.name.ilike(pizza.name)).first()
-    if db_pizza:
-        raise HTTPException(status_code=400, detail="Pizza name already exists")
-    
-    # Get all toppings
+    # Get all toppings; they are also what the response lists
     toppings = db.query(Topping).filter(Topping.id.in_(pizza.topping_ids)).all()
     if len(toppings) != len(pizza.topping_ids):
         raise HTTPException(status_code=400, detail="Some toppings not found")
     
-    # Check if pizza with same toppings exists
-    existing_pizzas = db.query(Pizza).all()
-    for existing_pizza in existing_pizzas:
-        if set(t.id for t in existing_pizza.toppings) == set(pizza.topping_ids):
-            raise HTTPException(
-                status_code=400, 
-                detail="A pizza with this combination of toppings already exists"
-            )
-    
-    new_pizza = Pizza(name=pizza.name, toppings=toppings)
+    new_pizza = Pizza(name=pizza.name, topping_signature=topping_signature(pizza.topping_ids), toppings=toppings)
     db.add(new_pizza)
-    db.commit()
-    db.refresh(new_pizza)
-    return new_pizza
+    # The flush assigns the ID, so the response is rendered from objects in hand before
+    # committing, which would expire them and cost a refresh
+    with _write_errors(db):
+        db.flush()
+        pizza_id, body, etag = new_pizza.id, render_json(PizzaItem, new_pizza), pizza_etag(new_pizza)
+        db.commit()
+    publish(CatalogChange(PIZZA, CREATED, pizza_id, pizza.name, frozenset(pizza.topping_ids)))
+    return json_response(body, etag)
 
 @router.get("/{pizza_id}", response_model=PizzaSchema)
-def get_pizza(pizza_id: int, db: Session = Depends(get_db)):
-    pizza = db.query(Pizza).filter(Pizza.id == pizza_id).first()
+def get_pizza(pizza_id: int, db: Session = Depends(get_read_db)):
+    # Taken before reading, so a write that lands meanwhile keeps this read from being cached
+    revision = catalog_revisions.revision(item_revision_key(PIZZAS, pizza_id))
+    cache_key = item_key(PIZZAS, pizza_id)
+    cached = catalog_cache.lookup(cache_key)
+    if cached:
+        return cached
+    
+    pizza = db.query(Pizza).options(selectinload(Pizza.toppings)).filter(Pizza.id == pizza_id).first()
     if not pizza:
         raise HTTPException(status_code=404, detail="Pizza not found")
-    return pizza
+    etag = pizza_etag(pizza)
+    return catalog_cache.store(cache_key, render_json(PizzaItem, pizza), etag=etag, revision=revision).to_response()
 
 @router.put("/{pizza_id}", response_model=PizzaSchema)
-def update_pizza(pizza_id: int, pizza: PizzaCreate, db: Session = Depends(get_db)):
-    db_pizza = db.query(Pizza).filter(Pizza.id == pizza_id).first()
+def update_pizza(
+    pizza_id: int,
+    pizza: PizzaCreate,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    db_pizza = db.query(Pizza).options(selectinload(Pizza.toppings)).filter(Pizza.id == pizza_id).first()
     if not db_pizza:
         raise HTTPException(status_code=404, detail="Pizza not found")
-    
-    # Check if new name already exists
-    existing_pizza = db.query(Pizza).filter(Pizza.name.ilike(pizza.name)).first()
-    if existing_pizza and existing_pizza.id != pizza_id:
-        raise HTTPException(status_code=400, detail="Pizza name already exists")
+    check_if_match(if_match, db_pizza.version_id)
+    old_topping_ids = {t.id for t in db_pizza.toppings}
     
     # Get all toppings
     toppings = db.query(Topping).filter(Topping.id.in_(pizza.topping_ids)).all()
     if len(toppings) != len(pizza.topping_ids):
         raise HTTPException(status_code=400, detail="Some toppings not found")
     
-    # Check if pizza with same toppings exists
-    existing_pizzas = db.query(Pizza).all()
-    for existing_pizza in existing_pizzas:
-        if existing_pizza.id != pizza_id and \
-           set(t.id for t in existing_pizza.toppings) == set(pizza.topping_ids):
-            raise HTTPException(
-                status_code=400, 
-                detail="A pizza with this combination of toppings already exists"
-            )
-    
+    # Only changed links are written; an unchanged pizza is not written at all
     db_pizza.name = pizza.name
+    db_pizza.topping_signature = topping_signature(pizza.topping_ids)
     db_pizza.toppings = toppings
-    db.commit()
-    db.refresh(db_pizza)
-    return db_pizza
+    with _write_errors(db):
+        db.flush()
+        body, etag = render_json(PizzaItem, db_pizza), pizza_etag(db_pizza)
+        db.commit()
+    publish(CatalogChange(
+        PIZZA, UPDATED, pizza_id, pizza.name, frozenset(old_topping_ids | set(pizza.topping_ids))
+    ))
+    return json_response(body, etag)
 
 @router.delete("/{pizza_id}")
-def delete_pizza(pizza_id: int, db: Session = Depends(get_db)):
-    pizza = db.query(Pizza).filter(Pizza.id == pizza_id).first()
+def delete_pizza(pizza_id: int, if_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    # Only the row itself: deleting the links returns the topping IDs
+    pizza = db.get(Pizza, pizza_id)
     if not pizza:
         raise HTTPException(status_code=404, detail="Pizza not found")
+    check_if_match(if_match, pizza.version_id)
     
-    db.delete(pizza)
+    name = pizza.name
+    links, pizza_row = pizza_delete_statements(pizza)
+    topping_ids = frozenset(db.scalars(links))
+    if db.execute(pizza_row).rowcount != 1:
+        db.rollback()
+        raise edit_conflict()
     db.commit()
+    publish(CatalogChange(PIZZA, DELETED, pizza_id, name, topping_ids))
     return {"message": "Pizza deleted"}
\ No newline at end of file
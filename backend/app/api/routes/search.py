@@ -0,0 +1,86 @@
+import orjson
+import os
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import case, func, literal, or_, select, union_all
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from typing import List, Literal
+from ...core.events import PIZZA, TOPPING
+from ...core.search import (
+    FUZZY_SCORE,
+    NAME_PREFIX_SCORE,
+    WORD_PREFIX_SCORE,
+    catalog_search,
+)
+from ...db.database import get_read_db
+from ...models.models import Pizza, Topping
+from ...schemas.schemas import SearchResult
+from ..responses import json_response
+
+# Type-ahead search over pizza and topping names. PostgreSQL answers from the
+# pg_trgm GIN indexes on lower(name); other databases (SQLite) from the
+# in-memory index in app.core.search, which writes keep current.
+router = APIRouter()
+
+MAX_SEARCH_RESULTS = 50
+# Time the in-memory index may spend on a query; past it, the best matches found so far are returned
+SEARCH_BUDGET_MS = float(os.getenv("SEARCH_BUDGET_MS", "50"))
+
+SEARCH_MODELS = {PIZZA: Pizza, TOPPING: Topping}
+
+def search_statement(query: str, entities: List[str], limit: int):
+    """Ranked matches as (type, id, name, score) rows, scored like the in-memory index."""
+    selects = []
+    for entity in entities:
+        model = SEARCH_MODELS[entity]
+        name = func.lower(model.name)
+        name_prefix = name.startswith(query, autoescape=True)
+        word_prefix = name.contains(f" {query}", autoescape=True)
+        matches = [name_prefix, word_prefix]
+        if len(query) >= 3:
+            # word_similarity(query, name) >= pg_trgm.word_similarity_threshold, served by the GIN index
+            matches.append(literal(query).op("<%")(name))
+        score = case(
+            (name_prefix, NAME_PREFIX_SCORE),
+            (word_prefix, WORD_PREFIX_SCORE),
+            else_=FUZZY_SCORE * func.word_similarity(query, name),
+        )
+        selects.append(
+            select(literal(entity).label("type"), model.id, model.name, score.label("score")).where(or_(*matches))
+        )
+    hits = union_all(*selects).subquery()
+    return (
+        select(hits)
+        .order_by(hits.c.score.desc(), func.length(hits.c.name), func.lower(hits.c.name), hits.c.id)
+        .limit(limit)
+    )
+
+def _load_names(bind: Engine):
+    # Its own connection, as rebuilds run after the request's session has closed
+    with bind.connect() as conn:
+        return {entity: conn.execute(select(model.id, model.name)).all() for entity, model in SEARCH_MODELS.items()}
+
+@router.get("/search", response_model=List[SearchResult], tags=["search"])
+def search(
+    q: str = Query(..., min_length=1, max_length=100, description="Prefix or approximate name"),
+    type: List[Literal["pizza", "topping"]] = Query([PIZZA, TOPPING], description="Kinds of item to search"),
+    limit: int = Query(10, ge=1, le=MAX_SEARCH_RESULTS),
+    db: Session = Depends(get_read_db),
+):
+    query = " ".join(q.lower().split())
+    entities = list(dict.fromkeys(type))
+    if not query:
+        return json_response(b"[]")
+    
+    if db.get_bind().dialect.name == "postgresql":
+        rows = db.execute(search_statement(query, entities, limit)).all()
+        return json_response(orjson.dumps([{**row._asdict(), "score": round(row.score, 4)} for row in rows]))
+    
+    bind = db.get_bind()
+    catalog_search.ensure_loaded(lambda: _load_names(bind))
+    hits, truncated = catalog_search.search(query, entities, limit, SEARCH_BUDGET_MS)
+    response = json_response(orjson.dumps(hits))
+    if truncated:
+        # Out of time: the results are the best of the matches examined
+        response.headers["X-Search-Truncated"] = "true"
+    return response
@@ -1,70 +1,223 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from ...db.database import get_db
-from ...models.models import Topping
-from ...schemas.schemas import ToppingCreate, Topping as ToppingSchema
+from contextlib import contextmanager
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from sqlalchemy import delete, exists, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from typing import List, Literal, Optional, Union
+from ...core.cache import TOPPINGS, catalog_cache, item_key, list_key
+from ...core.events import CREATED, DELETED, TOPPING, UPDATED, CatalogChange, publish
+from ...core.revisions import catalog_revisions, content_etag, item_revision_key
+from ...db.database import get_db, get_read_db
+from ...models.models import Pizza, Topping, pizza_toppings
+from ...schemas.schemas import ToppingCreate, Topping as ToppingSchema, ToppingItem, ToppingUsage
+from ..pagination import MAX_PAGE_SIZE, keyset, next_page_headers, split_page
+from ..preconditions import check_if_match, edit_conflict, topping_etag
+from ..responses import json_response, render_json, render_nested_rows, render_rows
 
 router = APIRouter()
 
-@router.get("/", response_model=List[ToppingSchema])
-def get_toppings(db: Session = Depends(get_db)):
-    return db.query(Topping).all()
+def integrity_error_to_http(e: IntegrityError, name_taken_detail: str) -> Optional[HTTPException]:
+    # Name uniqueness is enforced by ix_toppings_name_lower rather than checked up front
+    if "toppings_pkey" in str(e.orig) or "toppings.id" in str(e.orig):
+        # The ID sequence is behind rows inserted with explicit IDs; a retry gets a later ID
+        return HTTPException(status_code=409, detail="Topping ID already in use, please retry")
+    if "name" in str(e.orig):
+        return HTTPException(status_code=400, detail=name_taken_detail)
+    return None
+
+# Pizzas named in the "topping in use" error; pizza_count covers the rest
+IN_USE_EXAMPLES = 20
+
+def topping_filters(name_prefix: Optional[str]) -> list:
+    conditions = []
+    if name_prefix:
+        # A case-sensitive LIKE 'prefix%', served by ix_toppings_name_pattern on PostgreSQL
+        conditions.append(Topping.name.startswith(name_prefix, autoescape=True))
+    return conditions
+
+def topping_list_statements(conditions: list, after_id: Optional[int], limit: Optional[int]):
+    """One page of toppings as (id, name) rows, and the (topping_id, id, name) rows of their pizzas."""
+    page = keyset(select(Topping.id, Topping.name).where(*conditions), Topping, after_id, limit)
+    
+    pizzas = (
+        select(pizza_toppings.c.topping_id, Pizza.id, Pizza.name)
+        .join(Pizza, Pizza.id == pizza_toppings.c.pizza_id)
+        .where(pizza_toppings.c.topping_id.in_(page.with_only_columns(Topping.id)))
+        .order_by(Pizza.id)
+    )
+    return page, pizzas
+
+def topping_counts_statement(conditions: list, after_id: Optional[int], limit: Optional[int]):
+    """One page of toppings as (name, id, pizza_count) rows.
+    
+    Each count is an index-only range scan of ix_pizza_toppings_topping_id_pizza_id,
+    so popular toppings cost a count rather than a list of their pizzas.
+    """
+    pizza_count = (
+        select(func.count()).where(pizza_toppings.c.topping_id == Topping.id).scalar_subquery()
+    )
+    return keyset(
+        select(Topping.name, Topping.id, pizza_count.label("pizza_count")).where(*conditions),
+        Topping, after_id, limit,
+    )
+
+def topping_pizzas_statement(topping_id: int):
+    """The (id, name, version_id) rows of a topping's pizzas, for its document and entity tag."""
+    return (
+        select(Pizza.id, Pizza.name, Pizza.version_id)
+        .join(pizza_toppings, pizza_toppings.c.pizza_id == Pizza.id)
+        .where(pizza_toppings.c.topping_id == topping_id)
+        .order_by(Pizza.id)
+    )
+
+def topping_delete_statement(topping: Topping):
+    # A Core delete, as deleting the object would load topping.pizzas to clear the
+    # links. It matches no row if a concurrent write moved the topping to a new version.
+    return delete(Topping).where(Topping.id == topping.id, Topping.version_id == topping.version_id)
+
+def topping_in_use_statement(topping_id: int):
+    return select(exists().where(pizza_toppings.c.topping_id == topping_id))
+
+def topping_in_use_error_statements(topping_id: int):
+    """The number of pizzas using a topping, and the first IN_USE_EXAMPLES of their names."""
+    count = select(func.count()).where(pizza_toppings.c.topping_id == topping_id)
+    names = (
+        select(Pizza.name)
+        .join(pizza_toppings, pizza_toppings.c.pizza_id == Pizza.id)
+        .where(pizza_toppings.c.topping_id == topping_id)
+        .order_by(Pizza.id)
+        .limit(IN_USE_EXAMPLES)
+    )
+    return count, names
+
+def topping_in_use_error(pizza_count: int, pizza_names: List[str]) -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail={
+            "message": "Cannot delete topping as it is used in existing pizzas",
+            "pizzas": pizza_names,
+            "pizza_count": pizza_count,
+        }
+    )
+
+@contextmanager
+def _write_errors(db: Session, name_taken_detail: str):
+    # Constraint and version failures roll back and become HTTP errors
+    try:
+        yield
+    except IntegrityError as e:
+        db.rollback()
+        http_error = integrity_error_to_http(e, name_taken_detail)
+        if http_error:
+            raise http_error
+        raise
+    except StaleDataError:
+        db.rollback()
+        raise edit_conflict()
+
+@router.get("/", response_model=Union[List[ToppingSchema], List[ToppingUsage]])
+def get_toppings(
+    request: Request,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    name_prefix: Optional[str] = None,
+    include: Optional[Literal["counts"]] = Query(None, description="counts: pizza_count instead of the pizza list"),
+    db: Session = Depends(get_read_db),
+):
+    # Taken before reading, so a write that lands meanwhile keeps this read from being cached
+    revision = catalog_revisions.revision(TOPPINGS)
+    cache_key = list_key(TOPPINGS, request)
+    cached = catalog_cache.lookup(cache_key)
+    if cached:
+        return cached
+    
+    conditions = topping_filters(name_prefix)
+    if include == "counts":
+        toppings, next_cursor = split_page(db.execute(topping_counts_statement(conditions, after_id, limit)).all(), limit)
+        body = render_rows(toppings)
+    else:
+        page, pizzas = topping_list_statements(conditions, after_id, limit)
+        toppings, next_cursor = split_page(db.execute(page).all(), limit)
+        # Like selectinload, skip the second query when the page is empty
+        body = render_nested_rows(toppings, db.execute(pizzas) if toppings else (), "pizzas")
+    headers = next_page_headers(request, next_cursor)
+    return catalog_cache.store(cache_key, body, headers, content_etag(body), revision).to_response()
 
 @router.post("/", response_model=ToppingSchema)
 def create_topping(topping: ToppingCreate, db: Session = Depends(get_db)):
-    # Check if topping already exists
-    db_topping = db.query(Topping).filter(Topping.name.ilike(topping.name)).first()
-    if db_topping:
-        raise HTTPException(status_code=400, detail="Topping already exists")
-    
-    new_topping = Topping(name=topping.name)
+    # An empty pizza list, so rendering it does not lazy-load one
+    new_topping = Topping(name=topping.name, pizzas=[])
     db.add(new_topping)
-    db.commit()
-    db.refresh(new_topping)
-    return new_topping
+    # The flush assigns the ID (INSERT ... RETURNING), so the response is rendered
+    # before committing, which would expire the object and cost a refresh
+    with _write_errors(db, "Topping already exists"):
+        db.flush()
+        topping_id, body, etag = new_topping.id, render_json(ToppingItem, new_topping), topping_etag(new_topping, ())
+        db.commit()
+    publish(CatalogChange(TOPPING, CREATED, topping_id, topping.name))
+    return json_response(body, etag)
 
 @router.get("/{topping_id}", response_model=ToppingSchema)
-def get_topping(topping_id: int, db: Session = Depends(get_db)):
-    topping = db.query(Topping).filter(Topping.id == topping_id).first()
+def get_topping(topping_id: int, db: Session = Depends(get_read_db)):
+    # Taken before reading, so a write that lands meanwhile keeps this read from being cached
+    revision = catalog_revisions.revision(item_revision_key(TOPPINGS, topping_id))
+    cache_key = item_key(TOPPINGS, topping_id)
+    cached = catalog_cache.lookup(cache_key)
+    if cached:
+        return cached
+    
+    topping = db.query(Topping).options(selectinload(Topping.pizzas)).filter(Topping.id == topping_id).first()
     if not topping:
         raise HTTPException(status_code=404, detail="Topping not found")
-    return topping
+    etag = topping_etag(topping, ((p.id, p.version_id) for p in topping.pizzas))
+    return catalog_cache.store(cache_key, render_json(ToppingItem, topping), etag=etag, revision=revision).to_response()
 
 @router.put("/{topping_id}", response_model=ToppingSchema)
-def update_topping(topping_id: int, topping: ToppingCreate, db: Session = Depends(get_db)):
+def update_topping(
+    topping_id: int,
+    topping: ToppingCreate,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
     db_topping = db.query(Topping).filter(Topping.id == topping_id).first()
     if not db_topping:
         raise HTTPException(status_code=404, detail="Topping not found")
-    
-    # Check if new name already exists
-    existing_topping = db.query(Topping).filter(Topping.name.ilike(topping.name)).first()
-    if existing_topping and existing_topping.id != topping_id:
-        raise HTTPException(status_code=400, detail="Topping name already exists")
+    check_if_match(if_match, db_topping.version_id)
     
     db_topping.name = topping.name
-    db.commit()
-    db.refresh(db_topping)
-    return db_topping
+    with _write_errors(db, "Topping name already exists"):
+        db.flush()
+        # The response lists the pizzas, which embed the topping's name and so change with it.
+        # Read as rows in the same transaction, without loading topping.pizzas.
+        pizzas = db.execute(topping_pizzas_statement(topping_id)).all()
+        body = render_json(ToppingItem, {
+            "name": topping.name,
+            "id": topping_id,
+            "pizzas": [{"name": row.name, "id": row.id} for row in pizzas],
+        })
+        etag = topping_etag(db_topping, ((row.id, row.version_id) for row in pizzas))
+        db.commit()
+    publish(CatalogChange(
+        TOPPING, UPDATED, topping_id, topping.name, frozenset(row.id for row in pizzas)
+    ))
+    return json_response(body, etag)
 
 @router.delete("/{topping_id}")
-def delete_topping(topping_id: int, db: Session = Depends(get_db)):
+def delete_topping(topping_id: int, if_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
     topping = db.query(Topping).filter(Topping.id == topping_id).first()
     if not topping:
         raise HTTPException(status_code=404, detail="Topping not found")
+    check_if_match(if_match, topping.version_id)
     
-    # Check if topping is used in any pizzas
-    if topping.pizzas:
-        # Return 400 with list of pizzas using this topping
-        pizza_names = [pizza.name for pizza in topping.pizzas]
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "message": "Cannot delete topping as it is used in existing pizzas",
-                "pizzas": pizza_names
-            }
-        )
+    # Check if topping is used in any pizzas, without loading them
+    if db.scalar(topping_in_use_statement(topping_id)):
+        count, names = topping_in_use_error_statements(topping_id)
+        raise topping_in_use_error(db.scalar(count), list(db.scalars(names)))
     
-    db.delete(topping)
+    if db.execute(topping_delete_statement(topping)).rowcount != 1:
+        db.rollback()
+        raise edit_conflict()
     db.commit()
+    publish(CatalogChange(TOPPING, DELETED, topping_id, topping.name))
     return {"message": "Topping deleted"}
\ No newline at end of file
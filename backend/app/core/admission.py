@@ -0,0 +1,366 @@
+"""Admission control: bound the work in progress and shed the excess early.
+
+Without it a traffic spike queues in the threadpool and on the database pool
+until every request times out together. AdmissionMiddleware instead lets at
+most ADMISSION_MAX_CONCURRENCY requests run per worker and holds up to
+ADMISSION_MAX_QUEUE more for at most ADMISSION_QUEUE_TIMEOUT seconds. Beyond
+that it answers 503 with Retry-After straight away, which a client can act
+on, rather than a timeout after thirty seconds.
+
+- Reads are cheap and keep the menus up, so queued reads are admitted before
+  queued writes, and writes may only take ADMISSION_WRITE_SHARE of the slots.
+- Expensive routes get their own, smaller limit on top (ADMISSION_ROUTE_LIMITS,
+  e.g. "POST /api/pizzas/=8,POST /api/catalog/import=1").
+- Each client may write ADMISSION_WRITE_RATE times per second, in bursts of up
+  to ADMISSION_WRITE_BURST (a token bucket); past that it gets 429.
+
+All state is per worker and only touched on its event loop, so it needs no
+locks. Counters for tuning are served at /health/admission and /metrics.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "64"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "256"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+ADMISSION_WRITE_SHARE = float(os.getenv("ADMISSION_WRITE_SHARE", "0.5"))
+ADMISSION_ROUTE_LIMITS = os.getenv(
+    "ADMISSION_ROUTE_LIMITS",
+    "POST /api/pizzas/=8,PUT /api/pizzas/{pizza_id}=8,"
+    "POST /api/pizzas/bulk=2,PUT /api/pizzas/bulk=2,POST /api/toppings/bulk=2,PUT /api/toppings/bulk=2,"
+    "POST /api/catalog/import=1",
+)
+ADMISSION_ROUTE_QUEUE = int(os.getenv("ADMISSION_ROUTE_QUEUE", "32"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+ADMISSION_WRITE_RATE = float(os.getenv("ADMISSION_WRITE_RATE", "10"))
+ADMISSION_WRITE_BURST = int(os.getenv("ADMISSION_WRITE_BURST", "50"))
+# Header naming the client for the write rate limit, e.g. X-Forwarded-For behind a proxy; else the peer address
+ADMISSION_CLIENT_HEADER = os.getenv("ADMISSION_CLIENT_HEADER", "").lower()
+# Long-lived streams and the probes used to watch an overloaded worker are never queued
+ADMISSION_EXEMPT_PATHS = tuple(
+    path for path in os.getenv("ADMISSION_EXEMPT_PATHS", "/health,/metrics,/api/changes").split(",") if path
+)
+
+READ = "read"
+WRITE = "write"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Reasons a request is turned away
+QUEUE_FULL = "queue_full"
+QUEUE_TIMEOUT = "queue_timeout"
+RATE_LIMITED = "rate_limited"
+
+
+def parse_route_limits(spec: str) -> Dict[str, int]:
+    """'METHOD /path=limit,...' as {'METHOD /path': limit}; paths are route templates."""
+    limits = {}
+    for entry in spec.split(","):
+        route, _, limit = entry.strip().rpartition("=")
+        if route:
+            limits[route.strip()] = int(limit)
+    return limits
+
+
+def _expire(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_exception(asyncio.TimeoutError())
+
+
+class Lane:
+    """A concurrency limit with a bounded queue, admitting queued reads before queued writes."""
+
+    def __init__(self, limit: int, max_queue: int, write_limit: Optional[int] = None):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.write_limit = limit if write_limit is None else write_limit
+        self.active = {READ: 0, WRITE: 0}
+        self.waiters = {READ: deque(), WRITE: deque()}
+        self.admitted = {READ: 0, WRITE: 0}
+        self.rejected = {(kind, reason): 0 for kind in (READ, WRITE) for reason in (QUEUE_FULL, QUEUE_TIMEOUT)}
+
+    def queued(self, kind: Optional[str] = None) -> int:
+        if kind is None:
+            return len(self.waiters[READ]) + len(self.waiters[WRITE])
+        return len(self.waiters[kind])
+
+    def _can_start(self, kind: str) -> bool:
+        if self.active[READ] + self.active[WRITE] >= self.limit:
+            return False
+        return kind == READ or self.active[WRITE] < self.write_limit
+
+    def _start(self, kind: str):
+        self.active[kind] += 1
+        self.admitted[kind] += 1
+
+    async def acquire(self, kind: str, timeout: float) -> Optional[str]:
+        """Take a slot, waiting in the queue if need be. Returns why not, or None once admitted."""
+        if not self.waiters[kind] and self._can_start(kind):
+            self._start(kind)
+            return None
+        if self.queued() >= self.max_queue:
+            self.rejected[(kind, QUEUE_FULL)] += 1
+            return QUEUE_FULL
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self.waiters[kind].append(waiter)
+        # A timer rather than asyncio.wait_for, which would add a task per waiter
+        timer = loop.call_later(timeout, _expire, waiter)
+        try:
+            await waiter
+        except asyncio.TimeoutError:
+            self._forget(kind, waiter)
+            self.rejected[(kind, QUEUE_TIMEOUT)] += 1
+            return QUEUE_TIMEOUT
+        except BaseException:
+            # The client went away: hand back a slot granted meanwhile
+            self._forget(kind, waiter)
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                self.release(kind)
+            raise
+        finally:
+            timer.cancel()
+        return None
+
+    def _forget(self, kind: str, waiter: asyncio.Future):
+        try:
+            self.waiters[kind].remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, kind: str):
+        self.active[kind] -= 1
+        self._wake()
+
+    def _wake(self):
+        for kind in (READ, WRITE):
+            waiters = self.waiters[kind]
+            while waiters and self._can_start(kind):
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    self._start(kind)
+                    waiter.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "write_limit": self.write_limit,
+            "active": dict(self.active),
+            "queued": {kind: len(waiters) for kind, waiters in self.waiters.items()},
+            "max_queue": self.max_queue,
+            "admitted": dict(self.admitted),
+            "rejected": {f"{kind}_{reason}": count for (kind, reason), count in self.rejected.items()},
+        }
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = now
+
+    def take(self, now: float) -> float:
+        """Spend a token; returns 0, or the seconds until one is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Per-client token buckets; the least recently seen clients are forgotten past max_clients."""
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.limited = 0
+
+    def take(self, client: str) -> float:
+        now = time.monotonic()
+        bucket = self.buckets.get(client)
+        if bucket is None:
+            bucket = self.buckets[client] = TokenBucket(self.rate, self.burst, now)
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(client)
+        wait = bucket.take(now)
+        if wait:
+            self.limited += 1
+        return wait
+
+
+class AdmissionController:
+    """The worker-wide lane, the lanes of expensive routes and the write rate limiter."""
+
+    def __init__(
+        self,
+        max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        write_share: float = ADMISSION_WRITE_SHARE,
+        route_limits: Optional[Dict[str, int]] = None,
+        route_queue: int = ADMISSION_ROUTE_QUEUE,
+        write_rate: float = ADMISSION_WRITE_RATE,
+        write_burst: int = ADMISSION_WRITE_BURST,
+        enabled: bool = ADMISSION_ENABLED,
+    ):
+        self.enabled = enabled
+        self.queue_timeout = queue_timeout
+        self.lane = Lane(max_concurrency, max_queue, max(1, int(max_concurrency * write_share)))
+        if route_limits is None:
+            route_limits = parse_route_limits(ADMISSION_ROUTE_LIMITS)
+        self.route_lanes = {route: Lane(limit, route_queue) for route, limit in route_limits.items()}
+        self.rate_limiter = RateLimiter(write_rate, write_burst) if write_rate > 0 else None
+
+    async def admit(self, kind: str, route: Optional[str]) -> Tuple[Optional[str], List[Lane]]:
+        """Acquire the route's lane, then the worker's. Returns the reason for turning the request away, if any, and the lanes held."""
+        lanes = [self.route_lanes[route]] if route in self.route_lanes else []
+        lanes.append(self.lane)
+        held = []
+        for lane in lanes:
+            reason = await lane.acquire(kind, self.queue_timeout)
+            if reason is not None:
+                self.release(kind, held)
+                return reason, []
+            held.append(lane)
+        return None, held
+
+    @staticmethod
+    def release(kind: str, lanes: Iterable[Lane]):
+        for lane in reversed(list(lanes)):
+            lane.release(kind)
+
+    def reset(self):
+        """Forget the rate limits and counters, e.g. between tests. Requests in flight keep their slots."""
+        for lane in [self.lane, *self.route_lanes.values()]:
+            lane.admitted = dict.fromkeys(lane.admitted, 0)
+            lane.rejected = dict.fromkeys(lane.rejected, 0)
+        if self.rate_limiter is not None:
+            self.rate_limiter.buckets.clear()
+            self.rate_limiter.limited = 0
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queue_timeout": self.queue_timeout,
+            "worker": self.lane.stats(),
+            "routes": {route: lane.stats() for route, lane in self.route_lanes.items()},
+            "rate_limited": self.rate_limiter.limited if self.rate_limiter else 0,
+        }
+
+    def render(self) -> str:
+        """Prometheus text exposition of the worker lane, appended to /metrics."""
+        lane = self.lane
+        lines = [
+            "# HELP admission_active_requests Requests admitted and not finished, by class.",
+            "# TYPE admission_active_requests gauge",
+        ]
+        lines += [f'admission_active_requests{{class="{kind}"}} {count}' for kind, count in lane.active.items()]
+        lines += [
+            "# HELP admission_queue_depth Requests waiting for a slot, by class.",
+            "# TYPE admission_queue_depth gauge",
+        ]
+        lines += [f'admission_queue_depth{{class="{kind}"}} {len(waiters)}' for kind, waiters in lane.waiters.items()]
+        lines += [
+            "# HELP admission_rejections_total Requests turned away, by class and reason.",
+            "# TYPE admission_rejections_total counter",
+        ]
+        rejected = dict(lane.rejected)
+        for route_lane in self.route_lanes.values():
+            for key, count in route_lane.rejected.items():
+                rejected[key] += count
+        lines += [
+            f'admission_rejections_total{{class="{kind}",reason="{reason}"}} {count}'
+            for (kind, reason), count in sorted(rejected.items())
+        ]
+        lines.append(
+            f'admission_rejections_total{{class="{WRITE}",reason="{RATE_LIMITED}"}} '
+            f'{self.rate_limiter.limited if self.rate_limiter else 0}'
+        )
+        return "\n".join(lines) + "\n"
+
+
+admission = AdmissionController()
+
+
+def _retry_after(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+class AdmissionMiddleware:
+    """Applies the admission controller to HTTP requests.
+
+    A plain ASGI middleware like MetricsMiddleware, mounted just inside it so
+    rejections still show up in the request metrics. Routes with their own
+    limit are found by matching only those routes' templates.
+    """
+
+    def __init__(self, app, routes: list, controller: AdmissionController = admission):
+        self.app = app
+        self.routes = routes
+        self.controller = controller
+        self._limited_routes = None
+
+    def _route_key(self, scope) -> Optional[str]:
+        if self._limited_routes is None:
+            # Built on the first request, once every router is mounted
+            self._limited_routes = [
+                (route, f"{method} {route.path}")
+                for route in self.routes
+                for method in sorted(getattr(route, "methods", None) or ())
+                if f"{method} {route.path}" in self.controller.route_lanes
+            ]
+        for route, key in self._limited_routes:
+            if key.startswith(scope["method"] + " ") and route.matches(scope)[0] == Match.FULL:
+                return key
+        return None
+
+    def _client(self, scope) -> str:
+        if ADMISSION_CLIENT_HEADER:
+            for name, value in scope.get("headers", []):
+                if name.decode("latin-1") == ADMISSION_CLIENT_HEADER:
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        controller = self.controller
+        if scope["type"] != "http" or not controller.enabled or scope["path"].startswith(ADMISSION_EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        kind = READ if scope["method"] in SAFE_METHODS else WRITE
+        if kind == WRITE and controller.rate_limiter is not None:
+            wait = controller.rate_limiter.take(self._client(scope))
+            if wait:
+                response = JSONResponse(
+                    {"detail": "Too many writes, retry later"}, status_code=429, headers=_retry_after(wait)
+                )
+                await response(scope, receive, send)
+                return
+
+        reason, lanes = await controller.admit(kind, self._route_key(scope))
+        if reason is not None:
+            response = JSONResponse(
+                {"detail": "Server busy, retry later", "reason": reason},
+                status_code=503,
+                headers=_retry_after(ADMISSION_RETRY_AFTER),
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(kind, lanes)
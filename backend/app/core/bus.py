@@ -0,0 +1,258 @@
+"""Relay of catalog changes between workers, through the database.
+
+Each worker keeps its response cache, search index and change feed in memory
+and learns of writes from publish(), which on its own only covers the writes
+the worker handled. The bus appends every change a worker publishes to the
+catalog_changes table, and every worker reads the rows the others appended and
+publishes them locally as remote changes. So caches drop their entries and
+feed subscribers hear of a write whichever worker, or instance, handled it.
+
+On PostgreSQL writers NOTIFY and readers LISTEN, so changes arrive within
+milliseconds; elsewhere, or if LISTEN fails, readers poll every
+CHANGE_BUS_POLL_SECONDS. Writers append under an advisory lock on PostgreSQL
+(SQLite serializes writes by itself), so row IDs become visible in order and a
+reader that remembers the last ID it saw misses none. Rows older than
+CHANGE_LOG_RETENTION_SECONDS are pruned.
+
+Changes are appended by a background thread once the write has committed, so
+a worker that dies in between loses them for the others. Their cached entries
+still expire after CATALOG_CACHE_TTL.
+"""
+import logging
+import os
+import queue
+import select
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+from sqlalchemy import delete, func, insert, text
+from sqlalchemy.engine import Engine
+from ..models.models import CatalogChangeRecord
+from .events import CatalogChange, on_local_catalog_change, publish
+
+logger = logging.getLogger(__name__)
+
+CHANGE_BUS_ENABLED = os.getenv("CHANGE_BUS_ENABLED", "true").lower() in ("1", "true", "yes")
+CHANGE_BUS_POLL_SECONDS = float(os.getenv("CHANGE_BUS_POLL_SECONDS", "1"))
+CHANGE_LOG_RETENTION_SECONDS = float(os.getenv("CHANGE_LOG_RETENTION_SECONDS", "3600"))
+
+CHANNEL = "catalog_changes"
+# Any constant will do, as long as every writer takes the same one
+APPEND_LOCK_KEY = 7_411_903
+# Rows read per query; a full batch is followed by another query straight away
+READ_BATCH = 500
+PRUNE_INTERVAL = 60
+
+changes_table = CatalogChangeRecord.__table__
+
+
+def record_values(origin: str, change: CatalogChange, now: datetime) -> dict:
+    return {
+        "origin": origin,
+        "entity": change.entity,
+        "action": change.action,
+        "item_id": change.id,
+        "name": change.name,
+        "related_ids": ",".join(str(related_id) for related_id in sorted(change.related_ids)),
+        "created_at": now,
+    }
+
+
+def record_change(row) -> CatalogChange:
+    related_ids = frozenset(int(related_id) for related_id in row.related_ids.split(",") if related_id)
+    return CatalogChange(row.entity, row.action, row.item_id, row.name, related_ids)
+
+
+def _publish_remote(change: CatalogChange):
+    publish(change, remote=True)
+
+
+class ChangeBus:
+    """Appends this worker's changes to the change log and publishes the other workers' ones."""
+
+    def __init__(
+        self,
+        poll_seconds: float = CHANGE_BUS_POLL_SECONDS,
+        retention: float = CHANGE_LOG_RETENTION_SECONDS,
+        deliver: Callable[[CatalogChange], None] = _publish_remote,
+    ):
+        self.poll_seconds = poll_seconds
+        self.retention = retention
+        self.deliver = deliver
+        self.engine: Optional[Engine] = None
+        self.origin = ""
+        self.last_id = 0
+        self.appended = 0
+        self.received = 0
+        self.errors = 0
+        self._pending: "queue.Queue[Optional[CatalogChange]]" = queue.Queue()
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def open(self, engine: Engine):
+        """Follow the log from its current end. Does not start the threads, see start."""
+        # Made here rather than at import, so workers forked from a preloaded app differ
+        self.origin = uuid.uuid4().hex
+        with engine.connect() as conn:
+            self.last_id = conn.scalar(func.max(changes_table.c.id).select()) or 0
+        self.engine = engine
+
+    def start(self, engine: Engine):
+        try:
+            self.open(engine)
+        except Exception:
+            # E.g. the migrations have not been run yet; each worker then only sees its own writes
+            logger.exception("Change bus not started: other workers' writes will not be relayed")
+            return
+        self._stopped.clear()
+        self._pending = queue.Queue()
+        self._threads = [
+            threading.Thread(target=self._write_loop, name="change-bus-writer", daemon=True),
+            threading.Thread(target=self._read_loop, name="change-bus-reader", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stopped.set()
+        self._pending.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self.engine = None
+
+    def append(self, change: CatalogChange):
+        """Queue a change this worker published; a no-op until the bus is open."""
+        if self.engine is not None:
+            self._pending.put(change)
+
+    def write(self, changes: List[CatalogChange]):
+        now = datetime.utcnow()
+        postgres = self.engine.dialect.name == "postgresql"
+        with self.engine.begin() as conn:
+            if postgres:
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": APPEND_LOCK_KEY})
+            conn.execute(insert(changes_table), [record_values(self.origin, change, now) for change in changes])
+            if postgres:
+                # Delivered to the listeners when the transaction commits
+                conn.execute(text("SELECT pg_notify(:channel, '')"), {"channel": CHANNEL})
+        self.appended += len(changes)
+
+    def poll(self) -> int:
+        """Publish the changes other workers appended since the last poll; returns the rows read."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                changes_table.select()
+                .where(changes_table.c.id > self.last_id)
+                .order_by(changes_table.c.id)
+                .limit(READ_BATCH)
+            ).all()
+        for row in rows:
+            self.last_id = row.id
+            if row.origin != self.origin:
+                self.received += 1
+                self.deliver(record_change(row))
+        return len(rows)
+
+    def prune(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        with self.engine.begin() as conn:
+            conn.execute(delete(changes_table).where(changes_table.c.created_at < cutoff))
+
+    def _write_loop(self):
+        while True:
+            change = self._pending.get()
+            if change is None:
+                return
+            # Whatever queued up meanwhile goes in the same transaction
+            changes = [change]
+            while True:
+                try:
+                    change = self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                if change is None:
+                    self._pending.put(None)
+                    break
+                changes.append(change)
+            try:
+                self.write(changes)
+            except Exception:
+                self.errors += 1
+                logger.exception(f"Could not append {len(changes)} catalog change(s) to the change log")
+
+    def _read_loop(self):
+        listener = None
+        next_prune = 0.0
+        while not self._stopped.is_set():
+            try:
+                if listener is None:
+                    listener = self._listen()
+                while self.poll() == READ_BATCH:
+                    pass
+                if time.monotonic() >= next_prune:
+                    self.prune()
+                    next_prune = time.monotonic() + PRUNE_INTERVAL
+            except Exception:
+                self.errors += 1
+                logger.exception("Could not read the change log")
+            listener = self._wait(listener)
+        if listener is not None:
+            listener.close()
+
+    def _listen(self):
+        """A connection LISTENing for appends, or None where only polling works."""
+        if self.engine.dialect.name != "postgresql":
+            return None
+        # Detached, so the connection does not hold a pool slot for the life of the worker
+        connection = self.engine.raw_connection()
+        connection.detach()
+        listener = connection.driver_connection
+        if not hasattr(listener, "notifies"):
+            # Not psycopg2: poll instead
+            connection.close()
+            return None
+        listener.autocommit = True
+        with listener.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return listener
+
+    def _wait(self, listener):
+        if listener is None:
+            self._stopped.wait(self.poll_seconds)
+            return None
+        try:
+            # Also wakes every poll_seconds, to notice stop and to prune
+            readable, _, _ = select.select([listener], [], [], self.poll_seconds)
+            if readable:
+                listener.poll()
+                listener.notifies.clear()
+            return listener
+        except Exception:
+            logger.warning("Lost the change log LISTEN connection; reconnecting", exc_info=True)
+            try:
+                listener.close()
+            except Exception:
+                pass
+            self._stopped.wait(self.poll_seconds)
+            return None
+
+    def stats(self) -> dict:
+        return {
+            "running": bool(self._threads),
+            "last_id": self.last_id,
+            "appended": self.appended,
+            "received": self.received,
+            "pending": self._pending.qsize(),
+            "errors": self.errors,
+        }
+
+
+change_bus = ChangeBus()
+
+
+@on_local_catalog_change
+def _append_to_log(change: CatalogChange):
+    change_bus.append(change)
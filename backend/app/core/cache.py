@@ -0,0 +1,251 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Tuple
+from fastapi import Request, Response
+from starlette.datastructures import Headers
+from .compression import compress, mark_encoded, response_encoding
+from .events import CATALOG, PIZZA, CatalogChange, on_catalog_change
+from .revisions import PIZZAS, TOPPINGS, catalog_revisions, encoded_etag, etag_matches
+
+
+@dataclass
+class CachedResponse:
+    """A rendered JSON response. Shared backends must be able to pickle it."""
+
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+    etag: Optional[str] = None
+    # Compressed copies of body by content coding, each made the first time a client accepts it
+    encoded_bodies: Dict[str, bytes] = field(default_factory=dict)
+
+    def encoded(self, encoding: str) -> bytes:
+        body = self.encoded_bodies.get(encoding)
+        if body is None:
+            body = self.encoded_bodies[encoding] = compress(self.body, encoding)
+        return body
+
+    def to_response(self) -> Response:
+        headers = dict(self.headers)
+        if self.etag:
+            headers["ETag"] = self.etag
+        return CachedJSONResponse(self, headers)
+
+
+class CachedJSONResponse(Response):
+    """Sends a cache entry, or its compressed copy when the client accepts one.
+
+    The coding is chosen when the response is sent, from the request's
+    Accept-Encoding, so the routes returning it need not look at the header.
+    Likewise a client that already holds the entry's tag (If-None-Match) gets
+    304, whether the entry came from the cache or was just rendered.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, entry: CachedResponse, headers: Dict[str, str]):
+        super().__init__(content=entry.body, headers=headers)
+        self.entry = entry
+
+    async def __call__(self, scope, receive, send):
+        encoding = response_encoding(scope, len(self.entry.body))
+        if self.entry.etag and self.status_code == 200:
+            if_none_match = Headers(scope=scope).get("if-none-match")
+            if if_none_match and etag_matches(if_none_match, self.entry.etag):
+                # The tag of the coding that a 200 would have been sent in
+                etag = encoded_etag(self.entry.etag, encoding) if encoding else self.entry.etag
+                await Response(status_code=304, headers={"ETag": etag})(scope, receive, send)
+                return
+        if encoding is not None:
+            self.body = self.entry.encoded(encoding)
+            mark_encoded(self.headers, encoding, len(self.body))
+        await super().__call__(scope, receive, send)
+
+
+class CacheBackend(ABC):
+    """Storage interface for the catalog cache.
+
+    The default InMemoryCacheBackend is per process. Multi-worker deployments
+    should plug in a shared store with set_cache_backend so that writes handled
+    by one worker invalidate the entries of all of them.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[CachedResponse]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: CachedResponse, ttl: float):
+        ...
+
+    @abstractmethod
+    def delete(self, keys: Iterable[str]):
+        ...
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Thread-safe LRU dictionary with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ResponseCache:
+    """Read-through cache of rendered catalog responses with hit/miss counters."""
+
+    def __init__(self, backend: CacheBackend, ttl: float, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        if not self.enabled:
+            return None
+        entry = self.backend.get(key)
+        # Counters are approximate under concurrency, which is fine for monitoring
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def lookup(self, key: str) -> Optional[Response]:
+        """Answer a GET without the database, or None on a miss.
+
+        A hit answers 304 if the client already holds the entry's tag. Entries
+        are dropped by the writes this worker learns of and expire after ttl,
+        which bounds how long a write it never hears of can go unnoticed.
+        """
+        cached = self.get(key)
+        return cached.to_response() if cached else None
+
+    def store(
+        self,
+        key: str,
+        body: bytes,
+        headers: Optional[Dict[str, str]] = None,
+        etag: Optional[str] = None,
+        revision: Optional[Tuple[str, int]] = None,
+    ) -> CachedResponse:
+        """Keep a rendered response, unless a write has moved revision on since the read began."""
+        entry = CachedResponse(body=body, headers=headers or {}, etag=etag)
+        if self.enabled and (revision is None or catalog_revisions.is_current(revision)):
+            self.backend.set(key, entry, self.ttl)
+        return entry
+
+    def invalidate(self, namespace: str, ids: Iterable[int] = ()):
+        """Drop every list of a namespace and the given items of it."""
+        self.backend.delete_prefix(f"{namespace}:list:")
+        self.backend.delete([item_key(namespace, item_id) for item_id in ids])
+
+    def invalidate_all(self, namespace: str):
+        """Drop every list and item of a namespace."""
+        self.backend.delete_prefix(f"{namespace}:")
+
+    def clear(self):
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def list_key(namespace: str, request: Request) -> str:
+    # Sorted so that the same filters in any order share an entry. The path tells
+    # apart the list routes of a namespace, e.g. /api/pizzas/ and /api/pizzas/query
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{namespace}:list:{request.url.path}?{query}"
+
+
+def item_key(namespace: str, item_id: int) -> str:
+    return f"{namespace}:item:{item_id}"
+
+
+catalog_cache = ResponseCache(
+    InMemoryCacheBackend(max_entries=int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "1024"))),
+    ttl=float(os.getenv("CATALOG_CACHE_TTL", "60")),
+    enabled=os.getenv("CATALOG_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"),
+)
+
+
+def set_cache_backend(backend: CacheBackend):
+    catalog_cache.backend = backend
+
+
+@on_catalog_change
+def _invalidate_catalog(change: CatalogChange):
+    # Pizzas embed topping names and toppings embed pizza names, so a write
+    # changes the lists of both namespaces and the items on the other side
+    if change.entity == CATALOG:
+        catalog_cache.invalidate_all(PIZZAS)
+        catalog_cache.invalidate_all(TOPPINGS)
+    elif change.entity == PIZZA:
+        catalog_cache.invalidate(PIZZAS, [change.id])
+        catalog_cache.invalidate(TOPPINGS, change.related_ids)
+    else:
+        catalog_cache.invalidate(TOPPINGS, [change.id])
+        catalog_cache.invalidate(PIZZAS, change.related_ids)
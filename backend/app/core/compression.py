@@ -0,0 +1,184 @@
+"""Negotiated gzip and brotli compression of responses.
+
+CompressionMiddleware compresses JSON and text bodies of at least
+COMPRESSION_MIN_SIZE bytes for clients that accept it, preferring brotli when
+the optional brotli package is installed. Responses that already carry a
+Content-Encoding pass through untouched: cached catalog responses compress
+themselves (see CachedResponse.encoded), once per entry and encoding rather
+than once per request. Event streams are never compressed, as that would
+hold back their messages. A compressed body's ETag gets the coding appended
+(see encoded_etag).
+"""
+import os
+import zlib
+from functools import lru_cache
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from .revisions import encoded_etag
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip is offered
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+# Smaller bodies fit in a packet or two anyway, and compressing them costs more than it saves
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Levels trade CPU per response for bytes on the wire; benchmarks.compression measures both
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+GZIP = "gzip"
+BROTLI = "br"
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+UNCOMPRESSIBLE_TYPES = ("text/event-stream",)
+
+
+def available_encodings() -> tuple:
+    """Content codings this server can produce, most preferred first."""
+    return (BROTLI, GZIP) if brotli is not None else (GZIP,)
+
+
+@lru_cache(maxsize=256)
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """The coding to use for an Accept-Encoding header, or None for identity.
+
+    The highest q-value wins; ties go to the server's preference. Clients send
+    a handful of distinct headers, so the answers are cached.
+    """
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, *params = part.split(";")
+        weight = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.strip()] = weight
+    best, best_weight = None, 0.0
+    for encoding in available_encodings():
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compressible(content_type: str) -> bool:
+    content_type = content_type.lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(UNCOMPRESSIBLE_TYPES)
+
+
+def response_encoding(scope, size: int) -> Optional[str]:
+    """The coding for a body of size bytes answering the request in scope, if it is worth compressing."""
+    if not COMPRESSION_ENABLED or size < COMPRESSION_MIN_SIZE:
+        return None
+    return negotiate(Headers(scope=scope).get("accept-encoding", ""))
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == BROTLI:
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # wbits 31: a gzip header and trailer around the deflate stream
+    encoder = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return encoder.compress(body) + encoder.flush()
+
+
+class StreamEncoder:
+    """Compresses a streamed body chunk by chunk, flushing each so it reaches the client."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == BROTLI:
+            self._encoder = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._encoder = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == BROTLI:
+            return self._encoder.process(chunk) + self._encoder.flush()
+        return self._encoder.compress(chunk) + self._encoder.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == BROTLI:
+            return self._encoder.finish()
+        return self._encoder.flush()
+
+
+def mark_encoded(headers: MutableHeaders, encoding: str, length: Optional[int]):
+    headers["Content-Encoding"] = encoding
+    if "etag" in headers:
+        headers["ETag"] = encoded_etag(headers["etag"], encoding)
+    if length is None:
+        del headers["Content-Length"]
+    else:
+        headers["Content-Length"] = str(length)
+    headers.add_vary_header("Accept-Encoding")
+
+
+class CompressionMiddleware:
+    """Compresses response bodies the client accepts in a cheaper form.
+
+    A plain ASGI middleware like MetricsMiddleware. A body sent in one message
+    is compressed whole, below COMPRESSION_MIN_SIZE not at all; a streamed one
+    (e.g. the catalog export) chunk by chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        encoder = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                if "content-encoding" in headers or not compressible(headers.get("content-type", "")):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Held until the first body message shows whether and how to compress
+                    start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                start["headers"] = list(start.get("headers", []))
+                headers = MutableHeaders(raw=start["headers"])
+                if not more_body:
+                    passthrough = True
+                    if len(body) >= COMPRESSION_MIN_SIZE:
+                        body = compress(body, encoding)
+                        mark_encoded(headers, encoding, len(body))
+                        message = {"type": "http.response.body", "body": body}
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = StreamEncoder(encoding)
+                mark_encoded(headers, encoding, None)
+                await send(start)
+
+            chunk = encoder.compress(body)
+            if not more_body:
+                chunk += encoder.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,65 @@
+from dataclasses import dataclass
+from typing import Callable, FrozenSet, List, Optional
+
+# Entities and actions carried by CatalogChange
+PIZZA = "pizza"
+TOPPING = "topping"
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+# Any row may have changed, e.g. after an import: listeners drop everything they derived
+CATALOG = "catalog"
+RELOADED = "reloaded"
+
+
+@dataclass(frozen=True)
+class CatalogChange:
+    """A committed write to the catalog.
+
+    related_ids holds the other side of the pizza/topping relationship whose
+    representation changed too: the old and new toppings of a pizza, or the
+    pizzas that use a topping.
+    """
+
+    entity: str
+    action: str
+    id: int
+    name: Optional[str] = None
+    related_ids: FrozenSet[int] = frozenset()
+
+
+# Published instead of one change per row when too many rows change at once to list them
+CATALOG_RELOADED = CatalogChange(CATALOG, RELOADED, 0)
+
+
+_listeners: List[Callable[[CatalogChange], None]] = []
+_local_listeners: List[Callable[[CatalogChange], None]] = []
+
+
+def on_catalog_change(listener: Callable[[CatalogChange], None]):
+    """Register a listener for committed catalog writes. Usable as a decorator.
+
+    Listeners hear of the writes this process made and of those other workers
+    made, relayed by the change bus (see app.core.bus).
+    """
+    _listeners.append(listener)
+    return listener
+
+
+def on_local_catalog_change(listener: Callable[[CatalogChange], None]):
+    """Register a listener for the writes this process made only."""
+    _local_listeners.append(listener)
+    return listener
+
+
+def publish(*changes: CatalogChange, remote: bool = False):
+    """Notify listeners of writes. Call only after the transaction has committed.
+
+    remote marks writes another worker made, which local-only listeners skip.
+    """
+    for change in changes:
+        for listener in _listeners:
+            listener(change)
+        if not remote:
+            for listener in _local_listeners:
+                listener(change)
@@ -0,0 +1,174 @@
+"""Push feed of committed catalog changes, for clients that would otherwise poll.
+
+Every change published by the write routes is numbered and kept in a ring
+buffer of the last FEED_BUFFER_SIZE events. Subscribers do not get a queue
+each: they read the buffer from their last sequence number and then wait on
+one future shared by all of them, which the next event resolves. An event is
+rendered once however many subscribers send it, and an idle subscriber costs
+a suspended coroutine.
+
+Every worker streams every write: its own as they are published, and those
+of the other workers as the change bus relays them (see app.core.bus), within
+milliseconds on PostgreSQL. The numbering is the worker's own, so cursors
+carry a per-process epoch. A client that reconnects to another worker, after
+a restart, or after falling further behind than the buffer reaches, is told
+to reset: refetch the lists it shows, then follow the feed from the cursor it
+is given. So is every subscriber after a catalog-wide change, such as an
+import, which names no rows to send.
+"""
+import asyncio
+import os
+import threading
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional, Tuple
+import orjson
+from .events import CATALOG, CatalogChange, on_catalog_change
+
+FEED_BUFFER_SIZE = int(os.getenv("FEED_BUFFER_SIZE", "1024"))
+# Idle streams send a heartbeat this often, to keep proxies from closing them
+FEED_HEARTBEAT_SECONDS = float(os.getenv("FEED_HEARTBEAT_SECONDS", "15"))
+
+# Kinds of message a subscriber receives
+CHANGE = "change"
+READY = "ready"
+RESET = "reset"
+HEARTBEAT = "heartbeat"
+
+
+@dataclass(frozen=True)
+class FeedEvent:
+    """A numbered change, with its JSON payload rendered once for every subscriber."""
+
+    seq: int
+    cursor: str
+    data: bytes
+
+
+def render_change(seq: int, change: CatalogChange) -> bytes:
+    return orjson.dumps({
+        "seq": seq,
+        "entity": change.entity,
+        "action": change.action,
+        "id": change.id,
+        "name": change.name,
+        "related_ids": sorted(change.related_ids),
+    })
+
+
+class ChangeFeed:
+    """Ring buffer of numbered catalog changes that subscribers follow."""
+
+    def __init__(self, size: int = FEED_BUFFER_SIZE):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.subscribers = 0
+        self._events = deque(maxlen=size)
+        self._seq = 0
+        self._lock = threading.Lock()
+        # The event loop subscribers wait on, and the future the next event resolves
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._next_event: Optional[asyncio.Future] = None
+
+    def cursor(self, seq: Optional[int] = None) -> str:
+        return f"{self.epoch}-{self._seq if seq is None else seq}"
+
+    def append(self, change: CatalogChange) -> FeedEvent:
+        """Number and store a change, then wake the subscribers. Safe to call from any thread."""
+        with self._lock:
+            self._seq += 1
+            event = FeedEvent(self._seq, self.cursor(self._seq), render_change(self._seq, change))
+            self._events.append(event)
+            loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake)
+        return event
+
+    def _wake(self):
+        waiter, self._next_event = self._next_event, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def _waiter(self) -> asyncio.Future:
+        # Created in the running loop; a new loop (e.g. a new test client) takes over
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._next_event = loop, None
+        if self._next_event is None:
+            self._next_event = loop.create_future()
+        return self._next_event
+
+    def since(self, cursor: Optional[str]) -> Tuple[Optional[List[FeedEvent]], int]:
+        """The events after cursor, or None if they cannot all be replayed; and the latest sequence number."""
+        with self._lock:
+            latest = self._seq
+            seq = self._parse(cursor)
+            if seq is None or seq > latest:
+                return None, latest
+            oldest = self._events[0].seq if self._events else latest + 1
+            if seq < oldest - 1:
+                return None, latest
+            return [event for event in self._events if event.seq > seq], latest
+
+    def _parse(self, cursor: Optional[str]) -> Optional[int]:
+        epoch, _, seq = (cursor or "").partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    async def follow(
+        self, cursor: Optional[str], heartbeat: float = FEED_HEARTBEAT_SECONDS
+    ) -> AsyncIterator[Tuple[str, Optional[FeedEvent], str]]:
+        """Yield (kind, event, cursor) messages until the subscriber goes away.
+
+        Starts with the changes after cursor, or with READY (no cursor) or RESET
+        (one that cannot be resumed) carrying the cursor to follow from.
+        """
+        self.subscribers += 1
+        try:
+            events, latest = self.since(cursor)
+            if events is None:
+                kind, cursor = (RESET if cursor else READY), self.cursor(latest)
+                yield kind, None, cursor
+                events = []
+            while True:
+                for event in events:
+                    cursor = event.cursor
+                    yield CHANGE, event, cursor
+                # Taken before checking the buffer, so an event appended in between still wakes us
+                waiter = self._waiter()
+                events, latest = self.since(cursor)
+                if events is None:
+                    # Fell further behind than the buffer reaches
+                    cursor, events = self.cursor(latest), []
+                    yield RESET, None, cursor
+                elif not events:
+                    done, _ = await asyncio.wait([waiter], timeout=heartbeat)
+                    if not done:
+                        yield HEARTBEAT, None, cursor
+        finally:
+            self.subscribers -= 1
+
+    def reset(self):
+        """Start over under a new epoch, so every subscriber is told to reset. Safe to call from any thread."""
+        with self._lock:
+            self.epoch = uuid.uuid4().hex[:8]
+            self._events.clear()
+            self._seq = 0
+            loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake)
+
+    def clear(self):
+        self.reset()
+
+
+change_feed = ChangeFeed()
+
+
+@on_catalog_change
+def _append_to_feed(change: CatalogChange):
+    if change.entity == CATALOG:
+        change_feed.reset()
+    else:
+        change_feed.append(change)
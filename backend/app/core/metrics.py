@@ -0,0 +1,358 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows, where gunicorn does not run either
+    fcntl = None
+
+# Prometheus' default latency buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Requests that did not match a route are grouped under one label to bound cardinality
+UNMATCHED_ROUTE = "<unmatched>"
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Set by gunicorn.conf.py when several workers run: each one writes its metrics
+# there every METRICS_FLUSH_SECONDS, and /metrics adds up those of all of them
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+# The summed counters of workers that exited, in METRICS_DIR
+RETIRED_FILE = "retired.json"
+
+
+@dataclass
+class RequestStats:
+    """Database work attributed to the request being handled."""
+
+    queries: int = 0
+    db_time: float = 0.0
+
+
+# Set per request by MetricsMiddleware. The threadpool copies the context, so the
+# same RequestStats object is updated by sync handlers running in worker threads.
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started_at = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - context._metrics_started_at
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    """Per-process request and database metrics in Prometheus text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        self.latency: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.db_time: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.db_queries: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, method: str, route: str, status: int, duration: float, stats: RequestStats):
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[(method, route, status)] += 1
+            self.latency[(method, route)].observe(duration)
+            self.db_time[(method, route)].observe(stats.db_time)
+            self.db_queries[(method, route)] += stats.queries
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self.latency.clear()
+            self.db_time.clear()
+            self.db_queries.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "requests": [[*key, count] for key, count in self.requests.items()],
+                "latency": [[*key, h.bucket_counts, h.count, h.sum] for key, h in self.latency.items()],
+                "db_time": [[*key, h.bucket_counts, h.count, h.sum] for key, h in self.db_time.items()],
+                "db_queries": [[*key, count] for key, count in self.db_queries.items()],
+            }
+
+    def merge(self, snapshot: dict, live: bool = True):
+        """Add another worker's snapshot. Gauges only count for workers still running."""
+        with self._lock:
+            if live:
+                self.in_flight += snapshot["in_flight"]
+            for method, route, status, count in snapshot["requests"]:
+                self.requests[(method, route, status)] += count
+            for name in ("latency", "db_time"):
+                histograms = getattr(self, name)
+                for method, route, bucket_counts, count, total in snapshot[name]:
+                    histogram = histograms[(method, route)]
+                    histogram.bucket_counts = [a + b for a, b in zip(histogram.bucket_counts, bucket_counts)]
+                    histogram.count += count
+                    histogram.sum += total
+            for method, route, count in snapshot["db_queries"]:
+                self.db_queries[(method, route)] += count
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP http_requests_in_flight Requests currently being handled.",
+                "# TYPE http_requests_in_flight gauge",
+                f"http_requests_in_flight {self.in_flight}",
+                "# HELP http_requests_total Completed requests.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+            self._render_histograms(
+                lines, "http_request_duration_seconds", "Time to handle a request.", self.latency
+            )
+            self._render_histograms(
+                lines, "http_request_db_duration_seconds", "Database time spent per request.", self.db_time
+            )
+            lines += [
+                "# HELP http_request_db_queries_total SQL statements executed on behalf of requests.",
+                "# TYPE http_request_db_queries_total counter",
+            ]
+            for (method, route), count in sorted(self.db_queries.items()):
+                lines.append(f"http_request_db_queries_total{_labels(method=method, route=route)} {count}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histograms(lines, name: str, help_text: str, histograms: Dict[Tuple[str, str], Histogram]):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for (method, route), histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(method=method, route=route, le=bound)} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(method=method, route=route, le='+Inf')} {histogram.count}")
+            lines.append(f"{name}_sum{_labels(method=method, route=route)} {histogram.sum}")
+            lines.append(f"{name}_count{_labels(method=method, route=route)} {histogram.count}")
+
+
+metrics = MetricsRegistry()
+
+
+def _running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedMetrics:
+    """Adds up the metrics of all workers through snapshot files in a shared directory.
+
+    A scrape reaches whichever worker the master hands it to, so each worker
+    writes its registry to <pid>.json and the one serving /metrics sums them.
+    The counters of workers that exited still count, so they never go
+    backwards when gunicorn recycles a worker; their gauges are left out. Each
+    new worker folds the files of exited ones into retired.json before writing
+    its own, so the files do not pile up and a reused PID overwrites nothing.
+    The master clears the directory when it starts (see gunicorn.conf.py).
+    """
+
+    def __init__(self, registry: MetricsRegistry, directory: str, interval: float = METRICS_FLUSH_SECONDS):
+        self.registry = registry
+        self.directory = Path(directory)
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def flush(self):
+        path = self.directory / f"{os.getpid()}.json"
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(self.registry.snapshot()))
+        # Atomic, so a reader never sees half a file
+        os.replace(temporary, path)
+
+    def snapshots(self) -> Iterable[Tuple[Path, int, dict]]:
+        for path in self.directory.glob("*.json"):
+            if path.name == RETIRED_FILE:
+                continue
+            try:
+                yield path, int(path.stem), json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+
+    def retired(self) -> Optional[dict]:
+        try:
+            return json.loads((self.directory / RETIRED_FILE).read_text())
+        except (OSError, ValueError):
+            return None
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        # Renders share the lock and retire takes it alone, so no render counts
+        # a worker both in retired.json and in its own file
+        with open(self.directory / ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    def retire(self):
+        """Fold the files of workers that exited, and any under this worker's (reused) PID, into retired.json."""
+        with self._locked(exclusive=True):
+            dead = [
+                (path, snapshot) for path, pid, snapshot in self.snapshots()
+                if pid == os.getpid() or not _running(pid)
+            ]
+            if not dead:
+                return
+            total = MetricsRegistry()
+            retired = self.retired()
+            if retired is not None:
+                total.merge(retired, live=False)
+            for _, snapshot in dead:
+                total.merge(snapshot, live=False)
+            path = self.directory / RETIRED_FILE
+            temporary = path.with_suffix(".tmp")
+            temporary.write_text(json.dumps(total.snapshot()))
+            os.replace(temporary, path)
+            for dead_path, _ in dead:
+                dead_path.unlink()
+
+    def render(self) -> str:
+        self.flush()
+        total = MetricsRegistry()
+        with self._locked(exclusive=False):
+            retired = self.retired()
+            if retired is not None:
+                total.merge(retired, live=False)
+            for _, pid, snapshot in self.snapshots():
+                total.merge(snapshot, live=_running(pid))
+        return total.render()
+
+    def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.retire()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+
+
+shared_metrics = SharedMetrics(metrics, METRICS_DIR) if METRICS_DIR else None
+
+
+def render_metrics() -> str:
+    """This worker's metrics, or those of all workers when they share METRICS_DIR."""
+    return shared_metrics.render() if shared_metrics is not None else metrics.render()
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and attributes its database work to its route.
+
+    Written as a plain ASGI middleware so that it adds no task or buffering to
+    the request path. The route label is the path template, e.g.
+    /api/pizzas/{pizza_id}, which FastAPI leaves in the scope once it has
+    matched a route.
+    """
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING_ENABLED):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started_at = time.perf_counter()
+        status = 500
+        metrics.request_started()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    elapsed_ms = (time.perf_counter() - started_at) * 1000
+                    header = (
+                        f'app;dur={elapsed_ms:.1f}, '
+                        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"'
+                    )
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", header.encode("latin-1"))
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get("route")
+            metrics.request_finished(
+                scope["method"],
+                getattr(route, "path", UNMATCHED_ROUTE),
+                status,
+                time.perf_counter() - started_at,
+                stats,
+            )
+            _request_stats.reset(token)
@@ -0,0 +1,360 @@
+"""On-demand request profiling and slow-query capture.
+
+A request is profiled when it carries X-Profile-Token with the value of
+PROFILE_TOKEN, or at random with probability PROFILE_SAMPLE_RATE. While any
+profile is open, a sampler thread records the stacks of the worker's busy
+threads every PROFILE_INTERVAL_MS and sorts each sample into sql,
+serialization or python by its innermost recognisable frame. Threads idling
+in the event loop or the threadpool hold no application frames and are
+skipped. Other requests handled at the same moment are sampled too; the
+profile notes how many were in flight, so profile on a quiet worker when the
+numbers matter. With no profile open the sampler does not run, and a request
+costs one header lookup at most.
+
+Independently, every statement slower than SLOW_QUERY_MS is kept with its
+bound parameters and an EXPLAIN plan, captured on the same connection right
+after the statement ran. Each distinct statement is explained at most once per
+EXPLAIN_INTERVAL seconds.
+
+Both are kept in ring buffers and served under /admin (see
+app.api.routes.admin), which requires the same token.
+"""
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .metrics import current_request_stats, metrics
+
+# Unset: no request can ask to be profiled, and the admin endpoints are closed
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_HEADER = "X-Profile-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+# Requests to these paths are never profiled, so reading profiles does not add to them
+PROFILE_EXEMPT_PATHS = ("/admin", "/health", "/metrics", "/api/changes")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "100"))
+EXPLAIN_INTERVAL = float(os.getenv("EXPLAIN_INTERVAL", "60"))
+# Bound parameters are cut to this many characters in the log
+MAX_PARAMETERS_LENGTH = 1000
+MAX_STACK_DEPTH = 64
+
+SQL = "sql"
+SERIALIZATION = "serialization"
+PYTHON = "python"
+
+# Frames that mark a sample as database work or as serialization, by file path
+_SQL_MARKERS = ("sqlalchemy/", "psycopg", "asyncpg", "aiosqlite", "sqlite3/")
+_SERIALIZATION_MARKERS = ("app/api/responses.py", "pydantic/", "pydantic_core/", "fastapi/encoders.py", "orjson")
+# A stack without any of these frames belongs to no request
+_REQUEST_MARKERS = ("app/", "fastapi/", "starlette/", "sqlalchemy/", "pydantic/")
+
+EXPLAIN_PREFIXES = {"postgresql": "EXPLAIN ", "mysql": "EXPLAIN ", "sqlite": "EXPLAIN QUERY PLAN "}
+EXPLAINABLE = ("select", "with", "insert", "update", "delete")
+EXPLAIN_SAVEPOINT = "slow_query_explain"
+
+
+@dataclass
+class Profile:
+    """The samples and slow statements of one request."""
+
+    id: int
+    method: str
+    path: str
+    trigger: str
+    route: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+    status: Optional[int] = None
+    duration_ms: Optional[float] = None
+    db_ms: Optional[float] = None
+    queries: Optional[int] = None
+    max_in_flight: int = 0
+    stacks: Counter = field(default_factory=Counter)
+    categories: Counter = field(default_factory=Counter)
+    slow_queries: List[dict] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "trigger": self.trigger,
+            "started_at": self.started_at,
+            "status": self.status,
+            "duration_ms": self.duration_ms,
+            "db_ms": self.db_ms,
+            "queries": self.queries,
+            "samples": sum(self.categories.values()),
+            # Shares of the samples, to tell Python, serialization and SQL time apart
+            "categories": dict(self.categories),
+            "max_in_flight": self.max_in_flight,
+            "slow_queries": len(self.slow_queries),
+        }
+
+    def as_dict(self, top: int = 50) -> dict:
+        return {
+            **self.summary(),
+            "top_stacks": [{"stack": stack, "samples": count} for stack, count in self.stacks.most_common(top)],
+            "slow_queries": self.slow_queries,
+        }
+
+    def folded(self) -> str:
+        """Stacks in the folded format of flamegraph.pl and speedscope, one 'frame;frame count' per line."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+_current_profile: ContextVar[Optional[Profile]] = ContextVar("current_profile", default=None)
+
+_labels: Dict[object, str] = {}
+
+
+def _frame_label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename.replace("\\", "/")
+        if "site-packages/" in path:
+            path = path.split("site-packages/", 1)[1]
+        elif "/app/" in path:
+            # The last one, as the project itself may live in a directory called app
+            path = "app/" + path.rsplit("/app/", 1)[1]
+        elif "/lib/python" in path:
+            path = path.split("/lib/python", 1)[1].split("/", 1)[-1]
+        label = _labels[code] = f"{path}:{code.co_name}"
+    return label
+
+
+def _category(labels: List[str]) -> str:
+    # The innermost recognisable frame decides: a query run while rendering is SQL
+    for label in reversed(labels):
+        if any(marker in label for marker in _SQL_MARKERS):
+            return SQL
+        if any(marker in label for marker in _SERIALIZATION_MARKERS):
+            return SERIALIZATION
+    return PYTHON
+
+
+class Sampler:
+    """Samples thread stacks into the open profiles, running only while there are any."""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.profiles: List[Profile] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def open(self, profile: Profile):
+        with self._lock:
+            self.profiles.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+
+    def close(self, profile: Profile):
+        with self._lock:
+            self.profiles.remove(profile)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self.profiles:
+                    self._thread = None
+                    return
+                profiles = list(self.profiles)
+            self.sample(profiles, skip=own_id)
+            time.sleep(self.interval)
+
+    @staticmethod
+    def sample(profiles: List[Profile], skip: Optional[int] = None):
+        in_flight = metrics.in_flight
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == skip:
+                continue
+            labels = []
+            while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.reverse()
+            if not any(marker in label for label in labels for marker in _REQUEST_MARKERS):
+                continue
+            stack, category = ";".join(labels), _category(labels)
+            for profile in profiles:
+                profile.stacks[stack] += 1
+                profile.categories[category] += 1
+                profile.max_in_flight = max(profile.max_in_flight, in_flight)
+
+
+class ProfileStore:
+    """Ring buffers of finished profiles and slow statements."""
+
+    def __init__(self, profiles: int = PROFILE_BUFFER_SIZE, slow_queries: int = SLOW_QUERY_BUFFER_SIZE):
+        self.profiles = deque(maxlen=profiles)
+        self.slow_queries = deque(maxlen=slow_queries)
+        self._ids = itertools.count(1)
+        self._explained_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def new_profile(self, method: str, path: str, trigger: str) -> Profile:
+        return Profile(next(self._ids), method, path, trigger)
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self.profiles.append(profile)
+
+    def get(self, profile_id: int) -> Optional[Profile]:
+        with self._lock:
+            return next((profile for profile in self.profiles if profile.id == profile_id), None)
+
+    def should_explain(self, statement: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained_at.get(statement, -EXPLAIN_INTERVAL) < EXPLAIN_INTERVAL:
+                return False
+            if len(self._explained_at) > 1000:
+                self._explained_at.clear()
+            self._explained_at[statement] = now
+            return True
+
+    def add_slow_query(self, record: dict):
+        with self._lock:
+            self.slow_queries.append(record)
+
+    def clear(self):
+        with self._lock:
+            self.profiles.clear()
+            self.slow_queries.clear()
+            self._explained_at.clear()
+
+
+profile_store = ProfileStore()
+sampler = Sampler()
+
+
+def explain(conn, statement: str, parameters) -> Optional[List[str]]:
+    """The plan of a statement, run through the raw DBAPI cursor so no events fire for it.
+
+    None on databases without a known EXPLAIN syntax. It runs in the request's
+    transaction, inside a savepoint: on PostgreSQL a failed statement aborts
+    the transaction around it, and the request's own statements must go on.
+    """
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None:
+        return None
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(f"SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = [" | ".join(str(value) for value in row) for row in cursor.fetchall()]
+        except Exception:
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}")
+            raise
+        finally:
+            cursor.execute(f"RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        return plan
+    finally:
+        cursor.close()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _capture_slow_query(conn, cursor, statement, parameters, context, executemany):
+    # Started by the timer in app.core.metrics, which every engine has
+    started_at = getattr(context, "_metrics_started_at", None)
+    if started_at is None or SLOW_QUERY_MS <= 0:
+        return
+    duration_ms = (time.perf_counter() - started_at) * 1000
+    if duration_ms < SLOW_QUERY_MS:
+        return
+
+    profile = _current_profile.get()
+    record = {
+        "at": time.time(),
+        "duration_ms": round(duration_ms, 2),
+        "statement": statement,
+        "parameters": repr(parameters)[:MAX_PARAMETERS_LENGTH],
+        "profile_id": profile.id if profile else None,
+    }
+    if not executemany and statement.lstrip().lower().startswith(EXPLAINABLE):
+        if profile_store.should_explain(statement):
+            try:
+                plan = explain(conn, statement, parameters)
+            except Exception as e:
+                record["plan_error"] = f"{type(e).__name__}: {e}"
+            else:
+                if plan is not None:
+                    record["plan"] = plan
+    profile_store.add_slow_query(record)
+    if profile is not None:
+        profile.slow_queries.append(record)
+
+
+class ProfilingMiddleware:
+    """Profiles the requests that ask for it, or a sample of all of them.
+
+    A plain ASGI middleware like MetricsMiddleware, mounted inside it so the
+    request's database counters are available. Profiled responses carry
+    X-Profile-Id, the ID to fetch the profile by.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._token_header = PROFILE_HEADER.lower().encode("latin-1")
+
+    def _trigger(self, scope) -> Optional[str]:
+        if scope["path"].startswith(PROFILE_EXEMPT_PATHS):
+            return None
+        if PROFILE_TOKEN:
+            for name, value in scope.get("headers", []):
+                if name == self._token_header:
+                    # A wrong token just goes unprofiled
+                    if hmac.compare_digest(value, PROFILE_TOKEN.encode("latin-1")):
+                        return "header"
+                    break
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        trigger = self._trigger(scope) if scope["type"] == "http" else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = profile_store.new_profile(scope["method"], scope["path"], trigger)
+        token = _current_profile.set(profile)
+        started_at = time.perf_counter()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (PROFILE_ID_HEADER.lower().encode("latin-1"), str(profile.id).encode("latin-1"))
+                ]
+            await send(message)
+
+        sampler.open(profile)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.close(profile)
+            _current_profile.reset(token)
+            profile.duration_ms = round((time.perf_counter() - started_at) * 1000, 2)
+            stats = current_request_stats()
+            if stats is not None:
+                profile.db_ms = round(stats.db_time * 1000, 2)
+                profile.queries = stats.queries
+            profile.route = getattr(scope.get("route"), "path", None)
+            profile_store.add(profile)
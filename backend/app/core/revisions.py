@@ -0,0 +1,132 @@
+import hashlib
+import threading
+from collections import defaultdict
+from typing import Iterable, Tuple
+from .events import CATALOG, PIZZA, CatalogChange, on_catalog_change
+
+PIZZAS = "pizzas"
+TOPPINGS = "toppings"
+
+
+class RevisionRegistry:
+    """Counts the catalog writes this process has published, per collection and item.
+
+    The counters are not entity tags: tags are derived from what was read
+    (content_etag, version_etag), so every worker issues the same tag for the
+    same data. A read takes the revision before it starts and only caches its
+    result if no write moved the revision on meanwhile; otherwise it could
+    store data that the write has just invalidated.
+    """
+
+    def __init__(self):
+        self._counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def bump(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._counters[key] += 1
+
+    def bump_all(self):
+        """Move on every revision a read may have taken, for writes too many to name."""
+        with self._lock:
+            # Copied first, as revision() adds keys without the lock
+            for key in list(self._counters):
+                self._counters[key] += 1
+
+    def revision(self, key: str) -> Tuple[str, int]:
+        return key, self._counters[key]
+
+    def is_current(self, revision: Tuple[str, int]) -> bool:
+        key, number = revision
+        return self._counters[key] == number
+
+
+def item_revision_key(namespace: str, item_id: int) -> str:
+    return f"{namespace}:{item_id}"
+
+
+# Content codings whose bodies get tags of their own, see encoded_etag
+ENCODED_ETAG_SUFFIXES = ("-gzip", "-br")
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """The tag of a body sent with a content coding: the identity tag with the coding appended.
+
+    A gzip or brotli body differs byte for byte from the identity one, so a
+    strong tag cannot be shared between them.
+    """
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def _opaque_tag(etag: str) -> str:
+    # Weak comparison ignores W/, and the coding suffix: every coding carries the same data
+    etag = etag[2:] if etag.startswith("W/") else etag
+    for suffix in ENCODED_ETAG_SUFFIXES:
+        if etag.endswith(f'{suffix}"'):
+            return f'{etag[:-len(suffix) - 1]}"'
+    return etag
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against the current tag, of any coding."""
+    if if_none_match.strip() == "*":
+        return True
+    current = _opaque_tag(etag)
+    return any(_opaque_tag(candidate.strip()) == current for candidate in if_none_match.split(","))
+
+
+def content_etag(body: bytes) -> str:
+    """Weak entity tag of a rendered list: a digest of its body."""
+    return f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+
+def version_etag(version: int, related: Iterable[Tuple[int, int]] = ()) -> str:
+    """Strong entity tag of an item from its row version.
+
+    Items embed the names of related rows, which change without touching the
+    item's own row, so the tag also carries a digest of the related rows'
+    (id, version) pairs.
+    """
+    pairs = ",".join(f"{related_id}:{related_version}" for related_id, related_version in sorted(related))
+    digest = hashlib.blake2b(pairs.encode("ascii"), digest_size=6).hexdigest()
+    return f'"{version}-{digest}"'
+
+
+def if_match_satisfied(if_match: str, version: int) -> bool:
+    """Whether an If-Match header allows a write to the row at version.
+
+    Only the version part of each tag is compared: the precondition guards the
+    row being written, and edits to related rows do not block it. Weak tags
+    never match, as If-Match uses strong comparison.
+    """
+    if if_match.strip() == "*":
+        return True
+    for candidate in if_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            continue
+        if candidate.strip('"').split("-")[0] == str(version):
+            return True
+    return False
+
+
+catalog_revisions = RevisionRegistry()
+
+
+@on_catalog_change
+def _bump_revisions(change: CatalogChange):
+    # Same fan-out as the cache: both collections, the item and its related items
+    if change.entity == CATALOG:
+        catalog_revisions.bump_all()
+        return
+    if change.entity == PIZZA:
+        own, other = PIZZAS, TOPPINGS
+    else:
+        own, other = TOPPINGS, PIZZAS
+    catalog_revisions.bump(
+        PIZZAS,
+        TOPPINGS,
+        item_revision_key(own, change.id),
+        *(item_revision_key(other, related_id) for related_id in change.related_ids),
+    )
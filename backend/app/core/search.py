@@ -0,0 +1,261 @@
+"""In-memory name search for databases without a trigram index (SQLite).
+
+The index holds the names of all pizzas and toppings. It is loaded from the
+database on first use and then kept current by catalog change events, like
+the response cache. Entries are reloaded after SEARCH_INDEX_TTL seconds so
+that writes made outside the app show up too. The reload runs in a background
+thread while searches keep using the current indexes, and writes only wait
+for the new indexes to be swapped in, not for them to be built.
+
+Matches are ranked the way the PostgreSQL query in app.api.routes.search
+ranks them: names that start with the query, then names with a word that
+does, then names sharing enough trigrams with the query.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from .events import CATALOG, DELETED, CatalogChange, on_catalog_change
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_TTL = float(os.getenv("SEARCH_INDEX_TTL", "300"))
+
+# Scores of the three kinds of match; fuzzy matches scale with the trigram overlap
+NAME_PREFIX_SCORE = 1.0
+WORD_PREFIX_SCORE = 0.9
+FUZZY_SCORE = 0.8
+# Share of the query's trigrams a fuzzy match must contain, as pg_trgm's word_similarity_threshold
+SIMILARITY_THRESHOLD = 0.6
+
+
+def trigrams(text: str) -> Set[str]:
+    """pg_trgm-style trigrams: each word padded with two spaces before and one after."""
+    grams = set()
+    for word in text.lower().split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+@dataclass
+class SearchHit:
+    type: str
+    id: int
+    name: str
+    score: float
+
+
+class NameIndex:
+    """Prefix and trigram index over the names of one entity type."""
+
+    def __init__(self):
+        self.names: Dict[int, str] = {}
+        # Sorted (word, id) pairs; the first word of each name is the name's own prefix
+        self._words: List[Tuple[str, int]] = []
+        self._postings: Dict[str, Set[int]] = {}
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[int, str]]) -> "NameIndex":
+        """An index of all the rows at once, sorting the words once rather than inserting each."""
+        index = cls()
+        words = []
+        for item_id, name in rows:
+            index.names[item_id] = name
+            words.extend((word, item_id) for word in name.lower().split())
+            for gram in trigrams(name):
+                index._postings.setdefault(gram, set()).add(item_id)
+        words.sort()
+        index._words = words
+        return index
+
+    def add(self, item_id: int, name: str):
+        self.remove(item_id)
+        self.names[item_id] = name
+        for word in name.lower().split():
+            bisect.insort(self._words, (word, item_id))
+        for gram in trigrams(name):
+            self._postings.setdefault(gram, set()).add(item_id)
+
+    def remove(self, item_id: int):
+        name = self.names.pop(item_id, None)
+        if name is None:
+            return
+        for word in name.lower().split():
+            index = bisect.bisect_left(self._words, (word, item_id))
+            if index < len(self._words) and self._words[index] == (word, item_id):
+                del self._words[index]
+        for gram in trigrams(name):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(item_id)
+                if not postings:
+                    del self._postings[gram]
+
+    def prefix_matches(self, query: str, deadline: float) -> Tuple[Dict[int, float], bool]:
+        """Score of every item whose name, or one of its words, starts with the query.
+
+        Stops once the deadline passes; the flag tells whether it did.
+        """
+        scores = {}
+        first_word = query.split()[0]
+        start = bisect.bisect_left(self._words, (first_word, -1))
+        for position in range(start, len(self._words)):
+            word, item_id = self._words[position]
+            if not word.startswith(first_word):
+                break
+            if position % 256 == 0 and time.perf_counter() > deadline:
+                return scores, True
+            name = self.names[item_id].lower()
+            if name.startswith(query):
+                scores[item_id] = NAME_PREFIX_SCORE
+            elif f" {query}" in f" {name}":
+                scores.setdefault(item_id, WORD_PREFIX_SCORE)
+        return scores, False
+
+    def fuzzy_matches(self, query: str, deadline: float) -> Tuple[Dict[int, float], bool]:
+        """Score of every item sharing enough trigrams with the query.
+
+        Stops counting once the deadline passes; the flag tells whether it did.
+        """
+        query_grams = trigrams(query)
+        shared = Counter()
+        for gram in query_grams:
+            if time.perf_counter() > deadline:
+                return self._fuzzy_scores(shared, len(query_grams)), True
+            shared.update(self._postings.get(gram, ()))
+        return self._fuzzy_scores(shared, len(query_grams)), False
+
+    @staticmethod
+    def _fuzzy_scores(shared: Counter, query_size: int) -> Dict[int, float]:
+        scores = {}
+        for item_id, count in shared.items():
+            similarity = count / query_size
+            if similarity >= SIMILARITY_THRESHOLD:
+                scores[item_id] = FUZZY_SCORE * similarity
+        return scores
+
+
+class CatalogSearch:
+    """Name indexes of pizzas and toppings, loaded on demand and updated by catalog writes."""
+
+    def __init__(self, ttl: float = SEARCH_INDEX_TTL):
+        self.ttl = ttl
+        self.indexes: Dict[str, NameIndex] = {}
+        self.loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        # Held for the whole of a build, so only one runs at a time
+        self._build_lock = threading.Lock()
+        # Changes published while a build reads the database, replayed onto its result
+        self._changes_during_build: Optional[List[CatalogChange]] = None
+        # Moved on by clear, so a build that started before it is not swapped in
+        self._generation = 0
+        # Set by catalog-wide changes: rebuild at the next search, as after the TTL
+        self._stale = False
+
+    def ensure_loaded(self, load: Callable[[], Dict[str, Iterable[Tuple[int, str]]]]):
+        """Build the indexes from load() if they are missing; start a rebuild if they are older than the TTL.
+
+        Only the first search waits for a build. load runs in a background
+        thread for the rebuilds, so it must not use the request's session.
+        """
+        if self.loaded_at is None:
+            with self._build_lock:
+                if self.loaded_at is None:
+                    self._build(load)
+        elif (self._stale or time.monotonic() - self.loaded_at >= self.ttl) and self._build_lock.acquire(blocking=False):
+            threading.Thread(target=self._rebuild, args=(load,), name="search-index-rebuild", daemon=True).start()
+
+    def _rebuild(self, load):
+        try:
+            self._build(load)
+        except Exception:
+            logger.exception("Could not rebuild the search index; keeping the current one")
+        finally:
+            self._build_lock.release()
+
+    def _build(self, load):
+        with self._lock:
+            generation = self._generation
+            self._changes_during_build = []
+        try:
+            indexes = {entity: NameIndex.build(rows) for entity, rows in load().items()}
+        except Exception:
+            with self._lock:
+                self._changes_during_build = None
+            raise
+        with self._lock:
+            changes, self._changes_during_build = self._changes_during_build, None
+            if generation != self._generation:
+                return
+            # Published after the build began, so load() may or may not have seen them
+            for change in changes:
+                _apply_to(indexes, change)
+            self.indexes = indexes
+            self.loaded_at = time.monotonic()
+            self._stale = any(change.entity == CATALOG for change in changes)
+
+    def apply(self, change: CatalogChange):
+        with self._lock:
+            if change.entity == CATALOG:
+                # Searches go on with the current names until the rebuild this starts
+                self._stale = True
+            _apply_to(self.indexes, change)
+            if self._changes_during_build is not None:
+                self._changes_during_build.append(change)
+
+    def search(
+        self, query: str, entities: Iterable[str], limit: int, budget_ms: float
+    ) -> Tuple[List[SearchHit], bool]:
+        """The best matches across the given entity types, and whether the budget cut the search short."""
+        query = " ".join(query.lower().split())
+        if not query:
+            return [], False
+        deadline = time.perf_counter() + budget_ms / 1000
+        hits, truncated = [], False
+        with self._lock:
+            for entity in entities:
+                index = self.indexes.get(entity, NameIndex())
+                scores = {}
+                # Trigrams only say something about queries of a full trigram or more
+                if len(query) >= 3:
+                    scores, cut = index.fuzzy_matches(query, deadline)
+                    truncated = truncated or cut
+                prefix_scores, cut = index.prefix_matches(query, deadline)
+                scores.update(prefix_scores)
+                truncated = truncated or cut
+                hits.extend(
+                    SearchHit(entity, item_id, index.names[item_id], round(score, 4))
+                    for item_id, score in scores.items()
+                )
+        hits.sort(key=lambda hit: (-hit.score, len(hit.name), hit.name.lower(), hit.id))
+        return hits[:limit], truncated
+
+    def clear(self):
+        with self._lock:
+            self.indexes = {}
+            self.loaded_at = None
+            self._generation += 1
+            self._stale = False
+
+
+def _apply_to(indexes: Dict[str, NameIndex], change: CatalogChange):
+    index = indexes.get(change.entity)
+    if index is None:
+        return
+    if change.action == DELETED:
+        index.remove(change.id)
+    elif change.name is not None:
+        index.add(change.id, change.name)
+
+
+catalog_search = CatalogSearch()
+
+
+@on_catalog_change
+def _update_search_index(change: CatalogChange):
+    catalog_search.apply(change)
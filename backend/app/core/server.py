@@ -0,0 +1,47 @@
+"""Production server pieces used by gunicorn.conf.py.
+
+Gunicorn supervises the processes (worker count, graceful reload on HUP,
+recycling after max_requests) and each worker runs the app on uvicorn.
+"""
+import importlib.util
+import math
+import os
+import warnings
+
+with warnings.catch_warnings():
+    # Deprecated in favour of the separate uvicorn-worker package, which is not pinned here
+    warnings.simplefilter("ignore", DeprecationWarning)
+    from uvicorn.workers import UvicornWorker
+
+
+def available_cpus() -> int:
+    """CPUs this process may actually use: its affinity mask, capped by a cgroup v2 CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def default_workers() -> int:
+    # One event loop per core. Sync routes also run in each worker's threadpool,
+    # so more workers than cores mostly adds connection pools, not throughput.
+    return max(1, available_cpus())
+
+
+class ProductionUvicornWorker(UvicornWorker):
+    """UvicornWorker on uvloop and httptools when they are installed."""
+
+    CONFIG_KWARGS = {
+        "loop": "uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        "http": "httptools" if importlib.util.find_spec("httptools") else "h11",
+        # The app reads X-Forwarded-* only from the proxy in front of it (see forwarded_allow_ips)
+        "proxy_headers": True,
+    }
@@ -0,0 +1,138 @@
+"""Boot-time accounting, to keep worker startup within a budget.
+
+app.main imports this module before anything else, so the boot clock starts
+just before the application's own imports, and .env is loaded before any
+module reads its settings. Each startup step is recorded as a
+phase and the report is served at /health/startup.
+
+For a per-package breakdown of import time, run the module:
+
+    python -m app.core.startup
+
+It imports the app in a fresh interpreter under ``-X importtime``, then builds
+the app and runs its startup (when DATABASE_URL is set), and exits with status 1
+if boot exceeds STARTUP_BUDGET_MS.
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+_BOOT_STARTED_AT = time.perf_counter()
+
+# Settings are read from the environment as their modules are imported, so a
+# .env file has to be loaded before any of them, i.e. here
+load_dotenv()
+
+# Target for import + app creation + lifespan startup, per worker
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "2000"))
+
+
+class StartupReport:
+    """Named durations of the steps between the first import and serving traffic."""
+
+    def __init__(self, budget_ms: float = STARTUP_BUDGET_MS, started_at: float = _BOOT_STARTED_AT):
+        self.budget_ms = budget_ms
+        self.started_at = started_at
+        self.phases: List[Tuple[str, float]] = []
+        self.ready_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started_at)
+
+    def record_since_boot(self, name: str):
+        """Record the time from the boot clock's start until now, e.g. for module imports."""
+        self.record(name, time.perf_counter() - self.started_at)
+
+    def ready(self):
+        self.ready_at = time.perf_counter()
+
+    def as_dict(self) -> dict:
+        total_ms = (self.ready_at - self.started_at) * 1000 if self.ready_at else None
+        return {
+            "ready": self.ready_at is not None,
+            "total_ms": round(total_ms, 1) if total_ms is not None else None,
+            "budget_ms": self.budget_ms,
+            "within_budget": total_ms <= self.budget_ms if total_ms is not None else None,
+            "phases": [{"name": name, "ms": round(seconds * 1000, 1)} for name, seconds in self.phases],
+            "modules_loaded": len(sys.modules),
+        }
+
+
+startup_report = StartupReport()
+
+
+def import_breakdown(module: str = "app.main", top: int = 15) -> Tuple[float, List[Tuple[str, float]]]:
+    """Import module in a fresh interpreter and total the import time per top-level package.
+
+    Returns the total in milliseconds and the slowest packages, slowest first.
+    """
+    import subprocess
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.getcwd(),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    # Lines look like "import time:       123 |       4567 |   package.module" (self and
+    # cumulative microseconds). Self times are summed per top-level package, which splits
+    # the total between e.g. fastapi, pydantic and sqlalchemy however they nest.
+    per_package: Dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        per_package[package] = per_package.get(package, 0.0) + int(self_us) / 1000
+    slowest = sorted(per_package.items(), key=lambda item: item[1], reverse=True)
+    return sum(per_package.values()), slowest[:top]
+
+
+def _main() -> int:
+    total_ms, slowest = import_breakdown()
+    print(f"Import of app.main in a fresh interpreter: {total_ms:.1f} ms")
+    for package, ms in slowest:
+        print(f"  {package:<30}{ms:>9.1f} ms")
+
+    if not os.getenv("DATABASE_URL"):
+        print("\nDATABASE_URL is not set, skipping app creation and lifespan startup")
+        return 0 if total_ms <= startup_report.budget_ms else 1
+
+    import asyncio
+    from app.main import create_app
+    # Run as __main__, this module is a separate copy from the one app.main records into
+    from app.core.startup import startup_report as app_startup_report
+
+    app = create_app()
+
+    async def start_and_stop():
+        async with app.router.lifespan_context(app):
+            pass
+
+    asyncio.run(start_and_stop())
+    report = app_startup_report.as_dict()
+    print(f"\nStartup in this process: {report['total_ms']} ms (budget {report['budget_ms']} ms)")
+    for phase in report["phases"]:
+        print(f"  {phase['name']:<30}{phase['ms']:>9.1f} ms")
+    return 0 if report["within_budget"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
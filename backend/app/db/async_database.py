@@ -0,0 +1,84 @@
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+import logging
+import threading
+from typing import List, Optional
+from fastapi import Request
+from .database import get_database_url, pool_settings
+from .pool import InstrumentedAsyncQueuePool, pool_options
+from .replicas import choose_replica, replica_urls
+
+logger = logging.getLogger(__name__)
+
+# Async drivers for the URL schemes the sync engine accepts
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+# Objects stay loaded after commit: lazy refreshes are not possible under asyncio.
+# Bound to the engine once it exists, like SessionLocal.
+AsyncSessionLocal = async_sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+_async_engine: Optional[AsyncEngine] = None
+_async_replica_engines: Optional[List[AsyncEngine]] = None
+_async_engine_lock = threading.Lock()
+
+def _create_async_engine(async_database_url: str) -> AsyncEngine:
+    return create_async_engine(
+        async_database_url,
+        **pool_options(async_database_url, pool_settings(), poolclass=InstrumentedAsyncQueuePool),
+    )
+
+def get_async_engine() -> AsyncEngine:
+    """The process-wide async engine, created from the environment on first call."""
+    global _async_engine
+    if _async_engine is None:
+        with _async_engine_lock:
+            if _async_engine is None:
+                async_database_url = to_async_url(get_database_url())
+                try:
+                    logger.info("Creating async database engine...")
+                    _async_engine = _create_async_engine(async_database_url)
+                except Exception as e:
+                    logger.error(f"Async database engine creation failed: {str(e)}")
+                    raise
+                AsyncSessionLocal.configure(bind=_async_engine)
+    return _async_engine
+
+def get_async_replica_engines() -> List[AsyncEngine]:
+    """Async engines for DATABASE_REPLICA_URLS, created on first call."""
+    global _async_replica_engines
+    if _async_replica_engines is None:
+        with _async_engine_lock:
+            if _async_replica_engines is None:
+                _async_replica_engines = [_create_async_engine(to_async_url(url)) for url in replica_urls()]
+    return _async_replica_engines
+
+def current_async_engine() -> Optional[AsyncEngine]:
+    return _async_engine
+
+def current_async_replica_engines() -> List[AsyncEngine]:
+    return _async_replica_engines or []
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    for replica in current_async_replica_engines():
+        await replica.dispose()
+
+async def get_async_db():
+    get_async_engine()
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db(request: Request):
+    """Async counterpart of get_read_db."""
+    get_async_engine()
+    replica = choose_replica(get_async_replica_engines(), request)
+    async with (AsyncSessionLocal(bind=replica) if replica is not None else AsyncSessionLocal()) as db:
+        yield db
@@ -1,44 +1,134 @@
 from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import declarative_base, sessionmaker
 import os
-from dotenv import load_dotenv
 import logging
+import threading
+from typing import List, Optional
+from fastapi import Request
+from .pool import pool_options
+from .replicas import choose_replica, normalize_database_url, replica_urls
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+# Nothing here reads the environment or connects at import time. The engine is
+# created by the application's lifespan (see app.main.create_app), or on first
+# use by scripts and tests that never start the app.
 
-# Get Database URL from environment variable
-DATABASE_URL = os.getenv("DATABASE_URL")
-SQLALCHEMY_DATABASE_URL = DATABASE_URL  
+Base = declarative_base()
 
-if not DATABASE_URL:
-    logger.error("No DATABASE_URL environment variable found!")
-    raise ValueError("DATABASE_URL environment variable is required")
+# Bound to the engine once it exists
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
-logger.info("Database URL found")
+_engine: Optional[Engine] = None
+_replica_engines: Optional[List[Engine]] = None
+_engine_lock = threading.Lock()
 
-# Handle special case for PostgreSQL URLs from Railway
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-    SQLALCHEMY_DATABASE_URL = DATABASE_URL  
 
-try:
-    logger.info("Attempting to connect to database...")
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    Base = declarative_base()
-    logger.info("Database connection successful")
-except Exception as e:
-    logger.error(f"Database connection failed: {str(e)}")
-    raise
+def get_database_url() -> str:
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        logger.error("No DATABASE_URL environment variable found!")
+        raise ValueError("DATABASE_URL environment variable is required")
+    return normalize_database_url(database_url)
+
+
+def use_async_db() -> bool:
+    # Serve the API from the asyncio database layer in app/db/async_database.py
+    return os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+
+
+def pool_settings() -> dict:
+    # Connection pool settings; size them for the number of server workers
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        # Retire connections before the server or a proxy drops them
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        # Test connections on checkout so a failover does not surface stale connections
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+    }
+
+
+def get_engine() -> Engine:
+    """The process-wide engine, created from the environment on first call."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                database_url = get_database_url()
+                try:
+                    logger.info("Creating database engine...")
+                    _engine = create_engine(database_url, **pool_options(database_url, pool_settings()))
+                except Exception as e:
+                    logger.error(f"Database engine creation failed: {str(e)}")
+                    raise
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def get_replica_engines() -> List[Engine]:
+    """Engines for DATABASE_REPLICA_URLS, created on first call; empty without replicas."""
+    global _replica_engines
+    if _replica_engines is None:
+        with _engine_lock:
+            if _replica_engines is None:
+                urls = replica_urls()
+                if urls:
+                    logger.info(f"Creating {len(urls)} read replica engine(s)...")
+                _replica_engines = [create_engine(url, **pool_options(url, pool_settings())) for url in urls]
+    return _replica_engines
+
+
+def current_engine() -> Optional[Engine]:
+    """The engine if it has been created, without creating it."""
+    return _engine
+
+
+def current_replica_engines() -> List[Engine]:
+    return _replica_engines or []
+
+
+def dispose_engine():
+    """Close the pools' connections; the engines stay usable and reconnect on demand."""
+    if _engine is not None:
+        _engine.dispose()
+    for replica in current_replica_engines():
+        replica.dispose()
+
+
+def reset_engines_after_fork():
+    """Forget pooled connections inherited from a parent process, without closing them.
+
+    Closing would tear down sockets the parent is still using. The engines stay
+    usable and open fresh connections in the child.
+    """
+    for engine in ([_engine] if _engine is not None else []) + current_replica_engines():
+        engine.dispose(close=False)
+    from . import async_database
+    async_engines = async_database.current_async_replica_engines()
+    if async_database.current_async_engine() is not None:
+        async_engines = [async_database.current_async_engine()] + async_engines
+    for async_engine in async_engines:
+        async_engine.sync_engine.dispose(close=False)
+
 
 def get_db():
+    get_engine()
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db(request: Request):
+    """Session for read-only handlers: a replica when one is configured and the data may lag."""
+    get_engine()
+    replica = choose_replica(get_replica_engines(), request)
+    db = SessionLocal(bind=replica) if replica is not None else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
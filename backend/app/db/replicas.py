@@ -0,0 +1,107 @@
+"""Routing of read-only requests to database replicas.
+
+Replicas are listed in DATABASE_REPLICA_URLS (comma-separated). GET handlers
+take their session from get_read_db (or get_async_read_db), which spreads them
+over the replicas round-robin; everything else stays on the primary.
+
+Replicas lag behind the primary, so reads go to the primary for
+REPLICA_STICKY_SECONDS after a write:
+
+- after any catalog write handled by this process, for every client, which
+  also keeps a lagging replica from refilling the response cache with the
+  data a write just invalidated;
+- for the client that wrote, on any worker, through the cookie (and the
+  response header, for clients that do not keep cookies) set by
+  ReadYourWritesMiddleware.
+"""
+import itertools
+import math
+import os
+import time
+from typing import List, Optional, Sequence, TypeVar
+from fastapi import Request
+from ..core.events import CatalogChange, on_catalog_change
+
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+
+# Unix time until which the client's reads go to the primary. Clients that do not
+# keep cookies can echo the response header back as a request header instead.
+READ_PRIMARY_COOKIE = "read_primary_until"
+READ_PRIMARY_HEADER = "X-Read-Primary-Until"
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_last_write_at = 0.0
+_round_robin = itertools.count()
+
+T = TypeVar("T")
+
+
+def normalize_database_url(url: str) -> str:
+    # Handle special case for PostgreSQL URLs from Railway
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+def replica_urls() -> List[str]:
+    urls = os.getenv("DATABASE_REPLICA_URLS", "")
+    return [normalize_database_url(url.strip()) for url in urls.split(",") if url.strip()]
+
+
+def _client_sticky_until(request: Request) -> float:
+    value = request.headers.get(READ_PRIMARY_HEADER) or request.cookies.get(READ_PRIMARY_COOKIE)
+    try:
+        return float(value) if value else 0.0
+    except ValueError:
+        return 0.0
+
+
+def reads_from_primary(request: Request) -> bool:
+    """Whether a read must see the primary: this process or this client wrote recently."""
+    if time.monotonic() - _last_write_at < REPLICA_STICKY_SECONDS:
+        return True
+    return _client_sticky_until(request) > time.time()
+
+
+def choose_replica(replicas: Sequence[T], request: Request) -> Optional[T]:
+    """The replica engine to read from, or None for the primary."""
+    if not replicas or reads_from_primary(request):
+        return None
+    return replicas[next(_round_robin) % len(replicas)]
+
+
+@on_catalog_change
+def _note_write(change: CatalogChange):
+    global _last_write_at
+    _last_write_at = time.monotonic()
+
+
+class ReadYourWritesMiddleware:
+    """Marks clients that wrote successfully, so their next reads go to the primary.
+
+    A plain ASGI middleware like MetricsMiddleware; it only touches responses
+    to successful unsafe requests, and does nothing without replicas.
+    """
+
+    def __init__(self, app, sticky_seconds: float = REPLICA_STICKY_SECONDS):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+        self.enabled = bool(replica_urls())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_marker(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = f"{time.time() + self.sticky_seconds:.3f}"
+                cookie = f"{READ_PRIMARY_COOKIE}={until}; Max-Age={math.ceil(self.sticky_seconds)}; Path=/; SameSite=Lax"
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"set-cookie", cookie.encode("latin-1")),
+                    (READ_PRIMARY_HEADER.lower().encode("latin-1"), until.encode("latin-1")),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_marker)
@@ -1,36 +1,195 @@
+from .core.startup import startup_report  # First, so the boot clock covers the imports below
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from .api.routes import pizzas, toppings
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+import logging
 import os
-from dotenv import load_dotenv
+from sqlalchemy.orm import configure_mappers
+from .db.database import (
+    current_engine,
+    current_replica_engines,
+    dispose_engine,
+    get_engine,
+    get_replica_engines,
+    use_async_db,
+)
+from .db.pool import pool_status, warm_up_async_pool, warm_up_pool
+from .db.replicas import ReadYourWritesMiddleware
+from .core.admission import AdmissionMiddleware, admission
+from .core.bus import CHANGE_BUS_ENABLED, change_bus
+from .core.cache import catalog_cache
+from .core.compression import CompressionMiddleware
+from .core.feed import change_feed
+from .core.metrics import MetricsMiddleware, render_metrics, shared_metrics
+from .core.profiling import ProfilingMiddleware
+from .api.routes import admin, bulk, catalog, changes, pizza_queries, search
 
-load_dotenv()
+startup_report.record_since_boot("import app.main")
 
-app = FastAPI(title="Pizza Management API")
+logger = logging.getLogger(__name__)
+
+# Opening connections, configuring mappers and building the OpenAPI schema at
+# startup moves their cost off the first requests a new worker serves
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() in ("1", "true", "yes")
+WARMUP_CONNECTIONS = int(os.getenv("DB_WARMUP_CONNECTIONS", "2"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async_db = app.state.async_db
+    with startup_report.phase("create engine"):
+        engines = [get_engine()] + get_replica_engines()
+        if async_db:
+            from .db.async_database import get_async_engine, get_async_replica_engines
+            async_engines = [get_async_engine()] + get_async_replica_engines()
+    if STARTUP_WARMUP:
+        with startup_report.phase("warm up mappers"):
+            configure_mappers()
+        with startup_report.phase("warm up pool"):
+            for engine in engines:
+                await run_in_threadpool(warm_up_pool, engine, WARMUP_CONNECTIONS)
+            if async_db:
+                for async_engine in async_engines:
+                    await warm_up_async_pool(async_engine, WARMUP_CONNECTIONS)
+        with startup_report.phase("warm up openapi"):
+            app.openapi()
+    if CHANGE_BUS_ENABLED:
+        # Relays catalog writes between workers, so their caches and change feeds agree
+        with startup_report.phase("start change bus"):
+            await run_in_threadpool(change_bus.start, engines[0])
+    if shared_metrics is not None:
+        shared_metrics.start()
+    startup_report.ready()
+    report = startup_report.as_dict()
+    logger.info(f"Started in {report['total_ms']} ms (budget {report['budget_ms']} ms)")
+    yield
+    await run_in_threadpool(change_bus.stop)
+    if shared_metrics is not None:
+        await run_in_threadpool(shared_metrics.stop)
+    dispose_engine()
+    if async_db:
+        from .db.async_database import dispose_async_engine
+        await dispose_async_engine()
+
+
+def create_app() -> FastAPI:
+    """Build the application. The database is only touched once its lifespan starts."""
+    with startup_report.phase("configure"):
+        logging.basicConfig(level=logging.INFO)
+        async_db = use_async_db()
+        if async_db:
+            from .api.routes import async_pizzas as pizzas, async_toppings as toppings
+        else:
+            from .api.routes import pizzas, toppings
+
+    with startup_report.phase("create app"):
+        # orjson renders the response models FastAPI has already serialized to plain data
+        app = FastAPI(title="Pizza Management API", default_response_class=ORJSONResponse, lifespan=lifespan)
+        app.state.async_db = async_db
+
+        # Most permissive CORS configuration for debugging
+        app.add_middleware(
+            CORSMiddleware,
+            allow_origins=["*"],  # Allow all origins
+            allow_credentials=False,  # Must be False when allow_origins=["*"]
+            allow_methods=["*"],
+            allow_headers=["*"],
+            # Pagination cursors, entity tags, timings, replica stickiness, cut-short searches and profiles for browser clients
+            expose_headers=[
+                "X-Next-Cursor",
+                "Link",
+                "ETag",
+                "Server-Timing",
+                "X-Read-Primary-Until",
+                "X-Search-Truncated",
+                "X-Profile-Id",
+            ],
+        )
+
+        # Negotiated gzip/brotli; cached catalog responses arrive already compressed
+        app.add_middleware(CompressionMiddleware)
+
+        # Sends a client's reads to the primary for a while after it writes; idle without replicas
+        app.add_middleware(ReadYourWritesMiddleware)
+
+        # Samples the stacks of requests that ask for it (X-Profile-Token) or are picked at random
+        app.add_middleware(ProfilingMiddleware)
+
+        # Bounds the requests in progress and sheds the excess with 503 before any work is done
+        app.add_middleware(AdmissionMiddleware, routes=app.router.routes)
+
+        # Outermost, so the timings cover the whole middleware stack
+        app.add_middleware(MetricsMiddleware)
+
+        # Include routers; fixed paths such as /bulk go before the /{id} routes
+        app.include_router(bulk.router, prefix="/api")
+        app.include_router(pizza_queries.router, prefix="/api")
+        app.include_router(catalog.router, prefix="/api/catalog", tags=["catalog"])
+        app.include_router(search.router, prefix="/api")
+        app.include_router(changes.router, prefix="/api", tags=["changes"])
+        app.include_router(admin.router, prefix="/admin", tags=["admin"])
+        app.include_router(pizzas.router, prefix="/api/pizzas", tags=["pizzas"])
+        app.include_router(toppings.router, prefix="/api/toppings", tags=["toppings"])
+
+        @app.get("/")
+        async def root():
+            return {
+                "message": "Welcome to Pizza Management API",
+                "docs": "/docs",
+                "version": "1.0.0"
+            }
+
+        @app.get("/health")
+        async def health_check():
+            return {
+                "status": "healthy"
+            }
+
+        @app.get("/health/pool")
+        async def pool_health():
+            # Use these numbers to size DB_POOL_SIZE/DB_MAX_OVERFLOW per worker.
+            # Engines that have not been created yet are left out.
+            pools = {}
+            if current_engine() is not None:
+                pools["sync"] = pool_status(current_engine().pool)
+            for index, replica in enumerate(current_replica_engines()):
+                pools[f"sync_replica_{index}"] = pool_status(replica.pool)
+            if async_db:
+                from .db.async_database import current_async_engine, current_async_replica_engines
+                if current_async_engine() is not None:
+                    pools["async"] = pool_status(current_async_engine().pool)
+                for index, replica in enumerate(current_async_replica_engines()):
+                    pools[f"async_replica_{index}"] = pool_status(replica.pool)
+            return pools
+
+        @app.get("/health/cache")
+        async def cache_health():
+            return catalog_cache.stats()
+
+        @app.get("/health/changes")
+        async def changes_health():
+            return {"bus": change_bus.stats(), "feed_subscribers": change_feed.subscribers}
+
+        @app.get("/health/admission")
+        async def admission_health():
+            return admission.stats()
+
+        @app.get("/health/startup")
+        async def startup_health():
+            return startup_report.as_dict()
+
+        @app.get("/metrics", response_class=PlainTextResponse)
+        async def metrics_endpoint():
+            return PlainTextResponse(await run_in_threadpool(render_metrics) + admission.render(), media_type="text/plain; version=0.0.4")
+
+    return app
 
-# Most permissive CORS configuration for debugging
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins
-    allow_credentials=False,  # Must be False when allow_origins=["*"]
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
-# Include routers
-app.include_router(pizzas.router, prefix="/api/pizzas", tags=["pizzas"])
-app.include_router(toppings.router, prefix="/api/toppings", tags=["toppings"])
-
-@app.get("/")
-async def root():
-    return {
-        "message": "Welcome to Pizza Management API",
-        "docs": "/docs",
-        "version": "1.0.0"
-    }
-
-@app.get("/health")
-async def health_check():
-    return {
-        "status": "healthy"
-    }
\ No newline at end of file
+def __getattr__(name):
+    # `app` is built on first access (e.g. by uvicorn app.main:app), not on import
+    if name == "app":
+        application = globals()["app"] = create_app()
+        return application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
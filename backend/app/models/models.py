@@ -1,25 +1,69 @@
-from sqlalchemy import Column, Integer, String, Table, ForeignKey
+import hashlib
+from sqlalchemy import Column, DateTime, Integer, String, Table, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from ..db.database import Base
 
-# Association table for Pizza-Topping relationship
+# Association table for Pizza-Topping relationship. The primary key indexes
+# (pizza_id, topping_id); the reverse index answers "pizzas with topping X".
 pizza_toppings = Table(
     'pizza_toppings',
     Base.metadata,
-    Column('pizza_id', Integer, ForeignKey('pizzas.id')),
-    Column('topping_id', Integer, ForeignKey('toppings.id'))
+    Column('pizza_id', Integer, ForeignKey('pizzas.id'), primary_key=True),
+    Column('topping_id', Integer, ForeignKey('toppings.id'), primary_key=True),
+    Index('ix_pizza_toppings_topping_id_pizza_id', 'topping_id', 'pizza_id'),
 )
 
+def topping_signature(topping_ids):
+    """Canonical key for a set of toppings, independent of order and repeats."""
+    canonical = ",".join(str(topping_id) for topping_id in sorted(set(topping_ids)))
+    return hashlib.sha1(canonical.encode("ascii")).hexdigest()
+
 class Pizza(Base):
     __tablename__ = "pizzas"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
+    # Unique per topping combination, so duplicate pizzas are rejected by the database
+    topping_signature = Column(String(40), unique=True, index=True)
+    # Row version for optimistic concurrency: the ORM adds it to the WHERE clause of
+    # every UPDATE and DELETE and bumps it, so a lost race raises StaleDataError
+    version_id = Column(Integer, nullable=False, server_default="1")
     toppings = relationship("Topping", secondary=pizza_toppings, back_populates="pizzas")
 
+    __mapper_args__ = {"version_id_col": version_id}
+
 class Topping(Base):
     __tablename__ = "toppings"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
-    pizzas = relationship("Pizza", secondary=pizza_toppings, back_populates="toppings")
\ No newline at end of file
+    version_id = Column(Integer, nullable=False, server_default="1")
+    pizzas = relationship("Pizza", secondary=pizza_toppings, back_populates="toppings")
+
+    __mapper_args__ = {"version_id_col": version_id}
+
+
+class CatalogChangeRecord(Base):
+    """A committed catalog write, appended by the worker that made it for the others to read.
+
+    See app.core.bus. Rows are pruned after CHANGE_LOG_RETENTION_SECONDS.
+    """
+    __tablename__ = "catalog_changes"
+
+    id = Column(Integer, primary_key=True)
+    # The worker that appended the row, which skips it when reading
+    origin = Column(String(32), nullable=False)
+    entity = Column(String(16), nullable=False)
+    action = Column(String(16), nullable=False)
+    item_id = Column(Integer, nullable=False)
+    name = Column(String, nullable=True)
+    # Comma-separated IDs of CatalogChange.related_ids
+    related_ids = Column(String, nullable=False, default="")
+    created_at = Column(DateTime, nullable=False, index=True)
+
+# Names are unique regardless of case; lookups compare lower(name) to hit these.
+# On PostgreSQL, search also uses trigram GIN indexes on lower(name), created by
+# migration 8cf7a831710f only, as other databases cannot build them. Likewise
+# the name_prefix filters use varchar_pattern_ops indexes from a4f1c2e9b7d3.
+Index("ix_pizzas_name_lower", func.lower(Pizza.name), unique=True)
+Index("ix_toppings_name_lower", func.lower(Topping.name), unique=True)
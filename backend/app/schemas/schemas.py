@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
+from typing import Annotated, List, Literal, Optional, Union
 
 # Base models
 class ToppingBase(BaseModel):
@@ -19,26 +19,99 @@ class PizzaCreate(PizzaBase):
 class ToppingSimple(ToppingBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class PizzaSimple(PizzaBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Full models
 class Topping(ToppingBase):
     id: int
     pizzas: List[PizzaSimple] = []
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class ToppingUsage(ToppingSimple):
+    # Number of pizzas using the topping, listed instead of the pizzas themselves
+    pizza_count: int
 
 class Pizza(PizzaBase):
     id: int
     toppings: List[ToppingSimple]
 
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+# Bulk models
+MAX_BULK_ITEMS = 1000
+
+# "atomic" writes nothing if any item fails; "best_effort" writes the valid items
+BulkMode = Literal["atomic", "best_effort"]
+
+class ToppingUpdate(ToppingBase):
+    id: int
+
+class PizzaUpdate(PizzaCreate):
+    id: int
+
+class BulkToppingCreate(BaseModel):
+    items: List[ToppingCreate] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+    mode: BulkMode = "atomic"
+
+class BulkToppingUpdate(BaseModel):
+    items: List[ToppingUpdate] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+    mode: BulkMode = "atomic"
+
+class BulkPizzaCreate(BaseModel):
+    items: List[PizzaCreate] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+    mode: BulkMode = "atomic"
+
+class BulkPizzaUpdate(BaseModel):
+    items: List[PizzaUpdate] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+    mode: BulkMode = "atomic"
+
+class BulkDelete(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+    mode: BulkMode = "atomic"
+
+class BulkItemResult(BaseModel):
+    index: int
+    status: Literal["created", "updated", "deleted", "error", "skipped"]
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+class BulkResult(BaseModel):
+    results: List[BulkItemResult]
+
+# Type-ahead search results, best first
+class SearchResult(BaseModel):
+    type: Literal["pizza", "topping"]
+    id: int
+    name: str
+    score: float
+
+# Catalog export/import records, one JSON object per NDJSON line
+class ToppingRecord(BaseModel):
+    type: Literal["topping"]
+    id: int
+    name: str
+
+class PizzaRecord(BaseModel):
+    type: Literal["pizza"]
+    id: int
+    name: str
+    topping_ids: List[int]
+
+class ImportSummary(BaseModel):
+    toppings: int
+    pizzas: int
+    # Lines consumed from the start of the file; pass as ?offset= to resume after it
+    offset: int
+
+CatalogRecord = TypeAdapter(Annotated[Union[ToppingRecord, PizzaRecord], Field(discriminator="type")])
+
+# Adapters for rendering responses to JSON bytes ahead of FastAPI's serialization.
+# List routes build their JSON from row tuples instead (see render_nested_rows).
+PizzaItem = TypeAdapter(Pizza)
+ToppingItem = TypeAdapter(Topping)
@@ -0,0 +1,212 @@
+"""Bandwidth against CPU for response compression.
+
+Seeds a synthetic catalog, renders the full pizza and topping lists and then
+
+1. compresses each body with every coding and level, reporting its size, the
+   CPU time to compress and decompress it, and the time the bytes take on a
+   link of --link-mbps, so the levels can be compared end to end;
+2. serves GET /api/pizzas/ in-process with each Accept-Encoding, with the
+   response cache on (compressed copies reused) and off (compressed per
+   request), reporting latency and bytes per response.
+
+    python -m benchmarks.compression --pizzas 10000
+    python -m benchmarks.compression --pizzas 10000 --link-mbps 5 --output results/compression.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+GZIP_LEVELS = (1, 6, 9)
+BROTLI_QUALITIES = (1, 4, 6, 11)
+ACCEPT_ENCODINGS = ("identity", "gzip", "br")
+
+
+def _median_ms(action, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        action()
+        timings.append(time.perf_counter() - started_at)
+    return round(statistics.median(timings) * 1000, 3)
+
+
+def codec_table(bodies: Dict[str, bytes], link_mbps: float, repeat: int) -> List[dict]:
+    from app.core import compression
+
+    codecs = [("identity", None)] + [("gzip", level) for level in GZIP_LEVELS]
+    if compression.brotli is not None:
+        codecs += [("br", quality) for quality in BROTLI_QUALITIES]
+
+    rows = []
+    for body_name, body in bodies.items():
+        for encoding, level in codecs:
+            if encoding == "identity":
+                encoded, compress_ms, decompress_ms = body, 0.0, 0.0
+            elif encoding == "gzip":
+                compression.GZIP_LEVEL = level
+                encoded = compression.compress(body, encoding)
+                compress_ms = _median_ms(lambda: compression.compress(body, encoding), repeat)
+                decompress_ms = _median_ms(lambda: zlib.decompress(encoded, 31), repeat)
+            else:
+                compression.BROTLI_QUALITY = level
+                # Quality 11 is slow enough that fewer repeats tell the same story
+                runs = max(1, repeat // 5) if level >= 10 else repeat
+                encoded = compression.compress(body, encoding)
+                compress_ms = _median_ms(lambda: compression.compress(body, encoding), runs)
+                decompress_ms = _median_ms(lambda: compression.brotli.decompress(encoded), repeat)
+            wire_ms = len(encoded) * 8 / (link_mbps * 1_000_000) * 1000
+            rows.append({
+                "body": body_name,
+                "encoding": encoding,
+                "level": level,
+                "bytes": len(encoded),
+                "ratio": round(len(body) / len(encoded), 2),
+                "compress_ms": compress_ms,
+                "decompress_ms": decompress_ms,
+                "wire_ms": round(wire_ms, 2),
+                # What the client waits for: compressing (uncached), sending and decoding
+                "total_ms": round(compress_ms + wire_ms + decompress_ms, 2),
+            })
+    return rows
+
+
+async def serve_table(app, requests: int) -> List[dict]:
+    from app.core.cache import catalog_cache
+    from app.core.compression import available_encodings
+
+    rows = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for cached in (True, False):
+            catalog_cache.enabled = cached
+            catalog_cache.clear()
+            for accept in ACCEPT_ENCODINGS:
+                if accept != "identity" and accept not in available_encodings():
+                    continue
+                headers = {"Accept-Encoding": accept}
+                # Warm up: fills the cache entry and its compressed copy
+                await client.get("/api/pizzas/", headers=headers)
+                latencies, wire_bytes = [], 0
+                for _ in range(requests):
+                    started_at = time.perf_counter()
+                    response = await client.get("/api/pizzas/", headers=headers)
+                    latencies.append(time.perf_counter() - started_at)
+                    wire_bytes = response.num_bytes_downloaded
+                rows.append({
+                    "cache": "on" if cached else "off",
+                    "accept_encoding": accept,
+                    "content_encoding": response.headers.get("content-encoding", "identity"),
+                    "bytes": wire_bytes,
+                    "p50_ms": round(statistics.median(latencies) * 1000, 2),
+                    "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+                })
+    catalog_cache.enabled = True
+    return rows
+
+
+def _print_codecs(rows: List[dict], link_mbps: float):
+    header = (
+        f"{'body':<10}{'coding':<10}{'bytes':>11}{'ratio':>8}{'comp ms':>10}"
+        f"{'decomp ms':>11}{f'wire ms @{link_mbps:g}Mbps':>20}{'total ms':>10}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        coding = row["encoding"] if row["level"] is None else f"{row['encoding']}-{row['level']}"
+        print(
+            f"{row['body']:<10}{coding:<10}{row['bytes']:>11}{row['ratio']:>8}{row['compress_ms']:>10}"
+            f"{row['decompress_ms']:>11}{row['wire_ms']:>20}{row['total_ms']:>10}"
+        )
+
+
+def _print_served(rows: List[dict]):
+    header = f"{'cache':<7}{'accept':<10}{'sent as':<10}{'bytes':>11}{'p50 ms':>9}{'mean ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['cache']:<7}{row['accept_encoding']:<10}{row['content_encoding']:<10}"
+            f"{row['bytes']:>11}{row['p50_ms']:>9}{row['mean_ms']:>9}"
+        )
+
+
+async def _run(args) -> dict:
+    RESULTS_DIR.mkdir(exist_ok=True)
+    database_url = args.database_url or f"sqlite:///{RESULTS_DIR / 'compression.db'}"
+    # The app reads its configuration when it is created, so this must happen first
+    os.environ["DATABASE_URL"] = database_url
+
+    from sqlalchemy import create_engine
+    from benchmarks.seed import seed_catalog
+    from app.main import create_app
+
+    seed_engine = create_engine(database_url)
+    shape = seed_catalog(seed_engine, args.pizzas, args.toppings, seed=args.seed_value)
+    seed_engine.dispose()
+
+    app = create_app()
+    # ASGITransport does not send lifespan events, so start the app here
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            headers = {"Accept-Encoding": "identity"}
+            bodies = {
+                "pizzas": (await client.get("/api/pizzas/", headers=headers)).content,
+                "toppings": (await client.get("/api/toppings/", headers=headers)).content,
+            }
+        from app.core import compression
+        levels = (compression.GZIP_LEVEL, compression.BROTLI_QUALITY)
+        codecs = codec_table(bodies, args.link_mbps, args.repeat)
+        compression.GZIP_LEVEL, compression.BROTLI_QUALITY = levels
+        served = await serve_table(app, args.requests)
+
+    return {
+        "meta": {
+            "catalog": shape,
+            "link_mbps": args.link_mbps,
+            "gzip_level": levels[0],
+            "brotli_quality": levels[1] if compression.brotli is not None else None,
+        },
+        "codecs": codecs,
+        "served": served,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure response compression trade-offs")
+    parser.add_argument("--database-url", help="Database to seed (defaults to a SQLite file under results/)")
+    parser.add_argument("--pizzas", type=int, default=2000)
+    parser.add_argument("--toppings", type=int, default=0, help="Topping count (default scales with pizzas)")
+    parser.add_argument("--seed-value", type=int, default=42)
+    parser.add_argument("--link-mbps", type=float, default=20.0, help="Client bandwidth for the wire-time column")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per codec and level")
+    parser.add_argument("--requests", type=int, default=50, help="Measured requests per served variant")
+    parser.add_argument("--output", type=Path, help="Also write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list] = None):
+    args = parse_args(argv)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    report = asyncio.run(_run(args))
+    _print_codecs(report["codecs"], args.link_mbps)
+    print()
+    _print_served(report["served"])
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""Load test for the Pizza Management API.
+
+Seeds a synthetic catalog, drives every catalog endpoint with concurrent
+clients and writes latency percentiles, throughput and queries-per-request to
+a JSON file that can be diffed against an earlier run.
+
+    # in-process against a throwaway SQLite catalog of 10k pizzas
+    python -m benchmarks.run --pizzas 10000 --concurrency 32
+
+    # against a running server (seed its database separately with --seed-only)
+    python -m benchmarks.run --base-url http://localhost:8000 --no-seed
+
+    # compare with a previous run
+    python -m benchmarks.run --pizzas 10000 --baseline benchmarks/results/before.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import re
+import subprocess
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+_SAMPLE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    # Route template as reported by /metrics, used to read queries per request
+    route: str
+    build: Callable[[random.Random], dict]
+    expected: tuple = (200,)
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    method: str
+    route: str
+    requests: int
+    errors: int
+    duration: float
+    latencies: List[float] = field(repr=False, default_factory=list)
+    queries_per_request: Optional[float] = None
+
+    def summary(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "name": self.name,
+            "method": self.method,
+            "route": self.route,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rps": round(self.requests / self.duration, 1) if self.duration else 0.0,
+            "p50_ms": _percentile(latencies, 50),
+            "p95_ms": _percentile(latencies, 95),
+            "p99_ms": _percentile(latencies, 99),
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            "queries_per_request": self.queries_per_request,
+        }
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[index] * 1000, 2)
+
+
+def scenarios(pizzas: int, toppings: int, page_size: int) -> List[Scenario]:
+    def random_pizza(rng):
+        return rng.randint(1, pizzas)
+
+    def random_topping(rng):
+        return rng.randint(1, toppings)
+
+    def topping_round_trip(rng):
+        return {"json": {"name": f"Bench topping {rng.getrandbits(64):016x}"}}
+
+    return [
+        Scenario("list_pizzas_page", "GET", "/api/pizzas/",
+                 lambda rng: {"url": "/api/pizzas/", "params": {"limit": page_size}}),
+        Scenario("list_pizzas_deep_page", "GET", "/api/pizzas/",
+                 lambda rng: {"url": "/api/pizzas/",
+                              "params": {"limit": page_size, "after_id": random_pizza(rng)}}),
+        Scenario("filter_pizzas_by_topping", "GET", "/api/pizzas/",
+                 lambda rng: {"url": "/api/pizzas/",
+                              "params": {"limit": page_size, "topping_id": random_topping(rng)}}),
+        Scenario("get_pizza", "GET", "/api/pizzas/{pizza_id}",
+                 lambda rng: {"url": f"/api/pizzas/{random_pizza(rng)}"}),
+        Scenario("list_toppings", "GET", "/api/toppings/",
+                 lambda rng: {"url": "/api/toppings/", "params": {"limit": page_size}}),
+        Scenario("get_topping", "GET", "/api/toppings/{topping_id}",
+                 lambda rng: {"url": f"/api/toppings/{random_topping(rng)}"}),
+        Scenario("create_topping", "POST", "/api/toppings/",
+                 lambda rng: {"url": "/api/toppings/", **topping_round_trip(rng)}),
+    ]
+
+
+async def _scrape_queries(client: httpx.AsyncClient) -> Dict[tuple, Dict[str, float]]:
+    """Per-route request and SQL statement counters from /metrics."""
+    response = await client.get("/metrics")
+    counters: Dict[tuple, Dict[str, float]] = {}
+    for line in response.text.splitlines():
+        match = _SAMPLE.match(line)
+        if not match:
+            continue
+        metric, raw_labels, value = match.groups()
+        if metric not in ("http_requests_total", "http_request_db_queries_total"):
+            continue
+        labels = dict(_LABEL.findall(raw_labels))
+        key = (labels["method"], labels["route"])
+        bucket = counters.setdefault(key, {"requests": 0.0, "queries": 0.0})
+        bucket["requests" if metric == "http_requests_total" else "queries"] += float(value)
+    return counters
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    seed: str,
+) -> ScenarioResult:
+    before = await _scrape_queries(client)
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker(worker_id: int):
+        nonlocal errors
+        rng = random.Random(f"{seed}-{scenario.name}-{worker_id}")
+        for _ in remaining:
+            spec = scenario.build(rng)
+            started_at = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, **spec)
+                ok = response.status_code in scenario.expected
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started_at)
+            if not ok:
+                errors += 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    duration = time.perf_counter() - started_at
+
+    after = await _scrape_queries(client)
+    key = (scenario.method, scenario.route)
+    handled = after.get(key, {}).get("requests", 0) - before.get(key, {}).get("requests", 0)
+    queries = after.get(key, {}).get("queries", 0) - before.get(key, {}).get("queries", 0)
+    return ScenarioResult(
+        scenario.name, scenario.method, scenario.route, requests, errors, duration, latencies,
+        round(queries / handled, 2) if handled else None,
+    )
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_table(results: List[dict], baseline: Optional[Dict[str, dict]] = None):
+    header = f"{'scenario':<26}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'q/req':>7}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        qpr = result["queries_per_request"]
+        print(
+            f"{result['name']:<26}{result['rps']:>9}{result['p50_ms']:>9}{result['p95_ms']:>9}"
+            f"{result['p99_ms']:>9}{'-' if qpr is None else qpr:>7}{result['errors']:>8}"
+        )
+        previous = (baseline or {}).get(result["name"])
+        if previous:
+            deltas = []
+            for metric in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+                if previous.get(metric):
+                    change = (result[metric] - previous[metric]) / previous[metric] * 100
+                    deltas.append(f"{metric} {change:+.1f}%")
+            print(f"{'':<26}vs baseline: {', '.join(deltas)}")
+
+
+def _configure_database(args) -> str:
+    url = args.database_url or os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{RESULTS_DIR / 'bench.db'}"
+    # The app reads its configuration when it is created, so this must happen first
+    os.environ["DATABASE_URL"] = url
+    if not args.cache:
+        os.environ["CATALOG_CACHE_ENABLED"] = "false"
+    # All requests come from one client, which the write rate limit would mostly turn away
+    os.environ.setdefault("ADMISSION_WRITE_RATE", "0")
+    return url
+
+
+async def _run(args) -> dict:
+    RESULTS_DIR.mkdir(exist_ok=True)
+    shape = None
+    database_url = None
+    if args.base_url is None or args.seed_only:
+        database_url = _configure_database(args)
+        from sqlalchemy import create_engine
+        from benchmarks.seed import catalog_shape, seed_catalog
+
+        seed_engine = create_engine(database_url)
+        if args.seed:
+            started_at = time.perf_counter()
+            shape = seed_catalog(seed_engine, args.pizzas, args.toppings, seed=args.seed_value)
+            print(f"Seeded {shape} in {time.perf_counter() - started_at:.1f}s")
+        else:
+            shape = catalog_shape(seed_engine)
+        seed_engine.dispose()
+        if args.seed_only:
+            return {}
+
+    lifespan = contextlib.nullcontext()
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+    else:
+        from app.main import create_app
+
+        app = create_app()
+        # ASGITransport does not send lifespan events, so start the app (engine, warm-up) here
+        lifespan = app.router.lifespan_context(app)
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout)
+
+    async with lifespan, client:
+        if shape is None:
+            # Remote target: learn the catalog size from the API itself
+            pizzas = len((await client.get("/api/pizzas/")).json())
+            toppings = len((await client.get("/api/toppings/")).json())
+            shape = {"pizzas": pizzas, "toppings": toppings}
+
+        selected = [
+            scenario for scenario in scenarios(shape["pizzas"], shape["toppings"], args.page_size)
+            if not args.only or scenario.name in args.only
+        ]
+        results = []
+        for scenario in selected:
+            # Warm up connections, caches and the interpreter before measuring
+            await run_scenario(client, scenario, args.warmup, args.concurrency, f"{args.seed_value}-warmup")
+            result = await run_scenario(client, scenario, args.requests, args.concurrency, str(args.seed_value))
+            results.append(result.summary())
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "target": args.base_url or "in-process",
+            "database": database_url.split("://")[0] if database_url else None,
+            "catalog": shape,
+            "concurrency": args.concurrency,
+            "requests_per_scenario": args.requests,
+            "page_size": args.page_size,
+            "cache_enabled": args.cache,
+        },
+        "results": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Pizza Management API")
+    parser.add_argument("--base-url", help="Benchmark a running server instead of the app in-process")
+    parser.add_argument("--database-url", help="Database to seed (defaults to a SQLite file under results/)")
+    parser.add_argument("--pizzas", type=int, default=1000, help="Catalog size, e.g. 100 to 100000")
+    parser.add_argument("--toppings", type=int, default=0, help="Topping count (default scales with pizzas)")
+    parser.add_argument("--no-seed", dest="seed", action="store_false", help="Reuse the existing catalog")
+    parser.add_argument("--seed-only", action="store_true", help="Seed the database and exit")
+    parser.add_argument("--seed-value", type=int, default=42, help="Random seed for data and request mix")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=50, help="Unmeasured requests per scenario")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--no-cache", dest="cache", action="store_false",
+                        help="Disable the response cache for in-process runs")
+    parser.add_argument("--only", nargs="+", metavar="SCENARIO", help="Run only these scenarios")
+    parser.add_argument("--output", type=Path, help="Results file (defaults to results/<timestamp>.json)")
+    parser.add_argument("--baseline", type=Path, help="Earlier results file to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # httpx logs every request at INFO, which would swamp the report
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    report = asyncio.run(_run(args))
+    if not report:
+        return
+
+    baseline = None
+    if args.baseline:
+        previous = json.loads(args.baseline.read_text())
+        baseline = {result["name"]: result for result in previous["results"]}
+    _print_table(report["results"], baseline)
+
+    output = args.output or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{report['meta']['commit'] or 'local'}.json"
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Production server: gunicorn supervising uvicorn workers.
+#
+#   gunicorn app.main:app
+#
+# Gunicorn reads this file from the working directory. Every setting can be
+# overridden from the environment. Send HUP to the master for a graceful reload:
+# new workers start with fresh code and config before the old ones are drained.
+import os
+import shutil
+import tempfile
+from app.core.server import default_workers
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "app.core.server.ProductionUvicornWorker"
+# Workers share no memory. Entity tags are digests of the data, so any worker
+# answers a conditional GET alike; writes are relayed between workers through
+# the database (app.core.bus), so caches and change feeds hear of all of them;
+# and /metrics adds up the workers' metrics from METRICS_DIR below.
+workers = int(os.getenv("WEB_CONCURRENCY", default_workers()))
+
+# Inherited by the workers; one directory per master unless set explicitly
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), f"pizza-metrics-{os.getpid()}"))
+
+# Keep-alive: idle client connections are held this long (seconds). Set it above
+# the load balancer's idle timeout so the proxy, not the app, closes them.
+keepalive = int(os.getenv("KEEPALIVE", "75"))
+
+# Recycle each worker after this many requests to bound slow memory growth. The
+# jitter staggers the restarts so workers do not all recycle at once.
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+
+# Workers silent for longer than timeout are killed and replaced; on shutdown or
+# reload they get graceful_timeout to finish in-flight requests.
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+# Importing the app in the master lets workers share its memory, but then a HUP
+# no longer picks up code changes. Off by default.
+preload_app = os.getenv("PRELOAD_APP", "false").lower() in ("1", "true", "yes")
+
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "*")
+accesslog = os.getenv("ACCESS_LOG", "-")
+errorlog = "-"
+
+
+def on_starting(server):
+    # Metrics files of a previous master would be added to this one's
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["METRICS_DIR"])
+
+
+def post_fork(server, worker):
+    # Engines are created in each worker's lifespan, so nothing is inherited unless
+    # the master created one (e.g. with preload_app). Drop such pools without
+    # closing them: the connections belong to the master.
+    from app.db.database import reset_engines_after_fork
+    reset_engines_after_fork()
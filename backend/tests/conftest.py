@@ -1,8 +1,17 @@
 import pytest
+from fastapi import FastAPI
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from app.db.database import Base, get_db
+from sqlalchemy.pool import NullPool
+from app.api.routes import async_pizzas, async_toppings
+from app.core.admission import admission
+from app.core.cache import catalog_cache
+from app.core.metrics import MetricsMiddleware
+from app.core.search import catalog_search
+from app.db.async_database import get_async_db, get_async_read_db
+from app.db.database import Base, get_db, get_read_db
 from app.main import app
 
 # Use SQLite for testing
@@ -13,6 +22,23 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The async routes run against the same file through aiosqlite. NullPool keeps
+# connections from outliving the event loop of the request that opened them.
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+AsyncTestingSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+@pytest.fixture(autouse=True)
+def clear_catalog_cache():
+    # Each test starts from an empty database, so nothing cached or indexed may leak across
+    catalog_cache.clear()
+    catalog_search.clear()
+    admission.reset()
+    yield
+    catalog_cache.clear()
+    catalog_search.clear()
+
 @pytest.fixture
 def db_session():
     Base.metadata.create_all(bind=engine)
@@ -31,6 +57,52 @@ def client(db_session):
         finally:
             db_session.close()
     
+    # Reads and writes share the session; test_replicas.py covers the routing
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     yield TestClient(app)
-    del app.dependency_overrides[get_db]
\ No newline at end of file
+    del app.dependency_overrides[get_db]
+    del app.dependency_overrides[get_read_db]
+
+@pytest.fixture
+def async_client(db_session):
+    async def override_get_async_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+    
+    # Same routes as app.main mounts when DB_ASYNC is set
+    async_app = FastAPI()
+    async_app.add_middleware(MetricsMiddleware)
+    async_app.include_router(async_pizzas.router, prefix="/api/pizzas")
+    async_app.include_router(async_toppings.router, prefix="/api/toppings")
+    async_app.dependency_overrides[get_async_db] = override_get_async_db
+    async_app.dependency_overrides[get_async_read_db] = override_get_async_db
+    with TestClient(async_app) as client:
+        yield client
+
+class QueryCounter:
+    """Records the SQL statements sent to the test engine."""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def reset(self):
+        self.statements.clear()
+
+@pytest.fixture
+def query_counter():
+    counter = QueryCounter()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    # Both engines, so the counts cover the sync and the async routes
+    for counted in (engine, async_engine.sync_engine):
+        event.listen(counted, "before_cursor_execute", before_cursor_execute)
+    yield counter
+    for counted in (engine, async_engine.sync_engine):
+        event.remove(counted, "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,110 @@
+import asyncio
+from fastapi.testclient import TestClient
+from app.core.admission import (
+    QUEUE_FULL,
+    QUEUE_TIMEOUT,
+    READ,
+    WRITE,
+    Lane,
+    RateLimiter,
+    admission,
+    parse_route_limits,
+)
+
+def test_lane_queues_then_sheds():
+    async def run():
+        lane = Lane(limit=1, max_queue=1)
+        assert await lane.acquire(READ, timeout=1) is None
+
+        waiting = asyncio.ensure_future(lane.acquire(READ, timeout=1))
+        await asyncio.sleep(0)
+        assert lane.queued() == 1
+        # The queue is full: turned away at once
+        assert await lane.acquire(READ, timeout=1) == QUEUE_FULL
+
+        lane.release(READ)
+        assert await waiting is None
+        assert lane.active[READ] == 1
+
+        # Nobody releases: the wait times out
+        assert await lane.acquire(READ, timeout=0.01) == QUEUE_TIMEOUT
+        assert lane.queued() == 0
+        assert lane.rejected[(READ, QUEUE_FULL)] == lane.rejected[(READ, QUEUE_TIMEOUT)] == 1
+
+    asyncio.run(run())
+
+def test_lane_prefers_reads():
+    async def run():
+        lane = Lane(limit=2, max_queue=10, write_limit=1)
+        assert await lane.acquire(WRITE, timeout=1) is None
+        # Writes may only hold one slot; reads still get the other
+        write = asyncio.ensure_future(lane.acquire(WRITE, timeout=1))
+        await asyncio.sleep(0)
+        assert not write.done()
+        assert await lane.acquire(READ, timeout=1) is None
+
+        read = asyncio.ensure_future(lane.acquire(READ, timeout=1))
+        await asyncio.sleep(0)
+        # A read finishing lets the queued read in, although the write queued first
+        lane.release(READ)
+        await asyncio.sleep(0)
+        assert read.done() and not write.done()
+
+        lane.release(WRITE)
+        assert await write is None
+        assert lane.active == {READ: 1, WRITE: 1}
+
+    asyncio.run(run())
+
+def test_lane_cancelled_waiter_gives_back_its_slot():
+    async def run():
+        lane = Lane(limit=1, max_queue=10)
+        await lane.acquire(READ, timeout=1)
+        waiting = asyncio.ensure_future(lane.acquire(READ, timeout=1))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.sleep(0)
+        assert lane.queued() == 0
+        lane.release(READ)
+        assert lane.active[READ] == 0
+
+    asyncio.run(run())
+
+def test_parse_route_limits():
+    assert parse_route_limits("POST /api/pizzas/=8, PUT /api/pizzas/{pizza_id}=4,") == {
+        "POST /api/pizzas/": 8,
+        "PUT /api/pizzas/{pizza_id}": 4,
+    }
+
+def test_full_queue_answers_503(client: TestClient, monkeypatch):
+    monkeypatch.setattr(admission, "lane", Lane(limit=0, max_queue=0))
+    response = client.get("/api/pizzas/")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert response.json()["reason"] == QUEUE_FULL
+
+    # Probes are never queued, so an overloaded worker can still be watched
+    stats = client.get("/health/admission").json()
+    assert stats["worker"]["rejected"]["read_queue_full"] == 1
+    assert 'admission_rejections_total{class="read",reason="queue_full"} 1' in client.get("/metrics").text
+
+def test_route_limits(client: TestClient, monkeypatch):
+    monkeypatch.setitem(admission.route_lanes, "POST /api/pizzas/", Lane(limit=0, max_queue=0))
+    monkeypatch.setitem(admission.route_lanes, "PUT /api/pizzas/bulk", Lane(limit=0, max_queue=0))
+    assert client.post("/api/pizzas/", json={"name": "Classic", "topping_ids": []}).status_code == 503
+    assert client.put("/api/pizzas/bulk", json={"items": []}).status_code == 503
+    # Other routes, including the item route /bulk also fits, are unaffected
+    assert client.post("/api/toppings/", json={"name": "Ham"}).status_code == 200
+    assert client.put("/api/pizzas/1", json={"name": "Classic", "topping_ids": []}).status_code == 404
+
+def test_writes_are_rate_limited_per_client(client: TestClient, monkeypatch):
+    monkeypatch.setattr(admission, "rate_limiter", RateLimiter(rate=0.5, burst=2))
+    assert client.post("/api/toppings/", json={"name": "Ham"}).status_code == 200
+    assert client.post("/api/toppings/", json={"name": "Olives"}).status_code == 200
+
+    response = client.post("/api/toppings/", json={"name": "Basil"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    # Reads are not limited
+    assert client.get("/api/toppings/").status_code == 200
+    assert client.get("/health/admission").json()["rate_limited"] == 1
@@ -0,0 +1,100 @@
+from fastapi.testclient import TestClient
+
+def test_async_topping_crud(async_client: TestClient):
+    response = async_client.post("/api/toppings/", json={"name": "Olives"})
+    assert response.status_code == 200
+    topping = response.json()
+    assert topping["name"] == "Olives"
+    assert topping["pizzas"] == []
+    
+    response = async_client.post("/api/toppings/", json={"name": "olives"})
+    assert response.status_code == 400
+    
+    response = async_client.put(f"/api/toppings/{topping['id']}", json={"name": "Black Olives"})
+    assert response.status_code == 200
+    assert response.json()["name"] == "Black Olives"
+    
+    response = async_client.get(f"/api/toppings/{topping['id']}")
+    assert response.json()["name"] == "Black Olives"
+    
+    response = async_client.delete(f"/api/toppings/{topping['id']}")
+    assert response.status_code == 200
+    assert async_client.get(f"/api/toppings/{topping['id']}").status_code == 404
+
+def test_async_pizza_crud(async_client: TestClient):
+    topping1 = async_client.post("/api/toppings/", json={"name": "Pepperoni"}).json()
+    topping2 = async_client.post("/api/toppings/", json={"name": "Mushrooms"}).json()
+    
+    response = async_client.post(
+        "/api/pizzas/",
+        json={"name": "Supreme", "topping_ids": [topping1["id"], topping2["id"]]}
+    )
+    assert response.status_code == 200
+    pizza = response.json()
+    assert len(pizza["toppings"]) == 2
+    
+    # Same toppings in a different order
+    response = async_client.post(
+        "/api/pizzas/",
+        json={"name": "Other", "topping_ids": [topping2["id"], topping1["id"]]}
+    )
+    assert response.status_code == 400
+    assert "combination of toppings already exists" in response.json()["detail"]
+    
+    response = async_client.put(
+        f"/api/pizzas/{pizza['id']}",
+        json={"name": "Pepperoni Pizza", "topping_ids": [topping1["id"]]}
+    )
+    assert response.status_code == 200
+    assert [t["name"] for t in response.json()["toppings"]] == ["Pepperoni"]
+    
+    response = async_client.get("/api/pizzas/", params={"topping_id": topping1["id"]})
+    assert [p["name"] for p in response.json()] == ["Pepperoni Pizza"]
+    
+    # The topping now reports the pizza that uses it
+    response = async_client.delete(f"/api/toppings/{topping1['id']}")
+    assert response.status_code == 400
+    assert response.json()["detail"]["pizzas"] == ["Pepperoni Pizza"]
+    
+    response = async_client.delete(f"/api/pizzas/{pizza['id']}")
+    assert response.status_code == 200
+    assert async_client.delete(f"/api/toppings/{topping1['id']}").status_code == 200
+
+def test_async_get_toppings_pagination(async_client: TestClient):
+    for name in ["Basil", "Bacon", "Olives"]:
+        async_client.post("/api/toppings/", json={"name": name})
+    
+    response = async_client.get("/api/toppings/", params={"limit": 2})
+    assert [topping["name"] for topping in response.json()] == ["Basil", "Bacon"]
+    
+    cursor = response.headers["X-Next-Cursor"]
+    response = async_client.get("/api/toppings/", params={"limit": 2, "after_id": cursor})
+    assert [topping["name"] for topping in response.json()] == ["Olives"]
+    assert "X-Next-Cursor" not in response.headers
+
+def test_async_if_match(async_client: TestClient):
+    topping = async_client.post("/api/toppings/", json={"name": "Pepperoni"})
+    topping_etag = topping.headers["ETag"]
+    pizza = async_client.post("/api/pizzas/", json={"name": "Supreme", "topping_ids": [topping.json()["id"]]})
+    pizza_id, etag = pizza.json()["id"], pizza.headers["ETag"]
+    assert async_client.get(f"/api/pizzas/{pizza_id}").headers["ETag"] == etag
+    
+    response = async_client.put(
+        f"/api/pizzas/{pizza_id}",
+        json={"name": "Pepperoni Pizza", "topping_ids": [topping.json()["id"]]},
+        headers={"If-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert async_client.delete(f"/api/pizzas/{pizza_id}", headers={"If-Match": etag}).status_code == 412
+    assert async_client.delete(
+        f"/api/pizzas/{pizza_id}", headers={"If-Match": response.headers["ETag"]}
+    ).status_code == 200
+    
+    response = async_client.put(
+        f"/api/toppings/{topping.json()['id']}", json={"name": "Salami"}, headers={"If-Match": topping_etag}
+    )
+    assert response.status_code == 200
+    assert async_client.delete(
+        f"/api/toppings/{topping.json()['id']}", headers={"If-Match": topping_etag}
+    ).status_code == 412
@@ -0,0 +1,127 @@
+from fastapi.testclient import TestClient
+
+def test_bulk_create_toppings(client: TestClient, query_counter):
+    names = [f"Topping {i}" for i in range(50)]
+    query_counter.reset()
+    response = client.post("/api/toppings/bulk", json={"items": [{"name": n} for n in names]})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["created"] * 50
+    
+    # One name check and one insert, however large the batch
+    assert query_counter.count == 2
+    toppings = client.get("/api/toppings/").json()
+    assert [t["name"] for t in toppings] == names
+
+def test_bulk_create_toppings_atomic_rejects_whole_batch(client: TestClient):
+    client.post("/api/toppings/", json={"name": "Pepperoni"})
+    response = client.post(
+        "/api/toppings/bulk",
+        json={"items": [{"name": "Olives"}, {"name": "pepperoni"}, {"name": "olives"}]}
+    )
+    assert response.status_code == 400
+    results = response.json()["detail"]["results"]
+    assert [r["status"] for r in results] == ["skipped", "error", "error"]
+    assert results[1]["detail"] == "Topping already exists"
+    assert len(client.get("/api/toppings/").json()) == 1
+
+def test_bulk_create_toppings_best_effort(client: TestClient):
+    client.post("/api/toppings/", json={"name": "Pepperoni"})
+    response = client.post(
+        "/api/toppings/bulk",
+        json={"items": [{"name": "Olives"}, {"name": "Pepperoni"}], "mode": "best_effort"}
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["created", "error"]
+    assert len(client.get("/api/toppings/").json()) == 2
+
+def test_bulk_create_pizzas(client: TestClient):
+    toppings = client.post(
+        "/api/toppings/bulk",
+        json={"items": [{"name": "Pepperoni"}, {"name": "Mushrooms"}]}
+    ).json()["results"]
+    pepperoni, mushrooms = (t["id"] for t in toppings)
+    
+    response = client.post(
+        "/api/pizzas/bulk",
+        json={
+            "mode": "best_effort",
+            "items": [
+                {"name": "Supreme", "topping_ids": [pepperoni, mushrooms]},
+                {"name": "Other Supreme", "topping_ids": [mushrooms, pepperoni]},
+                {"name": "Mystery", "topping_ids": [999]},
+                {"name": "Pepperoni Pizza", "topping_ids": [pepperoni]},
+            ]
+        }
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["created", "error", "error", "created"]
+    assert results[2]["detail"] == "Some toppings not found"
+    
+    pizza = client.get(f"/api/pizzas/{results[0]['id']}").json()
+    assert sorted(t["name"] for t in pizza["toppings"]) == ["Mushrooms", "Pepperoni"]
+    
+    # The stored signatures still reject duplicates through the single-item route
+    response = client.post(
+        "/api/pizzas/",
+        json={"name": "Copy", "topping_ids": [pepperoni]}
+    )
+    assert response.status_code == 400
+
+def test_bulk_update_and_delete_pizzas(client: TestClient):
+    pepperoni = client.post("/api/toppings/", json={"name": "Pepperoni"}).json()["id"]
+    mushrooms = client.post("/api/toppings/", json={"name": "Mushrooms"}).json()["id"]
+    first = client.post("/api/pizzas/", json={"name": "First", "topping_ids": [pepperoni]}).json()["id"]
+    second = client.post("/api/pizzas/", json={"name": "Second", "topping_ids": [mushrooms]}).json()["id"]
+    
+    response = client.put(
+        "/api/pizzas/bulk",
+        json={"items": [
+            {"id": first, "name": "First Renamed", "topping_ids": [pepperoni, mushrooms]},
+            {"id": second, "name": "Second", "topping_ids": [mushrooms]},
+        ]}
+    )
+    assert response.status_code == 200
+    assert [r["status"] for r in response.json()["results"]] == ["updated", "updated"]
+    pizza = client.get(f"/api/pizzas/{first}").json()
+    assert pizza["name"] == "First Renamed"
+    assert len(pizza["toppings"]) == 2
+    
+    # Toppings still in use cannot be bulk deleted
+    response = client.post("/api/toppings/bulk/delete", json={"ids": [pepperoni]})
+    assert response.status_code == 400
+    
+    response = client.post("/api/pizzas/bulk/delete", json={"ids": [first, second, 999], "mode": "best_effort"})
+    assert [r["status"] for r in response.json()["results"]] == ["deleted", "deleted", "error"]
+    assert client.get("/api/pizzas/").json() == []
+    
+    response = client.post("/api/toppings/bulk/delete", json={"ids": [pepperoni, mushrooms]})
+    assert [r["status"] for r in response.json()["results"]] == ["deleted", "deleted"]
+    assert client.get("/api/toppings/").json() == []
+
+def test_bulk_update_toppings(client: TestClient):
+    olives = client.post("/api/toppings/", json={"name": "Olives"}).json()["id"]
+    basil = client.post("/api/toppings/", json={"name": "Basil"}).json()["id"]
+    pizza = client.post("/api/pizzas/", json={"name": "Margherita", "topping_ids": [basil]}).json()["id"]
+    client.get(f"/api/pizzas/{pizza}")
+    
+    response = client.put(
+        "/api/toppings/bulk",
+        json={"items": [{"id": olives, "name": "Black Olives"}, {"id": basil, "name": "Fresh Basil"}]}
+    )
+    assert [r["status"] for r in response.json()["results"]] == ["updated", "updated"]
+    
+    # The cached pizza picks up the renamed topping
+    assert client.get(f"/api/pizzas/{pizza}").json()["toppings"][0]["name"] == "Fresh Basil"
+
+def test_bulk_update_bumps_versions(client: TestClient):
+    response = client.post("/api/toppings/", json={"name": "Pepperoni"})
+    topping_id, etag = response.json()["id"], response.headers["ETag"]
+    response = client.put("/api/toppings/bulk", json={"items": [{"id": topping_id, "name": "Salami"}]})
+    assert response.status_code == 200
+    
+    # Edits based on the version before the batch are refused
+    response = client.put(f"/api/toppings/{topping_id}", json={"name": "Ham"}, headers={"If-Match": etag})
+    assert response.status_code == 412
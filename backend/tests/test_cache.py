@@ -0,0 +1,86 @@
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app.core.cache import CacheBackend, CachedResponse, InMemoryCacheBackend, catalog_cache, set_cache_backend
+
+def test_in_memory_backend_evicts_least_recently_used():
+    backend = InMemoryCacheBackend(max_entries=2)
+    backend.set("a", CachedResponse(b"1"), ttl=60)
+    backend.set("b", CachedResponse(b"2"), ttl=60)
+    backend.get("a")
+    backend.set("c", CachedResponse(b"3"), ttl=60)
+    
+    assert backend.get("b") is None
+    assert backend.get("a").body == b"1"
+    assert backend.get("c").body == b"3"
+
+def test_in_memory_backend_expires_entries():
+    backend = InMemoryCacheBackend()
+    backend.set("a", CachedResponse(b"1"), ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get("a") is None
+    assert len(backend) == 0
+
+def test_incomplete_backend_cannot_be_created():
+    class GetOnly(CacheBackend):
+        def get(self, key):
+            return None
+    
+    with pytest.raises(TypeError):
+        GetOnly()
+
+def test_list_is_served_from_cache(client: TestClient, query_counter):
+    client.post("/api/toppings/", json={"name": "Pepperoni"})
+    first = client.get("/api/toppings/")
+    
+    query_counter.reset()
+    second = client.get("/api/toppings/")
+    assert query_counter.count == 0
+    assert second.content == first.content
+    assert catalog_cache.stats()["hits"] == 1
+
+def test_writes_invalidate_related_entries(client: TestClient):
+    topping = client.post("/api/toppings/", json={"name": "Pepperoni"}).json()
+    pizza = client.post(
+        "/api/pizzas/",
+        json={"name": "Pepperoni Pizza", "topping_ids": [topping["id"]]}
+    ).json()
+    
+    # Warm the cache for both sides of the relationship
+    assert client.get(f"/api/toppings/{topping['id']}").json()["pizzas"][0]["name"] == "Pepperoni Pizza"
+    assert client.get(f"/api/pizzas/{pizza['id']}").json()["toppings"][0]["name"] == "Pepperoni"
+    assert len(client.get("/api/pizzas/").json()) == 1
+    
+    client.put(f"/api/toppings/{topping['id']}", json={"name": "Spicy Pepperoni"})
+    assert client.get(f"/api/pizzas/{pizza['id']}").json()["toppings"][0]["name"] == "Spicy Pepperoni"
+    assert client.get("/api/pizzas/").json()[0]["toppings"][0]["name"] == "Spicy Pepperoni"
+    
+    client.put(
+        f"/api/pizzas/{pizza['id']}",
+        json={"name": "Hot Pizza", "topping_ids": [topping["id"]]}
+    )
+    assert client.get(f"/api/toppings/{topping['id']}").json()["pizzas"][0]["name"] == "Hot Pizza"
+    
+    client.delete(f"/api/pizzas/{pizza['id']}")
+    assert client.get("/api/pizzas/").json() == []
+    assert client.get(f"/api/pizzas/{pizza['id']}").status_code == 404
+    assert client.get(f"/api/toppings/{topping['id']}").json()["pizzas"] == []
+
+def test_cache_backend_is_pluggable(client: TestClient):
+    original = catalog_cache.backend
+    shared = InMemoryCacheBackend()
+    set_cache_backend(shared)
+    try:
+        client.post("/api/toppings/", json={"name": "Olives"})
+        client.get("/api/toppings/")
+        assert len(shared) == 1
+    finally:
+        set_cache_backend(original)
+
+def test_cache_health_endpoint(client: TestClient):
+    client.get("/api/toppings/")
+    client.get("/api/toppings/")
+    stats = client.get("/health/cache").json()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
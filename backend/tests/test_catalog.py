@@ -0,0 +1,123 @@
+import orjson
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from app.api.routes import catalog, pizzas, toppings
+from app.core import events
+from app.core.events import CATALOG_RELOADED
+from app.core.feed import change_feed
+from app.models.models import Pizza, Topping, pizza_toppings
+
+def _seed(client: TestClient):
+    toppings = [client.post("/api/toppings/", json={"name": name}).json() for name in ("Cheese", "Ham", "Olives")]
+    client.post("/api/pizzas/", json={"name": "Ham & Cheese", "topping_ids": [toppings[1]["id"], toppings[0]["id"]]})
+    client.post("/api/pizzas/", json={"name": "Plain", "topping_ids": []})
+    return toppings
+
+def _wipe(db_session):
+    db_session.execute(delete(pizza_toppings))
+    db_session.execute(delete(Pizza))
+    db_session.execute(delete(Topping))
+    db_session.commit()
+
+def test_export_catalog(client: TestClient):
+    toppings = _seed(client)
+    response = client.get("/api/catalog/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    
+    records = [orjson.loads(line) for line in response.text.splitlines()]
+    assert [r["type"] for r in records] == ["topping"] * 3 + ["pizza"] * 2
+    assert records[3]["name"] == "Ham & Cheese"
+    assert records[3]["topping_ids"] == sorted([toppings[0]["id"], toppings[1]["id"]])
+    assert records[4]["topping_ids"] == []
+
+def test_export_import_round_trip(client: TestClient, db_session, monkeypatch):
+    _seed(client)
+    before = client.get("/api/pizzas/").json()
+    exported = client.get("/api/catalog/export").content
+    _wipe(db_session)
+    
+    monkeypatch.setattr(catalog, "IMPORT_BATCH_SIZE", 2)
+    response = client.post("/api/catalog/import", content=exported)
+    assert response.status_code == 200
+    assert response.json() == {"toppings": 3, "pizzas": 2, "offset": 5}
+    assert client.get("/api/pizzas/").json() == before
+    
+    # Imported IDs do not get in the way of new rows
+    assert client.post("/api/toppings/", json={"name": "Basil"}).status_code == 200
+
+def test_import_resumes_from_offset(client: TestClient, db_session, monkeypatch):
+    _seed(client)
+    lines = client.get("/api/catalog/export").content.splitlines()
+    _wipe(db_session)
+    
+    monkeypatch.setattr(catalog, "IMPORT_BATCH_SIZE", 2)
+    broken = lines[:3] + [b'{"type": "pizza", "name": "No ID"}'] + lines[3:]
+    response = client.post("/api/catalog/import", content=b"\n".join(broken))
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert detail["line"] == 4
+    assert detail["offset"] == 3
+    assert detail["toppings"] == 3
+    
+    # Resume with the corrected file from where the first attempt stopped
+    response = client.post(f"/api/catalog/import?offset={detail['offset']}", content=b"\n".join(lines))
+    assert response.status_code == 200
+    assert response.json() == {"toppings": 0, "pizzas": 2, "offset": 5}
+    assert len(client.get("/api/pizzas/").json()) == 2
+
+def test_import_rejects_conflicts_and_unknown_toppings(client: TestClient):
+    _seed(client)
+    exported = client.get("/api/catalog/export").content
+    response = client.post("/api/catalog/import", content=exported)
+    assert response.status_code == 409
+    assert response.json()["detail"]["offset"] == 0
+    # The database's own message is logged, not sent
+    assert "UNIQUE" not in response.json()["detail"]["message"]
+    
+    response = client.post(
+        "/api/catalog/import",
+        content=b'{"type": "pizza", "id": 99, "name": "Ghost", "topping_ids": [404]}\n',
+    )
+    assert response.status_code == 400
+    assert "unknown toppings" in response.json()["detail"]["message"]
+
+def test_import_streams_progress(client: TestClient, db_session, monkeypatch):
+    _seed(client)
+    lines = client.get("/api/catalog/export").content.splitlines()
+    _wipe(db_session)
+    
+    monkeypatch.setattr(catalog, "IMPORT_BATCH_SIZE", 2)
+    headers = {"Accept": "application/x-ndjson"}
+    response = client.post("/api/catalog/import", content=b"\n".join(lines), headers=headers)
+    assert response.status_code == 200
+    messages = [orjson.loads(line) for line in response.text.splitlines()]
+    assert [(m["type"], m["offset"]) for m in messages] == [("progress", 2), ("progress", 4), ("progress", 5), ("done", 5)]
+    assert messages[-1] == {"type": "done", "toppings": 3, "pizzas": 2, "offset": 5}
+    
+    # Failures come last, with the offset to resume from
+    response = client.post("/api/catalog/import", content=b"\n".join(lines), headers=headers)
+    error = orjson.loads(response.text.splitlines()[-1])
+    assert (error["type"], error["status"], error["offset"]) == ("error", 409, 0)
+
+def test_primary_key_conflicts_are_409():
+    # What PostgreSQL reports when a sequence lags behind imported IDs
+    for module, table in ((pizzas, "pizzas"), (toppings, "toppings")):
+        error = IntegrityError("INSERT", {}, Exception(f'duplicate key value violates unique constraint "{table}_pkey"'))
+        args = (error,) if module is pizzas else (error, "taken")
+        assert module.integrity_error_to_http(*args).status_code == 409
+
+def test_import_publishes_one_change_per_batch(client: TestClient, monkeypatch):
+    records = [orjson.dumps({"type": "topping", "id": i, "name": f"Topping {i}"}) for i in range(1, 6)]
+    assert client.get("/api/toppings/").json() == []
+    cursor = change_feed.cursor()
+    published = []
+    monkeypatch.setattr(events, "_listeners", [published.append, *events._listeners])
+    
+    monkeypatch.setattr(catalog, "IMPORT_BATCH_SIZE", 2)
+    assert client.post("/api/catalog/import", content=b"\n".join(records)).status_code == 200
+    assert published == [CATALOG_RELOADED] * 3
+    # Cached lists are dropped, and feed subscribers told to refetch theirs
+    assert len(client.get("/api/toppings/").json()) == 5
+    assert change_feed.since(cursor)[0] is None
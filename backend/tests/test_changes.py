@@ -0,0 +1,178 @@
+import asyncio
+import time
+import orjson
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from app.api.routes.changes import sse_messages
+from app.core.bus import ChangeBus, change_bus
+from app.core.events import CREATED, PIZZA, TOPPING, UPDATED, CatalogChange
+from app.core.feed import CHANGE, HEARTBEAT, READY, RESET, ChangeFeed, change_feed
+from app.models.models import Topping
+
+def test_websocket_streams_writes_and_resumes(client: TestClient):
+    with client.websocket_connect("/api/changes/ws") as ws:
+        ready = ws.receive_json()
+        assert ready["type"] == "ready"
+    
+        topping = client.post("/api/toppings/", json={"name": "Pepperoni"}).json()
+        message = ws.receive_json()
+        assert message["type"] == "change"
+        assert message["change"] == {
+            "seq": message["change"]["seq"],
+            "entity": "topping",
+            "action": "created",
+            "id": topping["id"],
+            "name": "Pepperoni",
+            "related_ids": [],
+        }
+        cursor = message["cursor"]
+    
+    # Writes made while disconnected are replayed, in order, from the last cursor
+    pizza = client.post("/api/pizzas/", json={"name": "Classic", "topping_ids": [topping["id"]]}).json()
+    client.put(f"/api/toppings/{topping['id']}", json={"name": "Spicy Pepperoni"})
+    with client.websocket_connect(f"/api/changes/ws?after={cursor}") as ws:
+        created, updated = ws.receive_json(), ws.receive_json()
+        assert (created["change"]["entity"], created["change"]["action"]) == ("pizza", "created")
+        assert (updated["change"]["action"], updated["change"]["related_ids"]) == ("updated", [pizza["id"]])
+        assert updated["change"]["seq"] == created["change"]["seq"] + 1 == message["change"]["seq"] + 2
+
+def test_websocket_resets_unknown_cursor(client: TestClient):
+    # E.g. one issued by another worker, or before a restart
+    with client.websocket_connect("/api/changes/ws?after=0123abcd-7") as ws:
+        reset = ws.receive_json()
+        assert reset == {"type": "reset", "cursor": change_feed.cursor()}
+
+def test_feed_resets_subscribers_behind_the_buffer():
+    feed = ChangeFeed(size=2)
+    cursor = feed.cursor()
+    for topping_id in range(3):
+        feed.append(CatalogChange(PIZZA, CREATED, topping_id))
+    assert feed.since(cursor) == (None, 3)
+    
+    events, latest = feed.since(feed.cursor(1))
+    assert [event.seq for event in events] == [2, 3] and latest == 3
+    
+    async def first(cursor):
+        messages = feed.follow(cursor)
+        try:
+            return await messages.__anext__()
+        finally:
+            await messages.aclose()
+    
+    assert asyncio.run(first(cursor)) == (RESET, None, feed.cursor())
+    assert asyncio.run(first(None)) == (READY, None, feed.cursor())
+
+def test_feed_fans_out_to_idle_subscribers():
+    feed = ChangeFeed()
+    
+    async def run():
+        subscribers = [feed.follow(feed.cursor(), heartbeat=60) for _ in range(2000)]
+        waits = [asyncio.ensure_future(messages.__anext__()) for messages in subscribers]
+        await asyncio.sleep(0)
+        assert feed.subscribers == 2000 and not any(wait.done() for wait in waits)
+    
+        event = feed.append(CatalogChange(PIZZA, CREATED, 1, "Classic"))
+        received = await asyncio.wait_for(asyncio.gather(*waits), timeout=5)
+        # Rendered once, shared by every subscriber
+        assert all(message == (CHANGE, event, event.cursor) for message in received)
+        assert all(message[1].data is event.data for message in received)
+    
+        for messages in subscribers:
+            await messages.aclose()
+        assert feed.subscribers == 0
+    
+    asyncio.run(run())
+
+def test_feed_heartbeats_when_idle():
+    feed = ChangeFeed()
+    
+    async def run():
+        messages = feed.follow(feed.cursor(), heartbeat=0.01)
+        try:
+            return await messages.__anext__()
+        finally:
+            await messages.aclose()
+    
+    assert asyncio.run(run()) == (HEARTBEAT, None, feed.cursor())
+
+def test_server_sent_events_format():
+    cursor = change_feed.cursor()
+    
+    async def run():
+        stream = sse_messages(None)
+        try:
+            frames = [await stream.__anext__(), await stream.__anext__()]
+            change_feed.append(CatalogChange(PIZZA, CREATED, 1, "Classic", frozenset({2})))
+            frames.append(await stream.__anext__())
+            return frames
+        finally:
+            await stream.aclose()
+    
+    retry, ready, change = asyncio.run(run())
+    assert retry == b"retry: 3000\n\n"
+    assert ready == f'id: {cursor}\nevent: ready\ndata: {{"cursor":"{cursor}"}}\n\n'.encode()
+    
+    # The ID is what EventSource sends back as Last-Event-ID when it reconnects
+    lines = change.decode().split("\n")
+    assert lines[0] == f"id: {change_feed.cursor()}"
+    assert lines[1] == "event: change"
+    assert orjson.loads(lines[2][len("data: "):])["related_ids"] == [2]
+    assert change.endswith(b"\n\n")
+
+def test_bus_relays_changes_between_workers(db_session):
+    engine = db_session.get_bind()
+    received = []
+    worker_a, worker_b = ChangeBus(deliver=received.append), ChangeBus(deliver=received.append)
+    worker_a.open(engine)
+    worker_b.open(engine)
+    
+    change = CatalogChange(PIZZA, UPDATED, 1, "Classic", frozenset({2, 3}))
+    worker_a.write([change])
+    # A worker skips the rows it appended itself
+    assert worker_a.poll() == 1 and received == []
+    assert worker_b.poll() == 1 and received == [change]
+    assert worker_b.poll() == 0
+
+def test_relayed_changes_reach_cache_and_feed(client: TestClient, db_session):
+    engine = db_session.get_bind()
+    topping = client.post("/api/toppings/", json={"name": "Pepperoni"}).json()
+    client.get("/api/toppings/")
+    other_worker = ChangeBus()
+    other_worker.open(engine)
+    change_bus.open(engine)
+    try:
+        # Another worker renames the topping
+        db_session.execute(update(Topping).values(name="Salami", version_id=Topping.version_id + 1))
+        db_session.commit()
+        other_worker.write([CatalogChange(TOPPING, UPDATED, topping["id"], "Salami")])
+        cursor = change_feed.cursor()
+        
+        assert change_bus.poll() == 1
+        assert client.get("/api/toppings/").json()[0]["name"] == "Salami"
+        events, _ = change_feed.since(cursor)
+        assert [orjson.loads(event.data)["name"] for event in events] == ["Salami"]
+        # Relayed changes are not appended to the log again; this worker's own writes are
+        assert change_bus.stats()["pending"] == 0
+        client.post("/api/toppings/", json={"name": "Ham"})
+        assert change_bus.stats()["pending"] == 1
+    finally:
+        change_bus.stop()
+
+def test_bus_threads(db_session):
+    engine = db_session.get_bind()
+    received = []
+    worker_a, worker_b = ChangeBus(poll_seconds=0.01), ChangeBus(poll_seconds=0.01, deliver=received.append)
+    worker_a.start(engine)
+    worker_b.start(engine)
+    try:
+        change = CatalogChange(TOPPING, CREATED, 1, "Ham")
+        worker_a.append(change)
+        deadline = time.monotonic() + 5
+        while not received and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert received == [change]
+        assert worker_a.stats()["appended"] == 1 and worker_b.stats()["received"] == 1
+    finally:
+        worker_a.stop()
+        worker_b.stop()
+    assert not worker_a.stats()["running"]
@@ -0,0 +1,86 @@
+import gzip
+import pytest
+from fastapi.testclient import TestClient
+from app.core import cache, compression
+from app.core.compression import BROTLI, GZIP, available_encodings, compressible, negotiate
+
+def seed(client: TestClient, count: int = 60):
+    client.post("/api/toppings/bulk", json={"items": [{"name": f"Topping number {i}"} for i in range(count)]})
+
+def test_negotiate():
+    preferred = available_encodings()[0]
+    assert negotiate("gzip, deflate, br") == preferred
+    assert negotiate("*") == preferred
+    assert negotiate("gzip;q=1.0, br;q=0.5") == GZIP
+    assert negotiate("gzip;q=0") is None
+    assert negotiate("identity") is None
+    assert negotiate("") is None
+    assert not compressible("text/event-stream")
+    assert compressible("application/json") and not compressible("image/png")
+
+def test_cached_list_is_compressed_once(client: TestClient, monkeypatch):
+    seed(client)
+    calls = []
+    real_compress = cache.compress
+    monkeypatch.setattr(cache, "compress", lambda body, encoding: calls.append(encoding) or real_compress(body, encoding))
+    
+    plain = client.get("/api/toppings/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    for _ in range(3):
+        response = client.get("/api/toppings/", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.content == plain.content
+    # The cache entry keeps its compressed copy
+    assert calls == [GZIP]
+    assert int(response.headers["content-length"]) < len(plain.content) / 3
+
+def test_each_coding_has_its_own_tag(client: TestClient):
+    seed(client)
+    plain = client.get("/api/toppings/", headers={"Accept-Encoding": "identity"})
+    zipped = client.get("/api/toppings/", headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+    
+    # Either tag revalidates, answered with the tag of the coding asked for
+    for etag in (plain.headers["etag"], zipped.headers["etag"]):
+        response = client.get("/api/toppings/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["etag"] == zipped.headers["etag"]
+
+def test_small_and_uncached_responses(client: TestClient):
+    response = client.post("/api/toppings/", json={"name": "Ham"}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    
+    # Responses the cache does not hold go through the middleware
+    response = client.post(
+        "/api/toppings/bulk",
+        json={"items": [{"name": f"Bulk topping {i}"} for i in range(100)]},
+        headers={"Accept-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()["results"]) == 100
+
+def test_streamed_export_is_compressed(client: TestClient):
+    seed(client, 200)
+    plain = client.get("/api/catalog/export", headers={"Accept-Encoding": "identity"})
+    with client.stream("GET", "/api/catalog/export", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    assert gzip.decompress(raw) == plain.content
+
+def test_disabled(client: TestClient, monkeypatch):
+    seed(client)
+    monkeypatch.setattr(compression, "COMPRESSION_ENABLED", False)
+    response = client.get("/api/toppings/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+@pytest.mark.skipif(compression.brotli is None, reason="brotli is not installed")
+def test_brotli(client: TestClient):
+    seed(client)
+    plain = client.get("/api/toppings/", headers={"Accept-Encoding": "identity"})
+    with client.stream("GET", "/api/toppings/", headers={"Accept-Encoding": "gzip, br"}) as response:
+        assert response.headers["content-encoding"] == BROTLI
+        raw = b"".join(response.iter_raw())
+    assert compression.brotli.decompress(raw) == plain.content
@@ -0,0 +1,145 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from app.core.cache import catalog_cache
+from app.core.revisions import etag_matches, if_match_satisfied, version_etag
+from app.models.models import Topping
+
+def test_etag_matches():
+    assert etag_matches('W/"abc-1"', 'W/"abc-1"')
+    assert etag_matches('"abc-1"', 'W/"abc-1"')
+    assert etag_matches('W/"abc-0", W/"abc-1"', 'W/"abc-1"')
+    assert etag_matches("*", 'W/"abc-1"')
+    assert not etag_matches('W/"abc-2"', 'W/"abc-1"')
+
+def test_if_match_satisfied():
+    etag = version_etag(3, [(2, 1), (1, 4)])
+    assert etag == version_etag(3, [(1, 4), (2, 1)])
+    assert if_match_satisfied(etag, 3)
+    assert if_match_satisfied(f'"2-abc", {etag}', 3)
+    # Only the row's own version counts
+    assert if_match_satisfied(version_etag(3, [(1, 5)]), 3)
+    assert not if_match_satisfied(etag, 4)
+    assert not if_match_satisfied(f"W/{etag}", 3)
+    assert if_match_satisfied("*", 4)
+
+def test_list_not_modified_without_database(client: TestClient, query_counter):
+    client.post("/api/toppings/", json={"name": "Pepperoni"})
+    response = client.get("/api/toppings/")
+    etag = response.headers["ETag"]
+    
+    query_counter.reset()
+    response = client.get("/api/toppings/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert query_counter.count == 0
+    
+    # A write moves the collection to a new revision
+    client.post("/api/toppings/", json={"name": "Mushrooms"})
+    response = client.get("/api/toppings/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json()) == 2
+
+def test_tags_come_from_the_data(client: TestClient, db_session):
+    topping = client.post("/api/toppings/", json={"name": "Pepperoni"}).json()
+    list_etag = client.get("/api/toppings/").headers["ETag"]
+    item_etag = client.get(f"/api/toppings/{topping['id']}").headers["ETag"]
+    
+    # Another worker, or a fresh one, tags the same data the same way
+    catalog_cache.clear()
+    assert client.get("/api/toppings/", headers={"If-None-Match": list_etag}).status_code == 304
+    assert client.get(f"/api/toppings/{topping['id']}", headers={"If-None-Match": item_etag}).status_code == 304
+    
+    # A write this worker never heard of, e.g. made by another one, shows once the entries are gone
+    db_session.execute(update(Topping).values(name="Salami", version_id=Topping.version_id + 1))
+    db_session.commit()
+    catalog_cache.clear()
+    response = client.get("/api/toppings/", headers={"If-None-Match": list_etag})
+    assert response.status_code == 200 and response.json()[0]["name"] == "Salami"
+    assert client.get(f"/api/toppings/{topping['id']}", headers={"If-None-Match": item_etag}).status_code == 200
+
+def test_item_tags_follow_related_writes(client: TestClient):
+    pepperoni = client.post("/api/toppings/", json={"name": "Pepperoni"}).json()
+    mushrooms = client.post("/api/toppings/", json={"name": "Mushrooms"}).json()
+    pizza = client.post(
+        "/api/pizzas/",
+        json={"name": "Pepperoni Pizza", "topping_ids": [pepperoni["id"]]}
+    ).json()
+    pizza_etag = client.get(f"/api/pizzas/{pizza['id']}").headers["ETag"]
+    mushrooms_etag = client.get(f"/api/toppings/{mushrooms['id']}").headers["ETag"]
+    
+    # Renaming an unrelated topping leaves the pizza current
+    client.put(f"/api/toppings/{mushrooms['id']}", json={"name": "Button Mushrooms"})
+    response = client.get(f"/api/pizzas/{pizza['id']}", headers={"If-None-Match": pizza_etag})
+    assert response.status_code == 304
+    response = client.get(f"/api/toppings/{mushrooms['id']}", headers={"If-None-Match": mushrooms_etag})
+    assert response.status_code == 200
+    
+    # Renaming one of its toppings changes the pizza's representation
+    client.put(f"/api/toppings/{pepperoni['id']}", json={"name": "Spicy Pepperoni"})
+    response = client.get(f"/api/pizzas/{pizza['id']}", headers={"If-None-Match": pizza_etag})
+    assert response.status_code == 200
+    assert response.json()["toppings"][0]["name"] == "Spicy Pepperoni"
+
+def test_if_match_guards_writes(client: TestClient):
+    topping = client.post("/api/toppings/", json={"name": "Pepperoni"}).json()
+    response = client.post("/api/pizzas/", json={"name": "Pepperoni Pizza", "topping_ids": [topping["id"]]})
+    pizza = response.json()
+    etag = client.get(f"/api/pizzas/{pizza['id']}").headers["ETag"]
+    assert etag == response.headers["ETag"]
+    
+    response = client.put(
+        f"/api/pizzas/{pizza['id']}",
+        json={"name": "Spicy Pizza", "topping_ids": [topping["id"]]},
+        headers={"If-Match": etag},
+    )
+    assert response.status_code == 200
+    new_etag = response.headers["ETag"]
+    assert new_etag != etag
+    assert client.get(f"/api/pizzas/{pizza['id']}").headers["ETag"] == new_etag
+    
+    # An edit based on the old version is refused, and so is a delete
+    response = client.put(
+        f"/api/pizzas/{pizza['id']}",
+        json={"name": "Mild Pizza", "topping_ids": [topping["id"]]},
+        headers={"If-Match": etag},
+    )
+    assert response.status_code == 412
+    assert client.delete(f"/api/pizzas/{pizza['id']}", headers={"If-Match": etag}).status_code == 412
+    assert client.get(f"/api/pizzas/{pizza['id']}").json()["name"] == "Spicy Pizza"
+    
+    # Renaming a topping changes the pizza's tag but does not block edits to the pizza
+    client.put(f"/api/toppings/{topping['id']}", json={"name": "Salami"})
+    assert client.get(f"/api/pizzas/{pizza['id']}").headers["ETag"] != new_etag
+    assert client.delete(f"/api/pizzas/{pizza['id']}", headers={"If-Match": new_etag}).status_code == 200
+
+def test_topping_if_match(client: TestClient):
+    response = client.post("/api/toppings/", json={"name": "Pepperoni"})
+    topping_id, etag = response.json()["id"], response.headers["ETag"]
+    response = client.put(f"/api/toppings/{topping_id}", json={"name": "Salami"}, headers={"If-Match": etag})
+    assert response.status_code == 200
+    
+    assert client.put(
+        f"/api/toppings/{topping_id}", json={"name": "Ham"}, headers={"If-Match": etag}
+    ).status_code == 412
+    assert client.delete(f"/api/toppings/{topping_id}", headers={"If-Match": etag}).status_code == 412
+    # Weak tags never satisfy If-Match; "*" matches any version
+    assert client.delete(
+        f"/api/toppings/{topping_id}", headers={"If-Match": f"W/{response.headers['ETag']}"}
+    ).status_code == 412
+    assert client.delete(f"/api/toppings/{topping_id}", headers={"If-Match": "*"}).status_code == 200
+
+def test_concurrent_edit_conflicts(client: TestClient, db_session):
+    topping = client.post("/api/toppings/", json={"name": "Pepperoni"}).json()
+    
+    # The route's session already holds the topping at version 1 when another
+    # writer moves the row on, as if that write landed between read and commit
+    stale = db_session.get(Topping, topping["id"])
+    with db_session.get_bind().begin() as conn:
+        conn.execute(update(Topping).where(Topping.id == topping["id"]).values(version_id=Topping.version_id + 1))
+    assert stale.version_id == 1
+    
+    response = client.put(f"/api/toppings/{topping['id']}", json={"name": "Salami"})
+    assert response.status_code == 409
+    assert client.get(f"/api/toppings/{topping['id']}").json()["name"] == "Pepperoni"
@@ -0,0 +1,82 @@
+import json
+import os
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.metrics import MetricsMiddleware, MetricsRegistry, RequestStats, SharedMetrics, metrics
+
+def test_metrics_endpoint_reports_routes_and_queries(client: TestClient):
+    metrics.reset()
+    topping = client.post("/api/toppings/", json={"name": "Pepperoni"}).json()
+    client.get("/api/toppings/")
+    client.get(f"/api/toppings/{topping['id']}")
+    client.get("/api/toppings/999")
+    
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'http_requests_total{method="GET",route="/api/toppings/",status="200"} 1' in text
+    assert 'http_requests_total{method="GET",route="/api/toppings/{topping_id}",status="404"} 1' in text
+    assert 'http_request_duration_seconds_count{method="POST",route="/api/toppings/"} 1' in text
+    # The uncached list is one query for the toppings and one for their pizzas
+    assert 'http_request_db_queries_total{method="GET",route="/api/toppings/"} 2' in text
+    assert "http_requests_in_flight 1" in text
+
+def test_unmatched_routes_share_a_label(client: TestClient):
+    metrics.reset()
+    client.get("/no/such/path")
+    client.get("/another/missing/path")
+    assert 'route="<unmatched>",status="404"} 2' in client.get("/metrics").text
+
+def test_server_timing_header(db_session):
+    timed_app = FastAPI()
+    timed_app.add_middleware(MetricsMiddleware, server_timing=True)
+    
+    @timed_app.get("/ping")
+    def ping():
+        return {"ok": True}
+    
+    response = TestClient(timed_app).get("/ping")
+    assert response.headers["Server-Timing"].startswith("app;dur=")
+    assert 'desc="0 queries"' in response.headers["Server-Timing"]
+
+def test_async_routes_attribute_queries(async_client: TestClient):
+    metrics.reset()
+    async_client.get("/api/pizzas/")
+    assert metrics.db_queries[("GET", "/api/pizzas/")] == 1
+
+def test_shared_metrics_add_up_workers(tmp_path):
+    stats = RequestStats(queries=2, db_time=0.01)
+    this_worker, exited_worker = MetricsRegistry(), MetricsRegistry()
+    for registry in (this_worker, exited_worker):
+        registry.request_started()
+        registry.request_finished("GET", "/api/pizzas/", 200, 0.02, stats)
+    exited_worker.request_started()
+    # A pid no process has, as for a worker gunicorn recycled
+    (tmp_path / "999999999.json").write_text(json.dumps(exited_worker.snapshot()))
+    
+    text = SharedMetrics(this_worker, str(tmp_path)).render()
+    # Its counters still count, its gauges no longer do
+    assert 'http_requests_total{method="GET",route="/api/pizzas/",status="200"} 2' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/pizzas/"} 2' in text
+    assert 'http_request_db_queries_total{method="GET",route="/api/pizzas/"} 4' in text
+    assert "http_requests_in_flight 0" in text
+    assert (tmp_path / f"{os.getpid()}.json").exists()
+
+def test_exited_workers_are_folded_into_one_file(tmp_path):
+    exited = MetricsRegistry()
+    exited.request_finished("GET", "/api/pizzas/", 200, 0.02, RequestStats())
+    # A worker that exited, and one that had this worker's PID before it
+    for pid in (999999999, 999999998, os.getpid()):
+        (tmp_path / f"{pid}.json").write_text(json.dumps(exited.snapshot()))
+    
+    shared = SharedMetrics(MetricsRegistry(), str(tmp_path))
+    shared.retire()
+    assert sorted(path.name for path in tmp_path.glob("*.json")) == ["retired.json"]
+    # Folded again on top of what was already retired
+    (tmp_path / "999999997.json").write_text(json.dumps(exited.snapshot()))
+    shared.retire()
+    
+    text = shared.render()
+    assert 'http_requests_total{method="GET",route="/api/pizzas/",status="200"} 4' in text
+    assert sorted(path.name for path in tmp_path.glob("*.json")) == [f"{os.getpid()}.json", "retired.json"]
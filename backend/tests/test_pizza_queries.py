@@ -0,0 +1,52 @@
+from fastapi.testclient import TestClient
+
+def _menu(client: TestClient):
+    ids = {
+        name: client.post("/api/toppings/", json={"name": name}).json()["id"]
+        for name in ("Cheese", "Tomato", "Ham", "Peanuts")
+    }
+    pizzas = {
+        "Margherita": ["Cheese", "Tomato"],
+        "Ham": ["Cheese", "Tomato", "Ham"],
+        "Satay": ["Cheese", "Peanuts"],
+        "Bread": [],
+    }
+    for name, toppings in pizzas.items():
+        client.post("/api/pizzas/", json={"name": name, "topping_ids": [ids[t] for t in toppings]})
+    return ids
+
+def _names(response):
+    assert response.status_code == 200
+    return sorted(pizza["name"] for pizza in response.json())
+
+def test_query_all_of(client: TestClient):
+    ids = _menu(client)
+    response = client.get("/api/pizzas/query", params={"all_of": [ids["Cheese"], ids["Tomato"]]})
+    assert _names(response) == ["Ham", "Margherita"]
+    assert len(response.json()[0]["toppings"]) >= 2
+
+def test_query_none_of(client: TestClient):
+    ids = _menu(client)
+    response = client.get("/api/pizzas/query", params={"none_of": [ids["Peanuts"]]})
+    assert _names(response) == ["Bread", "Ham", "Margherita"]
+
+def test_query_only(client: TestClient):
+    ids = _menu(client)
+    response = client.get("/api/pizzas/query", params={"only": [ids["Cheese"], ids["Tomato"], ids["Peanuts"]]})
+    assert _names(response) == ["Bread", "Margherita", "Satay"]
+
+def test_query_combined_and_paginated(client: TestClient):
+    ids = _menu(client)
+    params = {"all_of": [ids["Cheese"]], "none_of": [ids["Ham"]], "limit": 1}
+    first = client.get("/api/pizzas/query", params=params)
+    assert _names(first) == ["Margherita"]
+    second = client.get("/api/pizzas/query", params={**params, "after_id": first.headers["X-Next-Cursor"]})
+    assert _names(second) == ["Satay"]
+    assert "X-Next-Cursor" not in second.headers
+
+def test_query_results_follow_writes(client: TestClient):
+    ids = _menu(client)
+    assert _names(client.get("/api/pizzas/query", params={"all_of": [ids["Ham"]]})) == ["Ham"]
+    bread = next(p for p in client.get("/api/pizzas/").json() if p["name"] == "Bread")
+    client.put(f"/api/pizzas/{bread['id']}", json={"name": "Bread", "topping_ids": [ids["Ham"]]})
+    assert _names(client.get("/api/pizzas/query", params={"all_of": [ids["Ham"]]})) == ["Bread", "Ham"]
@@ -1,5 +1,8 @@
+import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.exc import IntegrityError
 from app.main import app
+from app.models.models import Pizza, topping_signature
 
 def test_create_pizza(client: TestClient):
     # Create toppings first
@@ -123,4 +126,136 @@ def test_delete_pizza(client: TestClient):
     
     # Delete pizza
     response = client.delete(f"/api/pizzas/{pizza_id}")
-    assert response.status_code == 200
\ No newline at end of file
+    assert response.status_code == 200
+
+def test_update_pizza_to_existing_toppings(client: TestClient):
+    # Create toppings and two pizzas with different combinations
+    topping1 = client.post("/api/toppings/", json={"name": "Pepperoni"}).json()
+    topping2 = client.post("/api/toppings/", json={"name": "Mushrooms"}).json()
+    client.post(
+        "/api/pizzas/",
+        json={
+            "name": "Supreme",
+            "topping_ids": [topping1["id"], topping2["id"]]
+        }
+    )
+    pizza_id = client.post(
+        "/api/pizzas/",
+        json={
+            "name": "Pepperoni Pizza",
+            "topping_ids": [topping1["id"]]
+        }
+    ).json()["id"]
+    
+    # Updating a pizza to its own toppings is allowed
+    response = client.put(
+        f"/api/pizzas/{pizza_id}",
+        json={
+            "name": "Classic Pepperoni",
+            "topping_ids": [topping1["id"]]
+        }
+    )
+    assert response.status_code == 200
+    
+    # Updating it to another pizza's toppings is not
+    response = client.put(
+        f"/api/pizzas/{pizza_id}",
+        json={
+            "name": "Classic Pepperoni",
+            "topping_ids": [topping2["id"], topping1["id"]]
+        }
+    )
+    assert response.status_code == 400
+    assert "combination of toppings already exists" in response.json()["detail"]
+
+def test_topping_signature_is_unique_in_database(db_session):
+    db_session.add(Pizza(name="First", topping_signature=topping_signature([2, 1])))
+    db_session.commit()
+    
+    db_session.add(Pizza(name="Second", topping_signature=topping_signature([1, 2, 2])))
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
+
+def test_get_pizzas_query_count_is_constant(client: TestClient, query_counter):
+    # Create a few pizzas, each with its own toppings
+    for i in range(5):
+        topping = client.post("/api/toppings/", json={"name": f"Topping {i}"}).json()
+        client.post(
+            "/api/pizzas/",
+            json={
+                "name": f"Pizza {i}",
+                "topping_ids": [topping["id"]]
+            }
+        )
+    
+    # One query for the pizzas and one for all of their toppings
+    query_counter.reset()
+    response = client.get("/api/pizzas/")
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+    assert query_counter.count == 2
+
+def test_get_pizzas_pagination(client: TestClient):
+    # Create five pizzas with one topping each
+    for i in range(5):
+        topping = client.post("/api/toppings/", json={"name": f"Topping {i}"}).json()
+        client.post(
+            "/api/pizzas/",
+            json={
+                "name": f"Pizza {i}",
+                "topping_ids": [topping["id"]]
+            }
+        )
+    
+    # Walk the pages by following the cursor
+    names = []
+    params = {"limit": 2}
+    while True:
+        response = client.get("/api/pizzas/", params=params)
+        assert response.status_code == 200
+        assert len(response.json()) <= 2
+        names.extend(pizza["name"] for pizza in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["after_id"] = response.headers["X-Next-Cursor"]
+    assert names == [f"Pizza {i}" for i in range(5)]
+
+def test_get_pizzas_filters(client: TestClient):
+    # Create toppings and pizzas
+    pepperoni = client.post("/api/toppings/", json={"name": "Pepperoni"}).json()
+    mushrooms = client.post("/api/toppings/", json={"name": "Mushrooms"}).json()
+    client.post(
+        "/api/pizzas/",
+        json={"name": "Pepperoni Pizza", "topping_ids": [pepperoni["id"]]}
+    )
+    client.post(
+        "/api/pizzas/",
+        json={"name": "Mushroom Pizza", "topping_ids": [mushrooms["id"]]}
+    )
+    client.post(
+        "/api/pizzas/",
+        json={"name": "Supreme", "topping_ids": [pepperoni["id"], mushrooms["id"]]}
+    )
+    
+    response = client.get("/api/pizzas/", params={"topping_id": mushrooms["id"]})
+    assert [pizza["name"] for pizza in response.json()] == ["Mushroom Pizza", "Supreme"]
+    
+    response = client.get("/api/pizzas/", params={"name_prefix": "Pep"})
+    assert [pizza["name"] for pizza in response.json()] == ["Pepperoni Pizza"]
+    
+    # Wildcards in the prefix are matched literally
+    response = client.get("/api/pizzas/", params={"name_prefix": "%"})
+    assert response.json() == []
+
+def test_list_matches_item_representation(client: TestClient):
+    # The list is rendered from row tuples, the item from the response model
+    toppings = [client.post("/api/toppings/", json={"name": name}).json() for name in ("Basil", "Olives", "Ham")]
+    client.post("/api/pizzas/", json={"name": "Margherita", "topping_ids": [toppings[0]["id"]]})
+    client.post("/api/pizzas/", json={"name": "Capricciosa", "topping_ids": [t["id"] for t in toppings]})
+    client.post("/api/pizzas/", json={"name": "Plain", "topping_ids": []})
+    
+    listed = client.get("/api/pizzas/").json()
+    assert len(listed) == 3
+    for pizza in listed:
+        assert client.get(f"/api/pizzas/{pizza['id']}").json() == pizza
@@ -0,0 +1,59 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, exc
+from app.db.pool import InstrumentedQueuePool, pool_options, pool_status
+from app.main import app
+
+def test_pool_options_skip_in_memory_sqlite():
+    assert pool_options("sqlite://", {"pool_size": 3}) == {}
+    options = pool_options("sqlite:///./test.db", {"pool_size": 3})
+    assert options == {"poolclass": InstrumentedQueuePool, "pool_size": 3}
+
+def test_pool_status_reports_checkouts_and_timeouts():
+    engine = create_engine(
+        "sqlite:///./test.db",
+        **pool_options("sqlite:///./test.db", {"pool_size": 1, "max_overflow": 0, "pool_timeout": 0.05}),
+    )
+    try:
+        with engine.connect():
+            status = pool_status(engine.pool)
+            assert status["checked_out"] == 1
+            assert status["idle"] == 0
+            
+            # The only connection is taken, so the next checkout times out
+            with pytest.raises(exc.TimeoutError):
+                engine.connect()
+        
+        status = pool_status(engine.pool)
+        assert status["checked_out"] == 0
+        assert status["idle"] == 1
+        assert status["acquisitions"] == 1
+        assert status["timeouts"] == 1
+        assert status["wait_seconds_max"] >= 0.05
+    finally:
+        engine.dispose()
+
+def test_pool_health_endpoint(monkeypatch):
+    # The engine is created when the app starts, from the environment
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///./test.db")
+    with TestClient(app) as client:
+        response = client.get("/health/pool")
+    assert response.status_code == 200
+    sync_pool = response.json()["sync"]
+    assert sync_pool["pool_class"] == "InstrumentedQueuePool"
+    assert {"checked_out", "idle", "overflow", "wait_seconds_avg"} <= sync_pool.keys()
+    # Opened during startup, before any request needed them
+    assert sync_pool["acquisitions"] >= 1
+
+def test_engine_usable_after_fork_reset(monkeypatch):
+    from app.db import database
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///./test.db")
+    engine = database.get_engine()
+    with engine.connect():
+        pass
+    
+    # What a gunicorn worker runs after fork: inherited connections are dropped, not closed
+    database.reset_engines_after_fork()
+    assert engine.pool.checkedin() == 0
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT 1").scalar() == 1
@@ -0,0 +1,104 @@
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app.api.routes import pizzas
+from app.core.cache import catalog_cache
+from app.core import profiling
+from app.core.profiling import PYTHON, SERIALIZATION, SQL, _category, profile_store, sampler
+
+TOKEN = {"X-Profile-Token": "secret"}
+
+@pytest.fixture
+def profiling_on(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "secret")
+    profile_store.clear()
+    yield
+    profile_store.clear()
+
+def test_admin_endpoints_need_the_token(client: TestClient, monkeypatch):
+    assert client.get("/admin/profiles").status_code == 404
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "secret")
+    assert client.get("/admin/profiles", headers={"X-Profile-Token": "wrong"}).status_code == 403
+    assert client.get("/admin/profiles", headers=TOKEN).json() == []
+
+def test_unprofiled_requests(client: TestClient, profiling_on):
+    for headers in ({}, {"X-Profile-Token": "wrong"}):
+        response = client.get("/api/pizzas/", headers=headers)
+        assert "X-Profile-Id" not in response.headers
+    assert not profile_store.profiles
+    assert not sampler.profiles
+
+def test_profile_requested_by_header(client: TestClient, profiling_on, monkeypatch):
+    split_page = pizzas.split_page
+    def slow_split_page(rows, limit):
+        # Long enough for the sampler to catch the handler at work
+        time.sleep(0.05)
+        return split_page(rows, limit)
+    monkeypatch.setattr(pizzas, "split_page", slow_split_page)
+    
+    response = client.get("/api/pizzas/", headers=TOKEN)
+    assert response.status_code == 200
+    profile_id = int(response.headers["X-Profile-Id"])
+    
+    [summary] = client.get("/admin/profiles", headers=TOKEN).json()
+    assert summary["id"] == profile_id
+    assert (summary["route"], summary["trigger"], summary["status"]) == ("/api/pizzas/", "header", 200)
+    assert summary["queries"] == 1 and summary["duration_ms"] >= 50
+    assert summary["categories"][PYTHON] > 0
+    
+    profile = client.get(f"/admin/profiles/{profile_id}", headers=TOKEN).json()
+    assert any("app/api/routes/pizzas.py:get_pizzas" in entry["stack"] for entry in profile["top_stacks"])
+    folded = client.get(f"/admin/profiles/{profile_id}", params={"format": "folded"}, headers=TOKEN).text
+    assert "app/api/routes/pizzas.py:get_pizzas;" in folded
+    assert client.get("/admin/profiles/999", headers=TOKEN).status_code == 404
+
+def test_sampled_profiles(client: TestClient, profiling_on, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    response = client.get("/api/toppings/")
+    assert profile_store.get(int(response.headers["X-Profile-Id"])).trigger == "sample"
+    # Reading profiles is never profiled itself
+    assert "X-Profile-Id" not in client.get("/admin/profiles", headers=TOKEN).headers
+
+def test_slow_queries_keep_parameters_and_plan(client: TestClient, profiling_on, monkeypatch):
+    client.post("/api/toppings/", json={"name": "Ham"})
+    monkeypatch.setattr(profiling, "SLOW_QUERY_MS", 0.000001)
+    response = client.get("/api/toppings/", params={"name_prefix": "Ha"}, headers=TOKEN)
+    
+    [query, *_] = client.get("/admin/slow-queries", headers=TOKEN).json()
+    assert query["statement"].lstrip().upper().startswith("SELECT")
+    assert "Ha" in query["parameters"]
+    assert query["plan"] and "plan_error" not in query
+    assert query["profile_id"] == int(response.headers["X-Profile-Id"])
+    
+    # The same statement is not explained again right away
+    catalog_cache.clear()
+    client.get("/api/toppings/", params={"name_prefix": "Ha"})
+    again = client.get("/admin/slow-queries", headers=TOKEN).json()[0]
+    assert again["statement"] == query["statement"] and "plan" not in again
+
+def test_slow_queries_without_explain(client: TestClient, profiling_on, monkeypatch):
+    # E.g. a database with no EXPLAIN syntax known here
+    monkeypatch.setattr(profiling, "EXPLAIN_PREFIXES", {})
+    monkeypatch.setattr(profiling, "SLOW_QUERY_MS", 0.000001)
+    client.get("/api/toppings/")
+    
+    [query, *_] = client.get("/admin/slow-queries", headers=TOKEN).json()
+    assert query["statement"].lstrip().upper().startswith("SELECT")
+    assert "plan" not in query and "plan_error" not in query
+
+def test_failed_explain_leaves_the_request_alone(client: TestClient, profiling_on, monkeypatch):
+    monkeypatch.setattr(profiling, "EXPLAIN_PREFIXES", {"sqlite": "EXPLAIN QUERY PLAN NOT SQL "})
+    monkeypatch.setattr(profiling, "SLOW_QUERY_MS", 0.000001)
+    response = client.post("/api/toppings/", json={"name": "Ham"})
+    assert response.status_code == 200
+    
+    queries = client.get("/admin/slow-queries", headers=TOKEN).json()
+    assert queries and all("plan_error" in query for query in queries)
+    # The write still committed
+    monkeypatch.setattr(profiling, "SLOW_QUERY_MS", 0)
+    assert [topping["name"] for topping in client.get("/api/toppings/").json()] == ["Ham"]
+
+def test_sample_categories():
+    assert _category(["app/api/routes/pizzas.py:get_pizzas", "sqlalchemy/orm/session.py:execute"]) == SQL
+    assert _category(["app/api/routes/pizzas.py:get_pizzas", "app/api/responses.py:render_json"]) == SERIALIZATION
+    assert _category(["app/api/routes/pizzas.py:get_pizzas"]) == PYTHON
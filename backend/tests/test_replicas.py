@@ -0,0 +1,57 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from app.db import database, replicas
+from app.db.database import Base
+from app.main import create_app
+from app.models.models import Topping
+
+@pytest.fixture
+def replica_app(db_session, tmp_path, monkeypatch):
+    # A second SQLite file stands in for the replica, seeded with a row the primary lacks
+    replica_url = f"sqlite:///{tmp_path}/replica.db"
+    replica = create_engine(replica_url)
+    Base.metadata.create_all(bind=replica)
+    with replica.begin() as conn:
+        conn.execute(insert(Topping), [{"name": "Only On Replica"}])
+    replica.dispose()
+    
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///./test.db")
+    monkeypatch.setenv("DATABASE_REPLICA_URLS", replica_url)
+    monkeypatch.setattr(database, "_replica_engines", None)
+    monkeypatch.setattr(replicas, "_last_write_at", 0.0)
+    yield create_app()
+    database.dispose_engine()
+
+def names(response):
+    return [t["name"] for t in response.json()]
+
+def test_reads_go_to_replica_until_client_writes(replica_app):
+    with TestClient(replica_app) as client:
+        assert names(client.get("/api/toppings/")) == ["Only On Replica"]
+        
+        response = client.post("/api/toppings/", json={"name": "Pepperoni"})
+        assert response.status_code == 200
+        assert replicas.READ_PRIMARY_COOKIE in response.cookies
+        assert float(response.headers[replicas.READ_PRIMARY_HEADER]) > 0
+        
+        # The client reads its own write from the primary
+        assert names(client.get("/api/toppings/")) == ["Pepperoni"]
+        topping_id = response.json()["id"]
+        assert client.get(f"/api/toppings/{topping_id}").status_code == 200
+        
+        # So does everyone else on this worker while the replica may lag
+        other = TestClient(replica_app)
+        assert names(other.get("/api/toppings/", params={"limit": 5})) == ["Pepperoni"]
+        
+        # Once that window has passed on this worker (or on another one), only
+        # the client that wrote keeps reading from the primary
+        replicas._last_write_at = 0.0
+        assert names(client.get("/api/toppings/", params={"limit": 10})) == ["Pepperoni"]
+        assert names(other.get("/api/toppings/", params={"limit": 11})) == ["Only On Replica"]
+        
+        # Clients without cookies can send the header back instead
+        header = {replicas.READ_PRIMARY_HEADER: response.headers[replicas.READ_PRIMARY_HEADER]}
+        assert names(other.get("/api/toppings/", params={"limit": 20}, headers=header)) == ["Pepperoni"]
+        
+        assert {"sync", "sync_replica_0"} <= client.get("/health/pool").json().keys()
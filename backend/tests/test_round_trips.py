@@ -0,0 +1,65 @@
+import pytest
+from fastapi.testclient import TestClient
+
+# Statements each write endpoint sends to the database, COMMIT aside. Keep in
+# step with the table in the README; a handler that needs more should say why.
+BUDGETS = {
+    "create_topping": 1,   # INSERT ... RETURNING
+    "update_topping": 3,   # SELECT topping, UPDATE, SELECT its pizzas for the response
+    "delete_topping": 3,   # SELECT topping, EXISTS in use, DELETE
+    "create_pizza": 3,     # SELECT toppings, INSERT ... RETURNING, INSERT links
+    "update_pizza": 6,     # SELECT pizza, its toppings, the new toppings, UPDATE, DELETE and INSERT links
+    "rename_pizza": 4,     # update_pizza with the same toppings: no link changes
+    "delete_pizza": 3,     # SELECT pizza, DELETE links RETURNING, DELETE
+}
+
+@pytest.fixture(params=["sync", "async"])
+def any_client(request):
+    return request.getfixturevalue("client" if request.param == "sync" else "async_client")
+
+def test_write_round_trip_budgets(any_client: TestClient, query_counter):
+    pepperoni = any_client.post("/api/toppings/", json={"name": "Pepperoni"}).json()
+    mushrooms = any_client.post("/api/toppings/", json={"name": "Mushrooms"}).json()
+    
+    def spent(method, url, **kwargs):
+        query_counter.reset()
+        response = any_client.request(method, url, **kwargs)
+        assert response.status_code == 200, response.text
+        return query_counter.count, response
+    
+    count, olives = spent("POST", "/api/toppings/", json={"name": "Olives"})
+    assert count <= BUDGETS["create_topping"]
+    
+    count, pizza = spent("POST", "/api/pizzas/", json={"name": "Supreme", "topping_ids": [pepperoni["id"], mushrooms["id"]]})
+    assert count <= BUDGETS["create_pizza"]
+    assert [t["name"] for t in pizza.json()["toppings"]] == ["Pepperoni", "Mushrooms"]
+    pizza_id = pizza.json()["id"]
+    
+    count, response = spent("PUT", f"/api/pizzas/{pizza_id}", json={"name": "Supreme", "topping_ids": [pepperoni["id"]]})
+    assert count <= BUDGETS["update_pizza"]
+    assert [t["name"] for t in response.json()["toppings"]] == ["Pepperoni"]
+    
+    count, response = spent("PUT", f"/api/pizzas/{pizza_id}", json={"name": "Pepperoni Pizza", "topping_ids": [pepperoni["id"]]})
+    assert count <= BUDGETS["rename_pizza"]
+    assert response.json()["name"] == "Pepperoni Pizza"
+    
+    count, response = spent("PUT", f"/api/toppings/{pepperoni['id']}", json={"name": "Salami"})
+    assert count <= BUDGETS["update_topping"]
+    assert response.json() == {
+        "name": "Salami", "id": pepperoni["id"], "pizzas": [{"name": "Pepperoni Pizza", "id": pizza_id}]
+    }
+    
+    count, _ = spent("DELETE", f"/api/toppings/{olives.json()['id']}")
+    assert count <= BUDGETS["delete_topping"]
+    
+    count, _ = spent("DELETE", f"/api/pizzas/{pizza_id}")
+    assert count <= BUDGETS["delete_pizza"]
+
+def test_write_responses_match_reads(any_client: TestClient):
+    topping = any_client.post("/api/toppings/", json={"name": "Pepperoni"})
+    assert topping.json() == {"name": "Pepperoni", "id": topping.json()["id"], "pizzas": []}
+    pizza = any_client.post("/api/pizzas/", json={"name": "Supreme", "topping_ids": [topping.json()["id"]]})
+    
+    read = any_client.get(f"/api/pizzas/{pizza.json()['id']}")
+    assert pizza.json() == read.json()
+    assert pizza.headers["ETag"] == read.headers["ETag"]
@@ -0,0 +1,117 @@
+import threading
+import time
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+from app.api.routes import search
+from app.core.events import CATALOG_RELOADED, PIZZA, UPDATED, CatalogChange
+from app.core.search import CatalogSearch
+
+def seed(client: TestClient):
+    toppings = {
+        name: client.post("/api/toppings/", json={"name": name}).json()["id"]
+        for name in ["Pepperoni", "Peppers", "Mushrooms", "Pineapple", "Ham"]
+    }
+    for name, topping_names in [
+        ("Pepperoni Feast", ["Pepperoni"]),
+        ("Hawaiian", ["Ham", "Pineapple"]),
+        ("Spicy Pepper", ["Peppers"]),
+    ]:
+        client.post("/api/pizzas/", json={"name": name, "topping_ids": [toppings[t] for t in topping_names]})
+    return toppings
+
+def hits(response):
+    assert response.status_code == 200
+    return [(hit["type"], hit["name"]) for hit in response.json()]
+
+def test_search_ranks_prefix_then_word_then_fuzzy(client: TestClient):
+    seed(client)
+    # Whole-name prefixes first, shortest first; then names with a word starting with it
+    assert hits(client.get("/api/search", params={"q": "pep"})) == [
+        ("topping", "Peppers"),
+        ("topping", "Pepperoni"),
+        ("pizza", "Pepperoni Feast"),
+        ("pizza", "Spicy Pepper"),
+    ]
+    # Typos still find the name
+    assert hits(client.get("/api/search", params={"q": "peperoni"}))[:2] == [
+        ("topping", "Pepperoni"),
+        ("pizza", "Pepperoni Feast"),
+    ]
+    assert hits(client.get("/api/search", params={"q": "mushroms"})) == [("topping", "Mushrooms")]
+    assert hits(client.get("/api/search", params={"q": "xyz"})) == []
+
+def test_search_filters_and_limits(client: TestClient):
+    seed(client)
+    assert hits(client.get("/api/search", params={"q": "p", "type": "pizza"})) == [
+        ("pizza", "Pepperoni Feast"),
+        ("pizza", "Spicy Pepper"),
+    ]
+    assert len(client.get("/api/search", params={"q": "p", "limit": 2}).json()) == 2
+    assert client.get("/api/search", params={"q": ""}).status_code == 422
+    assert client.get("/api/search", params={"q": "p", "limit": 51}).status_code == 422
+
+def test_search_index_follows_writes(client: TestClient):
+    toppings = seed(client)
+    assert hits(client.get("/api/search", params={"q": "ham"})) == [("topping", "Ham")]
+    
+    client.put(f"/api/toppings/{toppings['Ham']}", json={"name": "Smoked Ham"})
+    client.post("/api/toppings/bulk", json={"items": [{"name": "Hamburger"}]})
+    assert hits(client.get("/api/search", params={"q": "ham"})) == [
+        ("topping", "Hamburger"),
+        ("topping", "Smoked Ham"),
+    ]
+    
+    client.delete(f"/api/toppings/{toppings['Mushrooms']}")
+    assert hits(client.get("/api/search", params={"q": "mush"})) == []
+
+def test_search_budget_truncates(client: TestClient, monkeypatch):
+    seed(client)
+    monkeypatch.setattr(search, "SEARCH_BUDGET_MS", 0)
+    response = client.get("/api/search", params={"q": "pepperoni"})
+    assert response.status_code == 200
+    assert response.headers["X-Search-Truncated"] == "true"
+
+def test_postgres_search_statement():
+    statement = search.search_statement("pep", ["pizza", "topping"], 10)
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert "UNION ALL" in sql
+    assert "<%" in sql and "word_similarity" in sql
+    # Too short for trigrams: prefixes only
+    sql = str(search.search_statement("pe", ["pizza"], 10).compile(dialect=postgresql.dialect()))
+    assert "<%" not in sql
+
+def test_index_rebuilds_in_the_background_without_losing_writes():
+    index = CatalogSearch(ttl=0)
+    index.ensure_loaded(lambda: {PIZZA: [(1, "Margherita")]})
+    assert index.search("marg", [PIZZA], 10, 50)[0][0].id == 1
+    
+    rebuilding, release = threading.Event(), threading.Event()
+    
+    def slow_load():
+        rebuilding.set()
+        release.wait(5)
+        # Read before the rename below was committed
+        return {PIZZA: [(1, "Margherita"), (2, "Marinara")]}
+    
+    index.ensure_loaded(slow_load)
+    assert rebuilding.wait(5)
+    # Searches and writes go on while the rebuild reads the database
+    index.apply(CatalogChange(PIZZA, UPDATED, 1, "Quattro Formaggi"))
+    assert [hit.name for hit in index.search("qua", [PIZZA], 10, 50)[0]] == ["Quattro Formaggi"]
+    release.set()
+    
+    deadline = time.monotonic() + 5
+    while 2 not in index.indexes[PIZZA].names and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert index.indexes[PIZZA].names == {1: "Quattro Formaggi", 2: "Marinara"}
+    assert [hit.id for hit in index.search("mar", [PIZZA], 10, 50)[0]] == [2]
+
+def test_catalog_wide_changes_rebuild_the_index():
+    index = CatalogSearch(ttl=300)
+    index.ensure_loaded(lambda: {PIZZA: [(1, "Margherita")]})
+    index.apply(CATALOG_RELOADED)
+    index.ensure_loaded(lambda: {PIZZA: [(1, "Margherita"), (2, "Marinara")]})
+    deadline = time.monotonic() + 5
+    while 2 not in index.indexes[PIZZA].names and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert index.indexes[PIZZA].names == {1: "Margherita", 2: "Marinara"}
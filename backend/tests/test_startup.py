@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+from fastapi.testclient import TestClient
+from app.core.startup import StartupReport
+from app.main import create_app
+
+def test_import_has_no_database_side_effects():
+    # A fresh interpreter, since other tests may already have created the engine
+    env = {key: value for key, value in os.environ.items() if key != "DATABASE_URL"}
+    code = (
+        "import app.main as main; main.app; "
+        "from app.db.database import current_engine; assert current_engine() is None"
+    )
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+def test_dotenv_is_loaded_before_settings_are_read(tmp_path):
+    (tmp_path / ".env").write_text("CATALOG_CACHE_TTL=7\nSTARTUP_WARMUP=false\n")
+    env = {key: value for key, value in os.environ.items() if key not in ("CATALOG_CACHE_TTL", "STARTUP_WARMUP")}
+    env["PYTHONPATH"] = os.getcwd()
+    code = "import app.main as main; from app.core.cache import catalog_cache; print(catalog_cache.ttl, main.STARTUP_WARMUP)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert result.stdout.split() == ["7.0", "False"], result.stderr
+
+def test_startup_report_after_lifespan(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///./test.db")
+    with TestClient(create_app()) as client:
+        report = client.get("/health/startup").json()
+    assert report["ready"] is True
+    assert report["total_ms"] > 0
+    names = [phase["name"] for phase in report["phases"]]
+    assert {"import app.main", "create app", "create engine", "warm up pool", "warm up openapi"} <= set(names)
+
+def test_startup_report_budget():
+    report = StartupReport(budget_ms=50, started_at=0.0)
+    report.record("configure", 0.01)
+    assert report.as_dict()["ready"] is False
+    report.ready_at = 0.02
+    assert report.as_dict()["within_budget"] is True
+    report.ready_at = 0.2
+    assert report.as_dict()["within_budget"] is False
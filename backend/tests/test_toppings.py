@@ -81,4 +81,102 @@ def test_delete_topping_used_in_pizza(client: TestClient):
     # Try to delete topping
     response = client.delete(f"/api/toppings/{topping_id}")
     assert response.status_code == 400
-    assert "used in existing pizzas" in response.json()["detail"]["message"]
\ No newline at end of file
+    assert "used in existing pizzas" in response.json()["detail"]["message"]
+
+def test_get_toppings_query_count_is_constant(client: TestClient, query_counter):
+    # Create a few toppings, each used by its own pizza
+    for i in range(5):
+        topping = client.post("/api/toppings/", json={"name": f"Topping {i}"}).json()
+        client.post(
+            "/api/pizzas/",
+            json={
+                "name": f"Pizza {i}",
+                "topping_ids": [topping["id"]]
+            }
+        )
+    
+    # One query for the toppings and one for all of their pizzas
+    query_counter.reset()
+    response = client.get("/api/toppings/")
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+    assert query_counter.count == 2
+
+def test_get_toppings_pagination(client: TestClient):
+    for name in ["Basil", "Bacon", "Olives"]:
+        client.post("/api/toppings/", json={"name": name})
+    
+    response = client.get("/api/toppings/", params={"limit": 2})
+    assert [topping["name"] for topping in response.json()] == ["Basil", "Bacon"]
+    cursor = response.headers["X-Next-Cursor"]
+    assert 'rel="next"' in response.headers["Link"]
+    
+    response = client.get("/api/toppings/", params={"limit": 2, "after_id": cursor})
+    assert [topping["name"] for topping in response.json()] == ["Olives"]
+    assert "X-Next-Cursor" not in response.headers
+    
+    response = client.get("/api/toppings/", params={"name_prefix": "Ba"})
+    assert [topping["name"] for topping in response.json()] == ["Basil", "Bacon"]
+
+def test_topping_names_are_unique_ignoring_case(client: TestClient):
+    client.post("/api/toppings/", json={"name": "Pepperoni"})
+    response = client.post("/api/toppings/", json={"name": "PEPPERONI"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Topping already exists"
+    
+    # Renaming onto another topping's name is rejected the same way
+    olives = client.post("/api/toppings/", json={"name": "Olives"}).json()
+    response = client.put(f"/api/toppings/{olives['id']}", json={"name": "pepperoni"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Topping name already exists"
+    
+    # Changing only the case of its own name is allowed
+    response = client.put(f"/api/toppings/{olives['id']}", json={"name": "OLIVES"})
+    assert response.status_code == 200
+
+def test_topping_names_with_wildcards(client: TestClient):
+    # % and _ are ordinary characters, not LIKE wildcards
+    client.post("/api/toppings/", json={"name": "Pepperoni"})
+    assert client.post("/api/toppings/", json={"name": "Pep%"}).status_code == 200
+    assert client.post("/api/toppings/", json={"name": "Pepperon_"}).status_code == 200
+
+def test_get_toppings_with_counts(client: TestClient, query_counter):
+    cheese = client.post("/api/toppings/", json={"name": "Cheese"}).json()
+    ham = client.post("/api/toppings/", json={"name": "Ham"}).json()
+    client.post("/api/toppings/", json={"name": "Olives"})
+    client.post("/api/pizzas/", json={"name": "Cheese Pizza", "topping_ids": [cheese["id"]]})
+    client.post("/api/pizzas/", json={"name": "Ham Pizza", "topping_ids": [cheese["id"], ham["id"]]})
+    
+    query_counter.reset()
+    response = client.get("/api/toppings/?include=counts")
+    assert response.status_code == 200
+    assert [(t["name"], t["pizza_count"]) for t in response.json()] == [("Cheese", 2), ("Ham", 1), ("Olives", 0)]
+    assert "pizzas" not in response.json()[0]
+    assert query_counter.count == 1
+    
+    # The counts view is cached separately and follows pizza writes
+    assert client.get("/api/toppings/").json()[0]["pizzas"]
+    client.post("/api/pizzas/", json={"name": "Plain Ham", "topping_ids": [ham["id"]]})
+    assert client.get("/api/toppings/?include=counts").json()[1]["pizza_count"] == 2
+
+def test_delete_topping_in_use_does_not_load_pizzas(client: TestClient, query_counter, monkeypatch):
+    from app.api.routes import toppings
+    monkeypatch.setattr(toppings, "IN_USE_EXAMPLES", 2)
+    cheese = client.post("/api/toppings/", json={"name": "Cheese"}).json()
+    extras = [client.post("/api/toppings/", json={"name": f"Extra {i}"}).json() for i in range(3)]
+    for extra in extras:
+        client.post("/api/pizzas/", json={"name": f"Pizza {extra['id']}", "topping_ids": [cheese["id"], extra["id"]]})
+    
+    response = client.delete(f"/api/toppings/{cheese['id']}")
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert detail["pizza_count"] == 3
+    assert len(detail["pizzas"]) == 2
+    
+    # Once unused, the delete touches pizza_toppings only for the EXISTS probe
+    first_pizza = client.get("/api/pizzas/").json()[0]
+    client.delete(f"/api/pizzas/{first_pizza['id']}")
+    query_counter.reset()
+    response = client.delete(f"/api/toppings/{extras[0]['id']}")
+    assert response.status_code == 200
+    assert sum("pizza_toppings" in statement for statement in query_counter.statements) == 1